@@ -0,0 +1,143 @@
+"""
+Materialized admin test papers.
+
+An admin test's question set is fixed when it is created, so the whole
+paper - question ids, texts, difficulties, options (in label order) and
+correct labels, in test order - is stored once as a compact JSON blob in
+admin_test_papers, together with ADMIN_TEST_VARIANTS pre-generated option
+orders. Starting a test is then one keyed read of the blob instead of the
+question + option queries, and every student gets one of the variants.
+
+Papers are written in the same transaction as the test
+(create_admin_test), backfilled on first use for tests created before
+this table existed, and removed when the test is deleted. They are
+immutable: later edits to the bank never change a stored paper, so
+sessions that started a test keep a paper that matches their question
+ids. Each paper records the bank fingerprint it was built from.
+
+Option order is chosen per student from a seed: with stored variants the
+seed picks one of them, otherwise it seeds the shuffle itself - so the same
+seed always reproduces the same paper layout.
+"""
+import json
+import os
+import random
+import threading
+
+from db_connection import get_connection, get_placeholder
+
+# Shuffled option orders stored per paper (0 = shuffle on every start instead)
+VARIANTS = int(os.getenv("ADMIN_TEST_VARIANTS", "4"))
+
+PAPER_VERSION = 1
+
+PAPER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS admin_test_papers (
+    admin_test_id INTEGER PRIMARY KEY,
+    paper TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+_ready = False
+_ready_lock = threading.Lock()
+
+
+def ensure_paper_table():
+    """Create admin_test_papers once per process"""
+    global _ready
+    if _ready:
+        return
+    with _ready_lock:
+        if _ready:
+            return
+        conn = get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute(PAPER_SCHEMA)
+            conn.commit()
+        finally:
+            conn.close()
+        _ready = True
+
+
+def build_paper(questions, bank_version=None, variants=VARIANTS, rng=random):
+    """
+    Paper dict for question dicts in test order (options in any order).
+
+    Options are stored sorted by label; each variant holds, per question,
+    the option order as a string of indexes (e.g. "2031").
+    """
+    options = [sorted(tuple(option) for option in question["options"]) for question in questions]
+    ids = [question["id"] for question in questions]
+    variant_orders = []
+    for _ in range(variants):
+        orders = []
+        for question_options in options:
+            order = list(range(len(question_options)))
+            rng.shuffle(order)
+            orders.append("".join(map(str, order)))
+        variant_orders.append(orders)
+
+    return {
+        "version": PAPER_VERSION,
+        "bank": list(bank_version) if bank_version is not None else None,
+        "ids": ids,
+        "texts": [question["text"] for question in questions],
+        "difficulties": [question.get("difficulty") for question in questions],
+        "options": [[[label, text, 1 if correct else 0] for label, text, correct in opts] for opts in options],
+        "correct": [next((label for label, _, correct in opts if correct), None) for opts in options],
+        "variants": variant_orders,
+    }
+
+
+def store_paper(cur, admin_test_id, paper):
+    """Insert the paper (the caller commits); an existing paper is never replaced"""
+    placeholder = get_placeholder()
+    cur.execute(
+        f"""
+        INSERT INTO admin_test_papers (admin_test_id, paper) VALUES ({placeholder}, {placeholder})
+        ON CONFLICT (admin_test_id) DO NOTHING
+        """,
+        (admin_test_id, json.dumps(paper, separators=(",", ":")))
+    )
+
+
+def read_paper(cur, admin_test_id):
+    """The stored paper dict of a test, or None"""
+    cur.execute(
+        f"SELECT paper FROM admin_test_papers WHERE admin_test_id = {get_placeholder()}",
+        (admin_test_id,)
+    )
+    row = cur.fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def delete_paper(cur, admin_test_id):
+    cur.execute(f"DELETE FROM admin_test_papers WHERE admin_test_id = {get_placeholder()}", (admin_test_id,))
+
+
+def paper_questions(paper, seed=None):
+    """
+    Question dicts (the shape used throughout the app) of a paper, with the
+    option order determined by `seed` (random when None). The paper itself
+    is never modified, so it can be shared between sessions.
+    """
+    rng = random.Random(seed)
+    variants = paper["variants"]
+    variant = rng.randrange(len(variants)) if variants else None
+
+    questions = []
+    for k, qid in enumerate(paper["ids"]):
+        options = [tuple(option) for option in paper["options"][k]]
+        if variants:
+            options = [options[int(i)] for i in variants[variant][k]]
+        else:
+            rng.shuffle(options)
+        questions.append({
+            "id": qid,
+            "text": paper["texts"][k],
+            "difficulty": paper["difficulties"][k],
+            "options": options
+        })
+    return questions
@@ -34,6 +34,15 @@ ALTER TABLE chapters DROP CONSTRAINT IF EXISTS chapters_chapter_number_key;
 ALTER TABLE chapters ADD CONSTRAINT IF NOT EXISTS chapters_subject_number_unique 
     UNIQUE (subject, chapter_number);
 
+-- MIGRATION 4: Student directory indexes (paginated, searchable Students tab)
+-- ═══════════════════════════════════════════════════════════════
+DROP INDEX IF EXISTS idx_users_role_created;
+-- COALESCE: users created before created_at existed sort as the oldest (see student_directory.py)
+CREATE INDEX IF NOT EXISTS idx_users_role_sort_key ON users(role, (COALESCE(created_at, TIMESTAMP '1970-01-01 00:00:00')) DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_users_username_search ON users(LOWER(username) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_users_phone_search ON users(phone_number text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_users_school_search ON users(LOWER(school_name) text_pattern_ops);
+
 -- ═══════════════════════════════════════════════════════════════
 -- VERIFICATION QUERIES (Run these to check migrations worked)
 -- ═══════════════════════════════════════════════════════════════
@@ -64,5 +73,6 @@ ORDER BY subject, chapter_number;
 -- ✅ users table now has: created_at, school_name, class_name, board_name
 -- ✅ chapters table now has: subject column
 -- ✅ Unique constraint on (subject, chapter_number)
+-- ✅ Student directory indexes on users
 -- ✅ Existing Physics chapters remain intact
 -- ═══════════════════════════════════════════════════════════════
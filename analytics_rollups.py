@@ -0,0 +1,242 @@
+"""
+Precomputed analytics rollups for the admin statistics dashboard.
+
+Instead of aggregating the whole responses table on every dashboard
+rerun, per-student / per-chapter / per-concept / per-difficulty /
+per-student-concept counters are kept in small rollup tables:
+
+- updated incrementally, in the same transaction that saves a custom
+  test attempt (see submission_queue.write_custom_attempt)
+- adjusted when students are deleted (remove_student / remove_students)
+- rebuilt from the base tables with rebuild_rollups() - on first use,
+  after bulk deletes, or periodically as a safety net:
+
+    python analytics_rollups.py --rebuild
+
+Like the original dashboard, the rollups cover custom tests
+(test_attempts / responses).
+"""
+import sys
+import threading
+
+from db_connection import get_connection, get_placeholder
+
+# Records which precomputed tables have been backfilled (also used by leaderboard_engine)
+META_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS rollup_meta (
+        name VARCHAR(50) PRIMARY KEY,
+        value TEXT
+    )
+"""
+
+ROLLUP_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS rollup_student (
+        student_id INTEGER PRIMARY KEY,
+        tests_taken INTEGER NOT NULL DEFAULT 0,
+        ratio_sum REAL NOT NULL DEFAULT 0,
+        best_ratio REAL,
+        worst_ratio REAL,
+        last_test_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rollup_chapter (
+        chapter_number INTEGER PRIMARY KEY,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        correct INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rollup_concept (
+        concept_id INTEGER PRIMARY KEY,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        correct INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rollup_difficulty (
+        difficulty VARCHAR(20) PRIMARY KEY,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        correct INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rollup_student_concept (
+        student_id INTEGER NOT NULL,
+        concept_id INTEGER NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        correct INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (student_id, concept_id)
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_rollup_student_concept_concept
+    ON rollup_student_concept (concept_id)
+    """,
+    META_SCHEMA,
+]
+
+ROLLUP_TABLES = ["rollup_student", "rollup_chapter", "rollup_concept", "rollup_difficulty", "rollup_student_concept"]
+
+# Per-response rollups: (table, key columns, key expressions) - all fed by the
+# same responses -> questions -> concepts -> chapters join
+RESPONSE_ROLLUPS = [
+    ("rollup_chapter", ["chapter_number"], ["ch.chapter_number"]),
+    ("rollup_concept", ["concept_id"], ["q.concept_id"]),
+    ("rollup_difficulty", ["difficulty"], ["q.difficulty"]),
+    ("rollup_student_concept", ["student_id", "concept_id"], ["t.student_id", "q.concept_id"]),
+]
+
+RESPONSE_JOIN = """
+    FROM responses r
+    JOIN test_attempts t ON r.attempt_id = t.id
+    JOIN questions q ON r.question_id = q.id
+    JOIN concepts c ON q.concept_id = c.id
+    JOIN chapters ch ON c.chapter_id = ch.id
+"""
+
+_ready = False
+_ready_lock = threading.Lock()
+
+
+def ensure_rollup_tables():
+    """Create the rollup tables once per process and backfill them if they were never built"""
+    global _ready
+    if _ready:
+        return
+    with _ready_lock:
+        if _ready:
+            return
+        conn = get_connection()
+        cur = conn.cursor()
+        try:
+            for statement in ROLLUP_SCHEMA:
+                cur.execute(statement)
+            conn.commit()
+
+            built = is_built(cur, "analytics")
+        finally:
+            conn.close()
+
+        if not built:
+            rebuild_rollups()
+        _ready = True
+
+
+def is_built(cur, name):
+    """Whether the precomputed table(s) called `name` have been backfilled"""
+    cur.execute(f"SELECT value FROM rollup_meta WHERE name = {get_placeholder()}", (name,))
+    return cur.fetchone() is not None
+
+
+def mark_built(cur, name):
+    """Record that `name` was (re)built; runs in the caller's transaction"""
+    placeholder = get_placeholder()
+    cur.execute(f"DELETE FROM rollup_meta WHERE name = {placeholder}", (name,))
+    cur.execute(f"INSERT INTO rollup_meta (name, value) VALUES ({placeholder}, CURRENT_TIMESTAMP)", (name,))
+
+
+def _upsert_from_responses(cur, table, key_columns, key_exprs, where, params, sign=1):
+    """INSERT ... SELECT grouped response counters, adding (sign=1) or subtracting (sign=-1) them"""
+    keys = ", ".join(key_columns)
+    cur.execute(f"""
+        INSERT INTO {table} ({keys}, attempts, correct)
+        SELECT {", ".join(key_exprs)}, {sign} * COUNT(*), {sign} * COALESCE(SUM(r.is_correct), 0)
+        {RESPONSE_JOIN}
+        WHERE {where}
+        GROUP BY {", ".join(key_exprs)}
+        ON CONFLICT ({keys}) DO UPDATE SET
+            attempts = {table}.attempts + excluded.attempts,
+            correct = {table}.correct + excluded.correct
+    """, params)
+
+
+def apply_custom_attempt(cur, student_id, attempt_id, score, total_questions, attempted_at):
+    """
+    Add one freshly inserted custom attempt (and its responses) to the rollups.
+    Runs inside the caller's transaction; cost depends only on the attempt size.
+    """
+    placeholder = get_placeholder()
+    ratio = score * 1.0 / total_questions if total_questions else 0.0
+
+    cur.execute(f"""
+        INSERT INTO rollup_student (student_id, tests_taken, ratio_sum, best_ratio, worst_ratio, last_test_at)
+        VALUES ({placeholder}, 1, {placeholder}, {placeholder}, {placeholder}, {placeholder})
+        ON CONFLICT (student_id) DO UPDATE SET
+            tests_taken = rollup_student.tests_taken + 1,
+            ratio_sum = rollup_student.ratio_sum + excluded.ratio_sum,
+            best_ratio = CASE WHEN excluded.best_ratio > rollup_student.best_ratio
+                              THEN excluded.best_ratio ELSE rollup_student.best_ratio END,
+            worst_ratio = CASE WHEN excluded.worst_ratio < rollup_student.worst_ratio
+                               THEN excluded.worst_ratio ELSE rollup_student.worst_ratio END,
+            last_test_at = CASE WHEN excluded.last_test_at > rollup_student.last_test_at
+                                THEN excluded.last_test_at ELSE rollup_student.last_test_at END
+    """, (student_id, ratio, ratio, ratio, attempted_at))
+
+    for table, key_columns, key_exprs in RESPONSE_ROLLUPS:
+        _upsert_from_responses(cur, table, key_columns, key_exprs, f"r.attempt_id = {placeholder}", (attempt_id,))
+
+
+def remove_student(cur, student_id):
+    """
+    Take a student's custom test data out of the rollups.
+    Must run inside the caller's transaction BEFORE their responses are deleted.
+    """
+    remove_students(cur, [student_id])
+
+
+def remove_students(cur, student_ids):
+    """remove_student() for many students at once, with one statement per rollup table"""
+    placeholder = get_placeholder()
+    marks = ", ".join([placeholder] * len(student_ids))
+    params = tuple(student_ids)
+    for table, key_columns, key_exprs in RESPONSE_ROLLUPS:
+        if table != "rollup_student_concept":
+            _upsert_from_responses(cur, table, key_columns, key_exprs, f"t.student_id IN ({marks})", params, sign=-1)
+    cur.execute(f"DELETE FROM rollup_student_concept WHERE student_id IN ({marks})", params)
+    cur.execute(f"DELETE FROM rollup_student WHERE student_id IN ({marks})", params)
+
+
+def rebuild_rollups():
+    """Recompute every rollup table from the base tables in one transaction"""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        for statement in ROLLUP_SCHEMA:
+            cur.execute(statement)
+        for table in ROLLUP_TABLES:
+            cur.execute(f"DELETE FROM {table}")
+
+        cur.execute("""
+            INSERT INTO rollup_student (student_id, tests_taken, ratio_sum, best_ratio, worst_ratio, last_test_at)
+            SELECT student_id,
+                   COUNT(*),
+                   SUM(score * 1.0 / total_questions),
+                   MAX(score * 1.0 / total_questions),
+                   MIN(score * 1.0 / total_questions),
+                   MAX(started_at)
+            FROM test_attempts
+            WHERE total_questions > 0
+            GROUP BY student_id
+        """)
+
+        for table, key_columns, key_exprs in RESPONSE_ROLLUPS:
+            _upsert_from_responses(cur, table, key_columns, key_exprs, "1 = 1", ())
+
+        mark_built(cur, "analytics")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    if "--rebuild" in sys.argv:
+        print("🔄 Rebuilding analytics rollups...")
+        rebuild_rollups()
+        print("✅ Rollups rebuilt")
+    else:
+        print("Usage: python analytics_rollups.py --rebuild")
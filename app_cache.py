@@ -0,0 +1,143 @@
+"""
+Process-wide caches shared by every Streamlit session.
+
+TTLCache is a small thread-safe read-through cache: values are loaded on
+a miss, kept for at most `ttl` seconds (a safety net - callers are
+expected to invalidate explicitly when the data changes) and evicted
+least-recently-used beyond `max_entries`. An invalidation that lands
+while a value is being loaded stops that load from being cached, so a
+load that read the old data can never outlive the invalidation. Every
+cache registers itself by name so hit/miss counters can be shown on the
+admin settings page.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry expiry and hit/miss counters"""
+
+    def __init__(self, name, ttl=600.0, max_entries=256):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._loads = {}  # key -> token of the latest load in flight (dropped on invalidation)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "loads": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, key, default=None):
+        """Cached value for key, or default (counts as a hit or a miss)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self._stats["misses"] += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key, value):
+        # Caller holds self._lock
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def get_or_load(self, key, loader, cache_if=None):
+        """
+        Return the cached value for key, calling loader() on a miss.
+        The loaded value is cached unless the key was invalidated while it
+        was loading, a newer load of the same key started meanwhile, or
+        cache_if(value) is false - it is still returned to the caller.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+
+        token = object()
+        with self._lock:
+            self._loads[key] = token
+        try:
+            value = loader()
+        except BaseException:
+            with self._lock:
+                if self._loads.get(key) is token:
+                    del self._loads[key]
+            raise
+        with self._lock:
+            self._stats["loads"] += 1
+            if self._loads.get(key) is token:
+                del self._loads[key]
+                if cache_if is None or cache_if(value):
+                    self._store(key, value)
+        return value
+
+    def invalidate(self, key=None):
+        """Drop one key, or everything when key is None"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._loads.clear()
+            else:
+                self._entries.pop(key, None)
+                self._loads.pop(key, None)
+            self._stats["invalidations"] += 1
+
+    def invalidate_where(self, predicate):
+        """Drop every key for which predicate(key) is true"""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+            for key in [key for key in self._loads if predicate(key)]:
+                del self._loads[key]
+            self._stats["invalidations"] += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["entries"] = len(self._entries)
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = snapshot["hits"] / lookups if lookups else 0.0
+        snapshot["ttl"] = self.ttl
+        snapshot["max_entries"] = self.max_entries
+        return snapshot
+
+
+def get_cache(name, ttl=600.0, max_entries=256):
+    """Return the process-wide cache called `name`, creating it on first use"""
+    cache = _registry.get(name)
+    if cache is None:
+        with _registry_lock:
+            cache = _registry.get(name)
+            if cache is None:
+                cache = TTLCache(name, ttl=ttl, max_entries=max_entries)
+                _registry[name] = cache
+    return cache
+
+
+def invalidate_all():
+    """Clear every registered cache"""
+    for cache in list(_registry.values()):
+        cache.invalidate()
+
+
+def get_cache_stats():
+    """name -> stats of every registered cache"""
+    return {name: cache.stats() for name, cache in sorted(_registry.items())}
@@ -1,7 +1,12 @@
 import bcrypt
-from db_connection import get_connection, get_placeholder, get_last_insert_id, USE_POSTGRES
+from db_connection import get_connection, get_placeholder, get_last_insert_id, USE_POSTGRES, register_statement, execute_statement
 import random
 
+LOGIN_QUERY = register_statement(
+    "auth_login",
+    "SELECT id, username, password_hash, role FROM users WHERE username = %s"
+)
+
 
 def generate_numeric_recovery_code():
     """Generate 8-digit unique numeric recovery code"""
@@ -51,12 +56,8 @@ def create_user(username, phone_number, password, role="student", school_name=No
 def login(username, password):
     conn = get_connection()
     cur = conn.cursor()
-    placeholder = get_placeholder()
 
-    cur.execute(
-        f"SELECT id, username, password_hash, role FROM users WHERE username = {placeholder}",
-        (username,)
-    )
+    execute_statement(cur, LOGIN_QUERY, (username,))
     user = cur.fetchone()
 
     conn.close()
@@ -0,0 +1,384 @@
+"""
+Shared helpers for benchmark and load-test scripts.
+
+Builds a throw-away SQLite database with the same tables the app uses
+(including the admin test tables) and seeds it with a synthetic question
+bank, so benchmarks never touch the real database/quiz.db or Neon.
+
+Scripts must point db_connection at the scratch file BEFORE importing any
+app module:
+
+    import bench_support
+    db_path = bench_support.use_scratch_database()
+    import generate_test_engine
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    phone_number TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    role TEXT DEFAULT 'student',
+    school_name TEXT,
+    class_name TEXT,
+    board_name TEXT,
+    recovery_code TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS students (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    name TEXT,
+    class TEXT
+);
+
+CREATE TABLE IF NOT EXISTS chapters (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    subject TEXT DEFAULT 'Physics',
+    chapter_number INTEGER NOT NULL,
+    chapter_name TEXT,
+    UNIQUE (subject, chapter_number)
+);
+
+CREATE TABLE IF NOT EXISTS concepts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chapter_id INTEGER REFERENCES chapters(id) ON DELETE CASCADE,
+    concept_name TEXT NOT NULL,
+    concept_type TEXT DEFAULT 'general'
+);
+
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    concept_id INTEGER REFERENCES concepts(id) ON DELETE CASCADE,
+    difficulty TEXT NOT NULL,
+    question_text TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS mcq_options (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    question_id INTEGER REFERENCES questions(id) ON DELETE CASCADE,
+    label TEXT NOT NULL,
+    option_text TEXT NOT NULL,
+    is_correct INTEGER DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS test_attempts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    total_questions INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS responses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    attempt_id INTEGER REFERENCES test_attempts(id) ON DELETE CASCADE,
+    question_id INTEGER REFERENCES questions(id) ON DELETE CASCADE,
+    selected_label TEXT,
+    is_correct INTEGER DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS admin_tests (
+    admin_test_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    test_name TEXT NOT NULL,
+    created_by INTEGER REFERENCES users(id),
+    total_questions INTEGER NOT NULL,
+    duration_minutes INTEGER NOT NULL,
+    easy_percentage INTEGER,
+    medium_percentage INTEGER,
+    hard_percentage INTEGER,
+    chapters TEXT,
+    is_active INTEGER DEFAULT 1,
+    allow_retake INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS admin_test_questions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    admin_test_id INTEGER REFERENCES admin_tests(admin_test_id) ON DELETE CASCADE,
+    question_id INTEGER REFERENCES questions(id),
+    question_order INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS admin_test_attempts (
+    attempt_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    admin_test_id INTEGER REFERENCES admin_tests(admin_test_id) ON DELETE CASCADE,
+    user_id INTEGER REFERENCES users(id),
+    score INTEGER,
+    total_questions INTEGER,
+    percentage REAL,
+    attempted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS admin_test_responses (
+    response_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    attempt_id INTEGER REFERENCES admin_test_attempts(attempt_id) ON DELETE CASCADE,
+    question_id INTEGER REFERENCES questions(id),
+    selected_answer TEXT,
+    is_correct INTEGER DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_concepts_chapter ON concepts(chapter_id);
+CREATE INDEX IF NOT EXISTS idx_questions_concept ON questions(concept_id);
+CREATE INDEX IF NOT EXISTS idx_mcq_options_question ON mcq_options(question_id);
+CREATE INDEX IF NOT EXISTS idx_test_attempts_student ON test_attempts(student_id);
+CREATE INDEX IF NOT EXISTS idx_responses_attempt ON responses(attempt_id);
+CREATE INDEX IF NOT EXISTS idx_responses_question ON responses(question_id);
+CREATE INDEX IF NOT EXISTS idx_admin_test_questions_test ON admin_test_questions(admin_test_id);
+CREATE INDEX IF NOT EXISTS idx_admin_test_attempts_user ON admin_test_attempts(user_id, admin_test_id);
+CREATE INDEX IF NOT EXISTS idx_admin_test_responses_attempt ON admin_test_responses(attempt_id);
+CREATE INDEX IF NOT EXISTS idx_users_role_sort_key ON users(role, COALESCE(created_at, '1970-01-01 00:00:00') DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_users_username_search ON users(username COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_users_phone_search ON users(phone_number COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_users_school_search ON users(school_name COLLATE NOCASE);
+"""
+
+DIFFICULTIES = ("easy", "medium", "hard")
+OPTION_LABELS = ("A", "B", "C", "D")
+BOARDS = ("ICSE", "CBSE", "State Board", "Other")
+
+
+def use_scratch_database(path=None):
+    """
+    Point db_connection at a scratch SQLite file and create the schema.
+    Must be called before db_connection is imported.
+    """
+    if "db_connection" in sys.modules:
+        raise RuntimeError("use_scratch_database() must run before db_connection is imported")
+
+    if path is None:
+        fd, path = tempfile.mkstemp(prefix="quiz_bench_", suffix=".db")
+        os.close(fd)
+
+    os.environ["USE_POSTGRES"] = "false"
+    os.environ["SQLITE_DB_PATH"] = path
+
+    conn = sqlite3.connect(path)
+    conn.executescript(SQLITE_SCHEMA)
+    conn.commit()
+    conn.close()
+    return path
+
+
+def seed_question_bank(db_path, subjects=None, concepts_per_chapter=5, questions_per_concept=30, seed=42):
+    """
+    Insert chapters, concepts, questions and 4 options per question.
+
+    Args:
+        db_path: str - SQLite file created by use_scratch_database()
+        subjects: dict subject -> list of chapter numbers (default: 3 subjects x 10 chapters)
+        concepts_per_chapter: int
+        questions_per_concept: int - spread evenly over easy/medium/hard
+
+    Returns:
+        dict with counts of inserted rows
+    """
+    rng = random.Random(seed)
+    if subjects is None:
+        subjects = {name: list(range(1, 11)) for name in ("Biology", "Physics", "Chemistry")}
+
+    conn = sqlite3.connect(db_path)
+    cur = conn.cursor()
+    counts = {"chapters": 0, "concepts": 0, "questions": 0, "options": 0}
+
+    for subject, chapter_numbers in subjects.items():
+        for ch_num in chapter_numbers:
+            cur.execute(
+                "INSERT INTO chapters (subject, chapter_number, chapter_name) VALUES (?, ?, ?)",
+                (subject, ch_num, f"{subject} Chapter {ch_num}")
+            )
+            chapter_id = cur.lastrowid
+            counts["chapters"] += 1
+
+            for c in range(concepts_per_chapter):
+                cur.execute(
+                    "INSERT INTO concepts (chapter_id, concept_name) VALUES (?, ?)",
+                    (chapter_id, f"{subject} {ch_num}.{c + 1} concept")
+                )
+                concept_id = cur.lastrowid
+                counts["concepts"] += 1
+
+                option_rows = []
+                for q in range(questions_per_concept):
+                    difficulty = DIFFICULTIES[q % 3]
+                    cur.execute(
+                        "INSERT INTO questions (concept_id, difficulty, question_text) VALUES (?, ?, ?)",
+                        (concept_id, difficulty, f"[{subject} {ch_num}.{c + 1}] synthetic {difficulty} question {q + 1}?")
+                    )
+                    qid = cur.lastrowid
+                    correct = rng.randrange(4)
+                    for i, label in enumerate(OPTION_LABELS):
+                        option_rows.append((qid, label, f"Option {label} for question {qid}", 1 if i == correct else 0))
+                    counts["questions"] += 1
+
+                cur.executemany(
+                    "INSERT INTO mcq_options (question_id, label, option_text, is_correct) VALUES (?, ?, ?, ?)",
+                    option_rows
+                )
+                counts["options"] += len(option_rows)
+
+    conn.commit()
+    conn.close()
+    return counts
+
+
+def seed_students_and_attempts(db_path, students=100, attempts_per_student=10, responses_per_attempt=10,
+                               admin_share=0.5, admin_tests=5, seed=42, batch_size=50000):
+    """
+    Insert students with custom and admin test attempts on top of a seeded bank.
+
+    Custom attempts get `responses_per_attempt` responses each; admin attempts
+    carry only their score (the admin response table is not needed for rankings).
+
+    Args:
+        db_path: str - SQLite file already seeded by seed_question_bank()
+        students: int
+        attempts_per_student: int - total attempts, split by admin_share
+        responses_per_attempt: int - responses per custom attempt
+        admin_share: float - fraction of each student's attempts that are admin tests
+
+    Returns:
+        dict with counts of inserted rows
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    cur = conn.cursor()
+    question_ids = [row[0] for row in cur.execute("SELECT id FROM questions")]
+    if not question_ids:
+        raise ValueError("seed_question_bank() must run first")
+
+    first_user = (cur.execute("SELECT COALESCE(MAX(id), 0) FROM users").fetchone()[0]) + 1
+    cur.executemany(
+        """INSERT INTO users (id, username, phone_number, password_hash, role, school_name, class_name, board_name)
+           VALUES (?, ?, ?, 'x', 'student', ?, '9', ?)""",
+        [(first_user + i, f"student{first_user + i}", f"9{first_user + i:09d}",
+          f"School {rng.randrange(50)}", rng.choice(BOARDS)) for i in range(students)]
+    )
+
+    first_test = (cur.execute("SELECT COALESCE(MAX(admin_test_id), 0) FROM admin_tests").fetchone()[0]) + 1
+    cur.executemany(
+        "INSERT INTO admin_tests (admin_test_id, test_name, total_questions, duration_minutes) VALUES (?, ?, 20, 30)",
+        [(first_test + i, f"Synthetic Test {i + 1}") for i in range(admin_tests)]
+    )
+
+    attempt_id = (cur.execute("SELECT COALESCE(MAX(id), 0) FROM test_attempts").fetchone()[0]) + 1
+    counts = {"students": students, "custom_attempts": 0, "admin_attempts": 0, "responses": 0}
+    attempts, responses, admin_attempts = [], [], []
+
+    def flush():
+        cur.executemany("INSERT INTO test_attempts (id, student_id, total_questions, score, started_at) VALUES (?, ?, ?, ?, ?)", attempts)
+        cur.executemany("INSERT INTO responses (attempt_id, question_id, selected_label, is_correct) VALUES (?, ?, ?, ?)", responses)
+        cur.executemany(
+            """INSERT INTO admin_test_attempts (admin_test_id, user_id, score, total_questions, percentage, attempted_at)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            admin_attempts
+        )
+        attempts.clear()
+        responses.clear()
+        admin_attempts.clear()
+
+    for i in range(students):
+        user_id = first_user + i
+        skill = rng.uniform(0.3, 0.95)
+        for n in range(attempts_per_student):
+            taken_at = f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(8, 20):02d}:00:00"
+            if rng.random() < admin_share:
+                total = 20
+                score = sum(1 for _ in range(total) if rng.random() < skill)
+                admin_attempts.append((first_test + rng.randrange(admin_tests), user_id, score, total,
+                                       round(score * 100.0 / total, 2), taken_at))
+                counts["admin_attempts"] += 1
+            else:
+                score = 0
+                for qid in rng.sample(question_ids, responses_per_attempt):
+                    correct = 1 if rng.random() < skill else 0
+                    score += correct
+                    responses.append((attempt_id, qid, OPTION_LABELS[rng.randrange(4)], correct))
+                attempts.append((attempt_id, user_id, responses_per_attempt, score, taken_at))
+                attempt_id += 1
+                counts["custom_attempts"] += 1
+                counts["responses"] += responses_per_attempt
+        if len(responses) >= batch_size:
+            flush()
+
+    flush()
+    conn.commit()
+    conn.close()
+    return counts
+
+
+class CountingCursor:
+    """
+    Cursor wrapper that counts execute() calls (i.e. DB round trips).
+    If counter["rtt"] is set, each call also sleeps that many seconds to
+    simulate network latency to a hosted database such as Neon.
+    """
+
+    def __init__(self, cursor, counter):
+        self._cursor = cursor
+        self._counter = counter
+
+    def _round_trip(self):
+        self._counter["queries"] += 1
+        if self._counter.get("rtt"):
+            time.sleep(self._counter["rtt"])
+
+    def execute(self, *args, **kwargs):
+        self._round_trip()
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self._round_trip()
+        return self._cursor.executemany(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class CountingConnection:
+    """Connection wrapper handing out CountingCursors"""
+
+    def __init__(self, conn, counter):
+        self._conn = conn
+        self._counter = counter
+
+    def cursor(self, *args, **kwargs):
+        return CountingCursor(self._conn.cursor(*args, **kwargs), self._counter)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def counting_connection_factory(get_connection, counter):
+    """Wrap a get_connection() function so every cursor counts its round trips"""
+    def factory():
+        counter["connections"] += 1
+        return CountingConnection(get_connection(), counter)
+    return factory
+
+
+def new_counter(rtt_ms=0):
+    return {"queries": 0, "connections": 0, "rtt": rtt_ms / 1000.0}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def timed(fn, *args, **kwargs):
+    """Run fn and return (result, elapsed_seconds)"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
@@ -0,0 +1,180 @@
+"""
+Benchmark: legacy fan-out leaderboard query vs. the leaderboard engine.
+
+Seeds a scratch SQLite database with a synthetic bank plus
+--students x --attempts test attempts, then times:
+- the legacy single-CTE query (aborted after --legacy-timeout seconds)
+- a full rebuild_leaderboard()
+- get_leaderboard() top-50 for every board filter
+- incremental updates for new submissions (record_custom_attempt)
+and checks that the incrementally maintained table matches a rebuild.
+
+Usage:
+    python benchmark_leaderboard.py
+    python benchmark_leaderboard.py --students 1000 --attempts 20 --legacy-timeout 30
+"""
+import argparse
+import os
+import random
+import statistics
+import threading
+
+import bench_support
+
+LEGACY_QUERY = """
+    WITH user_stats AS (
+        SELECT
+            u.id,
+            u.username,
+            u.board_name,
+            COUNT(DISTINCT ta.id) as custom_tests,
+            COUNT(DISTINCT ata.attempt_id) as admin_tests,
+            COALESCE(SUM(ta.score), 0) as custom_score,
+            COALESCE(SUM(ta.total_questions), 0) as custom_total,
+            COALESCE(SUM(ata.score), 0) as admin_score,
+            COALESCE(SUM(ata.total_questions), 0) as admin_total,
+            COUNT(DISTINCT CASE WHEN q.difficulty = 'hard' AND r.is_correct = 1 THEN r.id END) as hard_correct
+        FROM users u
+        LEFT JOIN test_attempts ta ON u.id = ta.student_id
+        LEFT JOIN admin_test_attempts ata ON u.id = ata.user_id
+        LEFT JOIN responses r ON ta.id = r.attempt_id
+        LEFT JOIN questions q ON r.question_id = q.id
+        WHERE u.role = 'student'
+        GROUP BY u.id, u.username, u.board_name
+    )
+    SELECT
+        username,
+        (custom_tests + admin_tests) as total_tests,
+        ROUND(
+            CASE
+                WHEN (custom_total + admin_total) > 0
+                THEN ((custom_score + admin_score) * 100.0 / (custom_total + admin_total))
+                ELSE 0
+            END, 2
+        ) as overall_accuracy,
+        hard_correct
+    FROM user_stats
+    WHERE (custom_tests + admin_tests) > 0
+    ORDER BY hard_correct DESC, overall_accuracy DESC, total_tests DESC
+    LIMIT 50
+"""
+
+
+def run_legacy(get_connection, timeout):
+    """Run the legacy query, interrupting it after `timeout` seconds. Returns (rows or None, seconds)."""
+    conn = get_connection()
+    timer = threading.Timer(timeout, conn.interrupt)
+    timer.start()
+    try:
+        rows, elapsed = bench_support.timed(lambda: conn.execute(LEGACY_QUERY).fetchall())
+    except Exception:
+        rows, elapsed = None, timeout
+    finally:
+        timer.cancel()
+        conn.close()
+    return rows, elapsed
+
+
+def snapshot(get_connection, user_ids):
+    conn = get_connection()
+    try:
+        marks = ", ".join("?" for _ in user_ids)
+        return conn.execute(
+            f"SELECT * FROM leaderboard_scores WHERE user_id IN ({marks}) ORDER BY user_id", list(user_ids)
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def run(args):
+    db_path = bench_support.use_scratch_database()
+    bench_support.seed_question_bank(db_path)
+    print(f"Seeding {args.students} students x {args.attempts} attempts...")
+    counts, seed_s = bench_support.timed(
+        bench_support.seed_students_and_attempts, db_path,
+        students=args.students, attempts_per_student=args.attempts, responses_per_attempt=args.responses
+    )
+    print(f"  {counts} in {seed_s:.1f}s")
+
+    from db_connection import get_connection
+    import leaderboard_engine
+
+    legacy_rows, legacy_s = (None, 0.0)
+    if args.legacy_timeout > 0:
+        print(f"Running legacy query (timeout {args.legacy_timeout:.0f}s)...")
+        legacy_rows, legacy_s = run_legacy(get_connection, args.legacy_timeout)
+
+    _, rebuild_s = bench_support.timed(leaderboard_engine.rebuild_leaderboard)
+
+    top_timings = {}
+    for board in (None,) + bench_support.BOARDS:
+        timings = []
+        for _ in range(args.repeat):
+            rows, elapsed = bench_support.timed(leaderboard_engine.get_leaderboard, board, 50)
+            timings.append(elapsed)
+        top_timings[board or "All Boards"] = statistics.median(timings)
+
+    # Incremental updates for a batch of new custom attempts
+    conn = get_connection()
+    cur = conn.cursor()
+    rng = random.Random(7)
+    question_ids = [row[0] for row in cur.execute("SELECT id FROM questions")]
+    user_ids = [row[0] for row in cur.execute("SELECT id FROM users ORDER BY id LIMIT ?", (args.updates,))]
+    update_timings = []
+    for user_id in user_ids:
+        graded = [(qid, "A", rng.randrange(2)) for qid in rng.sample(question_ids, args.responses)]
+        score = sum(g[2] for g in graded)
+        cur.execute(
+            "INSERT INTO test_attempts (student_id, total_questions, score) VALUES (?, ?, ?)",
+            (user_id, len(graded), score)
+        )
+        attempt_id = cur.lastrowid
+        cur.executemany(
+            "INSERT INTO responses (attempt_id, question_id, selected_label, is_correct) VALUES (?, ?, ?, ?)",
+            [(attempt_id, *g) for g in graded]
+        )
+        _, elapsed = bench_support.timed(
+            leaderboard_engine.record_custom_attempt, cur, user_id, attempt_id, score, len(graded)
+        )
+        update_timings.append(elapsed)
+    conn.commit()
+    conn.close()
+
+    incremental = snapshot(get_connection, user_ids)
+    leaderboard_engine.rebuild_leaderboard()
+    rebuilt = snapshot(get_connection, user_ids)
+
+    print("=" * 60)
+    print(f"LEADERBOARD BENCHMARK ({args.students} students x {args.attempts} attempts)")
+    print("=" * 60)
+    if args.legacy_timeout <= 0:
+        print("legacy query: skipped")
+    elif legacy_rows is None:
+        print(f"legacy query: TIMED OUT after {legacy_s:.1f}s")
+    else:
+        print(f"legacy query: {legacy_s * 1000:10.1f} ms")
+    print(f"rebuild:      {rebuild_s * 1000:10.1f} ms (one-off / backfill)")
+    for board, median_s in top_timings.items():
+        print(f"top-50 {board:<12} median {median_s * 1000:8.2f} ms")
+    print(f"incremental update: median {statistics.median(update_timings) * 1000:.2f} ms, "
+          f"p95 {bench_support.percentile(update_timings, 95) * 1000:.2f} ms")
+    print(f"incremental == rebuild: {'✅' if incremental == rebuilt else '❌'}")
+
+    if legacy_rows is not None:
+        engine_rows = leaderboard_engine.get_leaderboard(None, 50)
+        engine_accuracy = {row[0]: row[5] for row in engine_rows}
+        inflated = sum(1 for row in legacy_rows if engine_accuracy.get(row[0]) not in (None, row[2]))
+        print(f"legacy top-50 rows with a different accuracy than the engine: {inflated}")
+
+    os.remove(db_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--attempts", type=int, default=50, help="attempts per student (custom + admin)")
+    parser.add_argument("--responses", type=int, default=10, help="responses per custom attempt")
+    parser.add_argument("--legacy-timeout", type=float, default=60.0, help="seconds; 0 skips the legacy query")
+    parser.add_argument("--updates", type=int, default=200, help="incremental submissions to time")
+    parser.add_argument("--repeat", type=int, default=5)
+    run(parser.parse_args())
@@ -0,0 +1,80 @@
+"""
+Benchmark: per-question option fetch (N+1) vs. one batched option query.
+
+Runs on a scratch SQLite database seeded with a synthetic bank, and can
+simulate the network round trip to Neon with --rtt-ms.
+
+Usage:
+    python benchmark_option_fetch.py
+    python benchmark_option_fetch.py --questions 100 --rtt-ms 20 --repeat 5
+"""
+import argparse
+import os
+import random
+import statistics
+
+import bench_support
+
+
+def legacy_build_questions(cur, question_rows, placeholder):
+    """The pre-batching implementation: one options query per question"""
+    questions = []
+    for qid, qtext, difficulty in question_rows:
+        cur.execute(
+            "SELECT label, option_text, is_correct FROM mcq_options WHERE question_id = {}".format(placeholder),
+            (qid,)
+        )
+        options = cur.fetchall()
+        random.shuffle(options)
+        questions.append({"id": qid, "text": qtext, "difficulty": difficulty, "options": options})
+    return questions
+
+
+def run(args):
+    db_path = bench_support.use_scratch_database()
+    bench_support.seed_question_bank(db_path, questions_per_concept=max(30, args.questions // 10))
+
+    from db_connection import get_connection, get_placeholder
+    from generate_test_engine import build_questions
+
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT id, question_text, difficulty FROM questions")
+    all_rows = cur.fetchall()
+    conn.close()
+
+    results = {}
+    for name in ("legacy", "batched"):
+        timings = []
+        queries = []
+        for _ in range(args.repeat):
+            rows = random.sample(all_rows, args.questions)
+            counter = bench_support.new_counter(args.rtt_ms)
+            conn = bench_support.CountingConnection(get_connection(), counter)
+            cur = conn.cursor()
+            if name == "legacy":
+                _, elapsed = bench_support.timed(legacy_build_questions, cur, rows, get_placeholder())
+            else:
+                _, elapsed = bench_support.timed(build_questions, cur, rows)
+            conn.close()
+            timings.append(elapsed)
+            queries.append(counter["queries"])
+        results[name] = (statistics.median(timings), max(queries))
+
+    print("=" * 60)
+    print(f"OPTION FETCH BENCHMARK ({args.questions} questions, rtt={args.rtt_ms}ms, repeat={args.repeat})")
+    print("=" * 60)
+    for name, (median_s, round_trips) in results.items():
+        print(f"{name:>8}: {round_trips:5d} round trips | median {median_s * 1000:9.2f} ms")
+    speedup = results["legacy"][0] / results["batched"][0] if results["batched"][0] else float("inf")
+    print(f"speedup: {speedup:.1f}x")
+
+    os.remove(db_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=100, help="questions per test")
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="simulated network round trip per query")
+    parser.add_argument("--repeat", type=int, default=5)
+    run(parser.parse_args())
@@ -0,0 +1,277 @@
+"""
+Benchmark suite for generate_test_engine, with stored baselines.
+
+Runs every engine entry point over a matrix of
+- bank sizes       (--bank-sizes: questions per concept; 3 subjects x 10 chapters x 5 concepts)
+- selection widths (--widths: chapters selected, 1 / 3 / 10 by default)
+- test lengths     (--lengths: questions per test)
+
+on a scratch SQLite database, and records per case:
+- best latency: the median over --rounds rounds of the best of --repeat calls
+  (each case is measured in --runs full passes and the median kept)
+- median and p95 latency over all calls
+- spread: max - min of the per-round (or per-run) bests, how noisy the case is
+- statements executed per call (query_stats)
+- peak memory allocated per call (tracemalloc, measured in a separate pass)
+
+Operations: load_question_bank, generate_test_from_concepts,
+generate_test_with_difficulty_cap, create_admin_test, and
+get_admin_test_questions both cold (paper cache invalidated before each
+call, so the stored paper is read) and warm (cache hits).
+
+--save-baseline writes the results to the baseline file; otherwise they are
+compared with it and the script exits with status 1 when a case regresses:
+best and median latency both more than --threshold above the baseline and
+above the noise floor (MIN_DELTA_MS, or the case's spread in either run if
+larger), memory more than --threshold and MIN_DELTA_KB above it, or any
+increase in statements per call. Latency baselines are
+machine specific - save one on the machine you compare on.
+
+Usage:
+    python benchmark_test_engine.py --save-baseline
+    python benchmark_test_engine.py
+    python benchmark_test_engine.py --bank-sizes 10 30 --lengths 20 --threshold 0.5
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import bench_support
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_test_engine_baseline.json")
+SUBJECT = "Physics"
+MIX = (30, 40, 30)
+
+# Differences below these are treated as noise, whatever the ratio
+MIN_DELTA_MS = 2.0
+MIN_DELTA_KB = 32.0
+
+
+def reseed(db_path, questions_per_concept):
+    """Replace the scratch bank (and admin tests) with one of the given size; returns the question count"""
+    conn = sqlite3.connect(db_path)
+    for table in ("admin_test_questions", "admin_tests", "mcq_options", "questions", "concepts", "chapters", "users"):
+        conn.execute(f"DELETE FROM {table}")
+    conn.execute(
+        "INSERT INTO users (id, username, phone_number, password_hash, role) VALUES (1, 'admin', '0', 'x', 'admin')"
+    )
+    conn.commit()
+    conn.close()
+    counts = bench_support.seed_question_bank(db_path, questions_per_concept=questions_per_concept)
+
+    from question_bank import bump_bank_revision, get_question_bank
+    bump_bank_revision()
+    get_question_bank(force_check=True)
+    return counts["questions"]
+
+
+def measure(fn, repeat, rounds=3, setup=None):
+    """
+    Time fn() `repeat` times in each of `rounds` rounds (calling setup()
+    untimed before each call), then once more under tracemalloc.
+    Returns the case result dict.
+    """
+    from query_stats import track_render
+
+    timings, round_bests, queries, result = [], [], [], None
+    for _ in range(rounds):
+        round_timings = []
+        # Collections would land on arbitrary calls; keep them out of the timings (as timeit does)
+        gc.collect()
+        gc.disable()
+        try:
+            for _ in range(repeat):
+                if setup is not None:
+                    setup()
+                with track_render("benchmark") as statements:
+                    start = time.perf_counter()
+                    result = fn()
+                    round_timings.append(time.perf_counter() - start)
+                    queries.append(statements.totals()[0])
+        finally:
+            gc.enable()
+        round_bests.append(min(round_timings))
+        timings.extend(round_timings)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "best_ms": round(statistics.median(round_bests) * 1000, 3),
+        "spread_ms": round((max(round_bests) - min(round_bests)) * 1000, 3),
+        "median_ms": round(statistics.median(timings) * 1000, 3),
+        "p95_ms": round(bench_support.percentile(timings, 95) * 1000, 3),
+        "queries": max(queries),
+        "peak_kb": round((peak - before) / 1024, 1),
+        "ok": result is not None,
+    }
+
+
+def run_cases(args, db_path):
+    import generate_test_engine as engine
+    from question_bank import get_question_bank, load_question_bank
+
+    def measure_case(fn, repeat=args.repeat, setup=None):
+        return measure(fn, repeat, args.rounds, setup)
+
+    results = {}
+    for size in args.bank_sizes:
+        questions = reseed(db_path, size)
+        print(f"bank: {questions} questions ({size} per concept)")
+        results[f"load_question_bank|bank={size}"] = measure_case(load_question_bank, max(1, args.repeat // 4))
+
+        bank = get_question_bank()
+        for width in args.widths:
+            chapters = list(range(1, width + 1))
+            concept_ids = bank.concepts_for_chapters(chapters, SUBJECT)
+            for length in args.lengths:
+                case = f"bank={size}|width={width}|len={length}"
+                results[f"generate_test_from_concepts|{case}"] = measure_case(
+                    lambda: engine.generate_test_from_concepts(concept_ids, length, *MIX)
+                )
+                results[f"generate_test_with_difficulty_cap|{case}"] = measure_case(
+                    lambda: engine.generate_test_with_difficulty_cap(chapters, length, *MIX, subject=SUBJECT)
+                )
+                results[f"create_admin_test|{case}"] = measure_case(
+                    lambda: engine.create_admin_test("bench", chapters, length, 30, *MIX, 1, subject=SUBJECT)
+                )
+                test_id = engine.create_admin_test("bench", chapters, length, 30, *MIX, 1, subject=SUBJECT)
+                if test_id:
+                    # Cold: the stored paper is read from the database on every call
+                    results[f"get_admin_test_questions_cold|{case}"] = measure_case(
+                        lambda: engine.get_admin_test_questions(test_id),
+                        setup=lambda: engine._paper_cache.invalidate(test_id)
+                    )
+                    results[f"get_admin_test_questions_warm|{case}"] = measure_case(
+                        lambda: engine.get_admin_test_questions(test_id)
+                    )
+    return results
+
+
+def merge_runs(runs):
+    """
+    Per case: the median of each metric over the runs. spread_ms widens to the
+    run-to-run spread of best_ms, so drift between runs counts as noise.
+    """
+    merged = {}
+    for case in runs[0]:
+        results = [run[case] for run in runs if case in run]
+        bests = [r["best_ms"] for r in results]
+        merged[case] = {
+            "best_ms": statistics.median(bests),
+            "spread_ms": round(max(max(r["spread_ms"] for r in results), max(bests) - min(bests)), 3),
+            "median_ms": statistics.median(r["median_ms"] for r in results),
+            "p95_ms": statistics.median(r["p95_ms"] for r in results),
+            "queries": max(r["queries"] for r in results),
+            "peak_kb": statistics.median(r["peak_kb"] for r in results),
+            "ok": all(r["ok"] for r in results),
+        }
+    return merged
+
+
+def compare(results, baseline, threshold):
+    """List of (case, metric, baseline value, current value) that regressed"""
+    regressions = []
+    for case, current in results.items():
+        base = baseline.get(case)
+        if base is None:
+            continue
+        # A latency regression has to show in both the best (median over rounds) and the
+        # median call, by more than the case's own round-to-round spread
+        noise_ms = max(MIN_DELTA_MS, base.get("spread_ms", 0), current.get("spread_ms", 0))
+        if all(current[metric] > base[metric] * (1 + threshold) and current[metric] - base[metric] > noise_ms
+               for metric in ("best_ms", "median_ms")):
+            regressions.append((case, "best_ms", base["best_ms"], current["best_ms"]))
+        if current["queries"] > base["queries"]:
+            regressions.append((case, "queries", base["queries"], current["queries"]))
+        if current["peak_kb"] > base["peak_kb"] * (1 + threshold) and current["peak_kb"] - base["peak_kb"] > MIN_DELTA_KB:
+            regressions.append((case, "peak_kb", base["peak_kb"], current["peak_kb"]))
+        if base.get("ok") and not current["ok"]:
+            regressions.append((case, "ok", True, False))
+    return regressions
+
+
+def print_results(results, baseline):
+    print("=" * 127)
+    print(f"{'case':<62}{'best ms':>9}{'median ms':>11}{'p95 ms':>10}{'queries':>9}{'peak KB':>10}{'vs base':>10}  ok")
+    print("=" * 127)
+    for case, result in results.items():
+        base = baseline.get(case)
+        change = f"{(result['best_ms'] / base['best_ms'] - 1) * 100:+.0f}%" if base and base.get("best_ms") else "-"
+        print(f"{case:<62}{result['best_ms']:>9.2f}{result['median_ms']:>11.2f}{result['p95_ms']:>10.2f}{result['queries']:>9}"
+              f"{result['peak_kb']:>10.1f}{change:>10}  {'✅' if result['ok'] else '❌'}")
+
+
+def run(args):
+    db_path = bench_support.use_scratch_database()
+    try:
+        runs = []
+        for number in range(1, args.runs + 1):
+            print(f"run {number}/{args.runs}")
+            runs.append(run_cases(args, db_path))
+    finally:
+        os.remove(db_path)
+    results = merge_runs(runs)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "saved_at": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "machine": platform.platform(),
+                "repeat": args.repeat,
+                "rounds": args.rounds,
+                "runs": args.runs,
+                "results": results,
+            }, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline saved to {args.baseline}")
+        return 0
+
+    if not baseline:
+        print(f"no baseline at {args.baseline} - run with --save-baseline first")
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    if not regressions:
+        print(f"✅ no regressions (threshold {args.threshold:.0%})")
+        return 0
+    print(f"❌ {len(regressions)} regression(s) (threshold {args.threshold:.0%}):")
+    for case, metric, base, current in regressions:
+        print(f"  {case}: {metric} {base} -> {current}")
+    return 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bank-sizes", type=int, nargs="+", default=[10, 30, 100], help="questions per concept")
+    parser.add_argument("--widths", type=int, nargs="+", default=[1, 3, 10], help="chapters selected")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 30, 60], help="questions per test")
+    parser.add_argument("--repeat", type=int, default=20, help="calls per round")
+    parser.add_argument("--rounds", type=int, default=3, help="rounds per case (best = median of round bests)")
+    parser.add_argument("--runs", type=int, default=3, help="full passes over all cases (results = median per case)")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown / memory growth (0.25 = 25%%)")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    sys.exit(run(parser.parse_args()))
@@ -1,52 +1,351 @@
 """
 Database connection manager - works with both SQLite (local) and PostgreSQL (production)
 """
+import functools
+import json
 import os
+import re
 import sqlite3
+import threading
+import time
 from dotenv import load_dotenv
 
 # Load .env file
 load_dotenv()
 
+from query_stats import instrument  # noqa: E402 - reads its settings from the environment
+
 # Check if running on Streamlit Cloud (has secrets) or locally
 USE_POSTGRES = os.getenv("USE_POSTGRES", "false").lower() == "true"
 
-def get_connection():
-    """Get database connection - PostgreSQL in production, SQLite locally"""
-    if USE_POSTGRES:
-        # PostgreSQL for production
-        import psycopg2
+# Local SQLite file (override with SQLITE_DB_PATH, e.g. for benchmarks on a scratch database)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", os.path.join(BASE_DIR, "database", "quiz.db"))
+
+# Connection pool settings (PostgreSQL only - SQLite connections are local and cheap)
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN", "1"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX", "10"))
+POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))
+POOL_WAIT_TIMEOUT = float(os.getenv("DB_POOL_WAIT_TIMEOUT", "30"))
+POOL_HEALTH_CHECK_AFTER = float(os.getenv("DB_POOL_HEALTH_CHECK_AFTER", "5"))
+
+# Server-side prepared statements for registered queries (PostgreSQL only).
+# Off by default: SQL-level PREPARE needs a session, which a transaction-mode
+# pooler (PgBouncer, Neon's pooled endpoint) does not keep. Enable only on a
+# direct connection.
+PREPARE_STATEMENTS = os.getenv("DB_PREPARE_STATEMENTS", "false").lower() == "true"
+
+
+def _get_postgres_params():
+    """Read PostgreSQL credentials from environment variables or Streamlit secrets"""
+    # Try to get from environment variables first (for scripts)
+    host = os.getenv("POSTGRES_HOST")
+    database = os.getenv("POSTGRES_DATABASE")
+    user = os.getenv("POSTGRES_USER")
+    password = os.getenv("POSTGRES_PASSWORD")
+    port = os.getenv("POSTGRES_PORT", "5432")
+    
+    # If env vars not found, try Streamlit secrets
+    if not host:
+        import streamlit as st
+        host = st.secrets["postgres"]["host"]
+        database = st.secrets["postgres"]["database"]
+        user = st.secrets["postgres"]["user"]
+        password = st.secrets["postgres"]["password"]
+        port = st.secrets["postgres"]["port"]
+    
+    return {
+        "host": host,
+        "database": database,
+        "user": user,
+        "password": password,
+        "port": port,
+        "sslmode": "require"
+    }
+
+
+def _connect_postgres():
+    """Open a brand new PostgreSQL connection (full TCP + TLS + auth handshake)"""
+    import psycopg2
+    return psycopg2.connect(connection_factory=_prepared_connection_class(), **_get_postgres_params())
+
+
+class PooledConnection:
+    """
+    Thin wrapper around a pooled connection.
+    
+    Behaves like the underlying DB-API connection, except that close()
+    hands the connection back to the pool instead of closing the socket,
+    so existing `conn = get_connection() ... conn.close()` call sites
+    get pooling without any changes.
+    """
+    
+    def __init__(self, pool, raw_conn):
+        self._pool = pool
+        self._conn = raw_conn
+    
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise AttributeError(f"connection already returned to pool ({name})")
+        return getattr(self._conn, name)
+    
+    @property
+    def closed(self):
+        return self._conn is None or bool(getattr(self._conn, "closed", False))
+    
+    def close(self):
+        """Return the connection to the pool (safe to call more than once)"""
+        if self._conn is not None:
+            raw, self._conn = self._conn, None
+            self._pool.release(raw)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+    
+    def __del__(self):
+        # Callers that forget close() (or hit an exception before it)
+        # should not leak a pool slot forever
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    Process-wide, thread-safe pool of database connections.
+    
+    - Bounded: never holds more than max_size connections (idle + in use);
+      callers wait up to wait_timeout seconds for a free slot.
+    - Health checked: a connection idle for longer than health_check_after
+      seconds is pinged with SELECT 1 before it is handed out.
+    - Idle reaping: connections idle longer than idle_timeout are closed,
+      but the pool keeps at least min_size warm connections.
+    - Each checkout is exclusive until close(), so Streamlit script threads
+      never share a connection concurrently.
+    """
+    
+    def __init__(self, connect, min_size=1, max_size=10, idle_timeout=300,
+                 wait_timeout=30, health_check_after=5):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self._connect = connect
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+        self.health_check_after = health_check_after
+        
+        self._idle = []  # list of (raw_conn, last_used_monotonic)
+        self._size = 0   # idle + in use
+        self._cond = threading.Condition()
+        self._stats = {
+            "hits": 0,          # checkout served by an idle connection
+            "misses": 0,        # checkout had to open a new connection
+            "waits": 0,         # checkout had to wait for a free slot
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,      # checkout gave up waiting
+            "health_failures": 0,
+            "reaped": 0,        # idle connections closed by the reaper
+            "discarded": 0,     # broken connections dropped on release
+        }
+    
+    def _close_quietly(self, raw_conn):
+        try:
+            raw_conn.close()
+        except Exception:
+            pass
+    
+    def _is_healthy(self, raw_conn):
+        if getattr(raw_conn, "closed", False):
+            return False
+        try:
+            cur = raw_conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            cur.close()
+            raw_conn.rollback()
+            return True
+        except Exception:
+            return False
+    
+    def _reap_idle(self, now):
+        """Close connections idle past idle_timeout. Caller holds the lock."""
+        keep = []
+        reaped = []
+        # Oldest connections are at the front of the list
+        for raw_conn, last_used in self._idle:
+            surplus = self._size - len(reaped) > self.min_size
+            if surplus and now - last_used > self.idle_timeout:
+                reaped.append(raw_conn)
+            else:
+                keep.append((raw_conn, last_used))
+        self._idle = keep
+        self._size -= len(reaped)
+        self._stats["reaped"] += len(reaped)
+        return reaped
+    
+    def acquire(self):
+        """Check out a connection, opening a new one if the pool has room"""
+        start = time.monotonic()
+        deadline = start + self.wait_timeout
+        waited = False
         
-        # Try to get from environment variables first (for scripts)
-        host = os.getenv("POSTGRES_HOST")
-        database = os.getenv("POSTGRES_DATABASE")
-        user = os.getenv("POSTGRES_USER")
-        password = os.getenv("POSTGRES_PASSWORD")
-        port = os.getenv("POSTGRES_PORT", "5432")
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                reaped = self._reap_idle(now)
+                
+                candidate = None
+                if self._idle:
+                    # LIFO keeps the hottest connections in use and lets
+                    # the cold ones at the front age out
+                    candidate, last_used = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                    last_used = None
+                else:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise TimeoutError(
+                            f"Timed out after {self.wait_timeout}s waiting for a database connection "
+                            f"(pool max_size={self.max_size})"
+                        )
+                    if not waited:
+                        waited = True
+                        self._stats["waits"] += 1
+                    self._cond.wait(remaining)
+                    continue
+            
+            for raw_conn in reaped:
+                self._close_quietly(raw_conn)
+            
+            if candidate is not None:
+                needs_check = now - last_used > self.health_check_after
+                if needs_check and not self._is_healthy(candidate):
+                    self._close_quietly(candidate)
+                    with self._cond:
+                        self._stats["health_failures"] += 1
+                        self._size -= 1
+                        self._cond.notify()
+                    continue
+                with self._cond:
+                    self._stats["hits"] += 1
+                    self._record_wait(start, waited)
+                return candidate
+            
+            # Open a new connection outside the lock
+            try:
+                raw_conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats["misses"] += 1
+                self._record_wait(start, waited)
+            return raw_conn
+    
+    def _record_wait(self, start, waited):
+        if waited:
+            elapsed = time.monotonic() - start
+            self._stats["wait_time_total"] += elapsed
+            self._stats["wait_time_max"] = max(self._stats["wait_time_max"], elapsed)
+    
+    def release(self, raw_conn):
+        """Return a connection to the pool, discarding it if it is broken"""
+        reusable = not getattr(raw_conn, "closed", False)
+        if reusable:
+            try:
+                # End any transaction the caller left open (plain SELECTs
+                # in psycopg2 still open one) so the next user starts clean
+                raw_conn.rollback()
+            except Exception:
+                reusable = False
         
-        # If env vars not found, try Streamlit secrets
-        if not host:
-            import streamlit as st
-            host = st.secrets["postgres"]["host"]
-            database = st.secrets["postgres"]["database"]
-            user = st.secrets["postgres"]["user"]
-            password = st.secrets["postgres"]["password"]
-            port = st.secrets["postgres"]["port"]
+        with self._cond:
+            if reusable:
+                self._idle.append((raw_conn, time.monotonic()))
+            else:
+                self._size -= 1
+                self._stats["discarded"] += 1
+            self._cond.notify()
         
-        conn = psycopg2.connect(
-            host=host,
-            database=database,
-            user=user,
-            password=password,
-            port=port,
-            sslmode='require'
-        )
-        return conn
+        if not reusable:
+            self._close_quietly(raw_conn)
+    
+    def get_connection(self):
+        return PooledConnection(self, self.acquire())
+    
+    def stats(self):
+        """Snapshot of pool size and hit/miss/wait counters"""
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot["size"] = self._size
+            snapshot["idle"] = len(self._idle)
+            snapshot["in_use"] = self._size - len(self._idle)
+            snapshot["min_size"] = self.min_size
+            snapshot["max_size"] = self.max_size
+        checkouts = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = round(snapshot["hits"] / checkouts, 4) if checkouts else 0.0
+        return snapshot
+    
+    def close_all(self):
+        """Close every idle connection (in-use connections close on release)"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for raw_conn, _ in idle:
+            self._close_quietly(raw_conn)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide PostgreSQL connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    _connect_postgres,
+                    min_size=POOL_MIN_SIZE,
+                    max_size=POOL_MAX_SIZE,
+                    idle_timeout=POOL_IDLE_TIMEOUT,
+                    wait_timeout=POOL_WAIT_TIMEOUT,
+                    health_check_after=POOL_HEALTH_CHECK_AFTER
+                )
+    return _pool
+
+
+def get_pool_stats():
+    """Return pool metrics (hits, misses, waits, size...) or None when using SQLite"""
+    if not USE_POSTGRES or _pool is None:
+        return None
+    return _pool.stats()
+
+
+def get_connection():
+    """
+    Get database connection - PostgreSQL in production, SQLite locally.
+    Cursors are timed by query_stats (QUERY_STATS=false returns the bare connection).
+    """
+    if USE_POSTGRES:
+        # PostgreSQL for production - checked out from the shared pool,
+        # conn.close() returns it to the pool
+        return instrument(get_pool().get_connection())
     else:
         # SQLite for local development
-        BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-        DB_PATH = os.path.join(BASE_DIR, "database", "quiz.db")
-        return sqlite3.connect(DB_PATH)
+        return instrument(sqlite3.connect(SQLITE_DB_PATH))
 
 def execute_query(query, params=None, fetch=None):
     """
@@ -87,6 +386,38 @@ def execute_query(query, params=None, fetch=None):
         cur.close()
         conn.close()
 
+def bulk_insert(cursor, table, columns, rows, page_size=500):
+    """
+    Insert many rows in as few statements as possible.
+    
+    PostgreSQL: psycopg2 execute_values (one multi-row INSERT per page_size rows)
+    SQLite: executemany on a single prepared statement
+    
+    Args:
+        cursor: open cursor (the caller commits)
+        table: str - table name
+        columns: list[str] - column names
+        rows: list[tuple] - values, one tuple per row in column order
+    """
+    if not rows:
+        return
+    
+    column_list = ", ".join(columns)
+    if USE_POSTGRES:
+        from psycopg2.extras import execute_values
+        execute_values(
+            cursor,
+            f"INSERT INTO {table} ({column_list}) VALUES %s",
+            rows,
+            page_size=page_size
+        )
+    else:
+        value_placeholders = ", ".join(["?"] * len(columns))
+        cursor.executemany(
+            f"INSERT INTO {table} ({column_list}) VALUES ({value_placeholders})",
+            rows
+        )
+
 def get_db_type():
     """Return current database type for debugging"""
     return "PostgreSQL" if USE_POSTGRES else "SQLite"
@@ -95,21 +426,157 @@ def get_placeholder():
     """Return the correct parameter placeholder for current database"""
     return "%s" if USE_POSTGRES else "?"
 
+@functools.lru_cache(maxsize=512)
 def adapt_query(query):
     """
     Adapt query syntax for current database
     Replaces PostgreSQL-specific syntax with SQLite equivalents when needed
+    (memoized - call sites pass the same query strings over and over)
     """
     if not USE_POSTGRES:
         # Convert PostgreSQL syntax to SQLite
         query = query.replace("RETURNING id", "")
         query = query.replace("NOW()", "CURRENT_TIMESTAMP")
         # Replace %s with ? for SQLite
-        count = query.count("%s")
-        for _ in range(count):
-            query = query.replace("%s", "?", 1)
+        query = query.replace("%s", "?")
     return query
 
+
+# ================= STATEMENT REGISTRY =================
+# Hot queries are registered once under a name, written in PostgreSQL syntax
+# (%s placeholders, %% for a literal %, RETURNING, NOW(), TRUE/FALSE,
+# `= ANY(%s)` with an array_param() list).
+# Each is compiled for the current database on first use and cached, and on
+# PostgreSQL executed as a server-side prepared statement (PREPARE once per
+# connection, then EXECUTE), so the server skips parsing and planning.
+
+_PARAM_RE = re.compile(r"%[s%]")
+_RETURNING_RE = re.compile(r"\s+RETURNING\s+\w+\s*$", re.IGNORECASE)
+_BOOL_RE = re.compile(r"\b(TRUE|FALSE)\b")
+_ANY_RE = re.compile(r"=\s*ANY\(\s*%s\s*\)", re.IGNORECASE)
+
+_statements = {}   # name -> SQL as registered
+_compiled = {}     # name -> (sql for cursor.execute, PREPARE sql or None)
+_statements_lock = threading.Lock()
+_statement_stats = {"compiled": 0, "prepared": 0, "executions": 0}
+
+
+def register_statement(name, sql):
+    """
+    Register a named statement (PostgreSQL syntax). Returns the name.
+    Re-registering a name with different SQL is an error.
+    """
+    sql = sql.strip()
+    with _statements_lock:
+        existing = _statements.get(name)
+        if existing is not None and existing != sql:
+            raise ValueError(f"Statement {name!r} is already registered with different SQL")
+        _statements[name] = sql
+    return name
+
+
+def _compile_sqlite(sql):
+    sql = _RETURNING_RE.sub("", sql)
+    sql = sql.replace("NOW()", "CURRENT_TIMESTAMP")
+    sql = _BOOL_RE.sub(lambda match: "1" if match.group(1) == "TRUE" else "0", sql)
+    # array_param() passes the list as JSON on SQLite
+    sql = _ANY_RE.sub("IN (SELECT value FROM json_each(%s))", sql)
+    return _PARAM_RE.sub(lambda match: "?" if match.group(0) == "%s" else "%", sql)
+
+
+def _compile_prepare(name, sql):
+    """PREPARE statement with $1..$n parameters, and the number of parameters"""
+    count = 0
+
+    def number(match):
+        nonlocal count
+        if match.group(0) == "%%":
+            return "%"
+        count += 1
+        return f"${count}"
+
+    body = _PARAM_RE.sub(number, sql)
+    return f"PREPARE {name} AS {body}", count
+
+
+def compile_statement(name):
+    """
+    The registered statement compiled for the current database, cached.
+
+    Returns:
+        (sql, prepare) - sql runs through cursor.execute() with the usual
+        placeholders; prepare is (PREPARE sql, EXECUTE sql) on PostgreSQL,
+        else None
+    """
+    compiled = _compiled.get(name)
+    if compiled is None:
+        sql = _statements[name]
+        if USE_POSTGRES:
+            prepare_sql, count = _compile_prepare(name, sql)
+            arguments = f" ({', '.join(['%s'] * count)})" if count else ""
+            compiled = (sql, (prepare_sql, f"EXECUTE {name}{arguments}"))
+        else:
+            compiled = (_compile_sqlite(sql), None)
+        with _statements_lock:
+            _compiled[name] = compiled
+            _statement_stats["compiled"] += 1
+    return compiled
+
+
+def execute_statement(cursor, name, params=()):
+    """Execute a registered statement on the cursor (prepared server-side on PostgreSQL)"""
+    sql, prepare = compile_statement(name)
+    with _statements_lock:
+        _statement_stats["executions"] += 1
+    if prepare is None or not PREPARE_STATEMENTS:
+        cursor.execute(sql, params)
+        return cursor
+
+    prepared = getattr(cursor.connection, "prepared_statements", None)
+    if prepared is None:
+        # Connection not opened by _connect_postgres (e.g. a one-off script)
+        cursor.execute(sql, params)
+        return cursor
+
+    prepare_sql, execute_sql = prepare
+    if name not in prepared:
+        cursor.execute(prepare_sql)
+        prepared.add(name)
+        with _statements_lock:
+            _statement_stats["prepared"] += 1
+    cursor.execute(execute_sql, params)
+    return cursor
+
+
+def array_param(values):
+    """
+    Pass a list as one parameter of a registered statement, compared with
+    `= ANY(%s)` (compiled to `IN (SELECT value FROM json_each(?))` on SQLite).
+    """
+    values = list(values)
+    return values if USE_POSTGRES else json.dumps(values)
+
+
+def get_statement_stats():
+    """Registered / compiled / prepared statement counters"""
+    with _statements_lock:
+        snapshot = dict(_statement_stats)
+        snapshot["registered"] = len(_statements)
+    return snapshot
+
+
+@functools.lru_cache(maxsize=None)
+def _prepared_connection_class():
+    """psycopg2 connection that remembers which statements it has PREPAREd"""
+    import psycopg2.extensions
+
+    class PreparedStatementConnection(psycopg2.extensions.connection):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.prepared_statements = set()
+
+    return PreparedStatementConnection
+
 def get_last_insert_id(cursor, conn):
     """Get the last inserted ID in a database-agnostic way"""
     if USE_POSTGRES:
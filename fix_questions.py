@@ -4,6 +4,7 @@ Run this locally (SQLite) and on Neon.tech (PostgreSQL)
 """
 
 from db_connection import get_connection
+from question_bank import bump_bank_revision
 
 def fix_questions():
     conn = get_connection()
@@ -81,6 +82,9 @@ def fix_questions():
     conn.commit()
     conn.close()
     
+    # Option edits keep row counts unchanged - bump the revision so apps reload
+    bump_bank_revision()
+    
     print("\n" + "="*50)
     print("✅ All fixes applied successfully!")
     print("="*50)
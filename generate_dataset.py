@@ -0,0 +1,348 @@
+"""
+Synthetic dataset generator for scale benchmarks.
+
+Builds a realistic database at a configurable scale:
+
+- the real subjects / chapters (CHAPTER_NAMES), N concepts per chapter,
+  M questions per concept (easy / medium / hard mix) with 4 options each
+- students with boards, schools and spread-out registration dates
+- custom test attempts with responses, and admin tests (question lists,
+  attempts and responses)
+
+Answers follow a simple item-response model: every student has an
+ability, every question a difficulty (by level, plus noise), and the
+chance of a correct answer is 1 / (1 + e^-(ability - difficulty)) - with
+students improving slightly over their attempts. Accuracy therefore
+varies plausibly by student, difficulty and chapter.
+
+Rows are generated in batches and bulk loaded (executemany on SQLite,
+COPY on PostgreSQL) with explicit ids, then the rollups and leaderboard
+are rebuilt so the app sees a consistent database.
+
+Usage:
+    python generate_dataset.py --db /tmp/quiz_large.db
+    python generate_dataset.py --db /tmp/quiz_100x.db --users 10000 --attempts 30 --questions-per-concept 60
+    USE_POSTGRES=true python generate_dataset.py --postgres --users 10000   (schema must exist, tables empty)
+
+The default scale (~10k students, ~2M responses) takes a few minutes on SQLite.
+"""
+import argparse
+import csv
+import io
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import bench_support
+
+DIFFICULTY_MIX = {"easy": 0.4, "medium": 0.4, "hard": 0.2}
+DIFFICULTY_LEVEL = {"easy": -1.0, "medium": 0.0, "hard": 1.2}
+PASSWORD = "student-password"
+START_DATE = datetime(2025, 6, 1, 8, 0, 0)
+
+# Parents before children: buffers are always flushed in this order so
+# every foreign key points at a row that is already loaded
+TABLE_ORDER = [
+    "chapters", "concepts", "questions", "mcq_options",
+    "users", "students",
+    "admin_tests", "admin_test_questions", "admin_test_attempts", "admin_test_responses",
+    "test_attempts", "responses",
+]
+
+
+def probability_correct(ability, difficulty):
+    return 1.0 / (1.0 + math.exp(difficulty - ability))
+
+
+class Loader:
+    """Batched bulk loader - executemany on SQLite, COPY on PostgreSQL"""
+
+    def __init__(self, conn, postgres, batch_size):
+        self.conn = conn
+        self.cur = conn.cursor()
+        self.postgres = postgres
+        self.batch_size = batch_size
+        self.buffers = {}
+        self.counts = {}
+
+    def add(self, table, columns, row):
+        buffer = self.buffers.setdefault((table, tuple(columns)), [])
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            # Flush every table, not just this one, so children never get ahead of parents
+            self.flush()
+
+    def flush(self):
+        keys = sorted(self.buffers, key=lambda key: TABLE_ORDER.index(key[0]))
+        for key in keys:
+            rows = self.buffers.get(key)
+            if not rows:
+                continue
+            table_name, column_names = key
+            if self.postgres:
+                data = io.StringIO()
+                writer = csv.writer(data)
+                writer.writerows(("" if value is None else value for value in row) for row in rows)
+                data.seek(0)
+                self.cur.copy_expert(
+                    f"COPY {table_name} ({', '.join(column_names)}) FROM STDIN WITH (FORMAT csv)", data
+                )
+            else:
+                marks = ", ".join(["?"] * len(column_names))
+                self.cur.executemany(f"INSERT INTO {table_name} ({', '.join(column_names)}) VALUES ({marks})", rows)
+            self.counts[table_name] = self.counts.get(table_name, 0) + len(rows)
+            rows.clear()
+
+    def finish(self):
+        self.flush()
+        self.conn.commit()
+
+
+def generate_bank(loader, rng, args):
+    """Chapters, concepts, questions and options. Returns [(question_id, chapter key, level, correct label)]."""
+    from reference_data import CHAPTER_NAMES
+
+    questions = []
+    chapter_id = concept_id = question_id = option_id = 0
+    levels = list(DIFFICULTY_MIX)
+    weights = [DIFFICULTY_MIX[level] for level in levels]
+
+    for subject, chapters in CHAPTER_NAMES.items():
+        for chapter_number, chapter_name in chapters.items():
+            chapter_id += 1
+            loader.add("chapters", ["id", "subject", "chapter_number", "chapter_name"],
+                       (chapter_id, subject, chapter_number, chapter_name))
+            # Some chapters are harder than others
+            chapter_shift = rng.gauss(0, 0.3)
+            for c in range(args.concepts_per_chapter):
+                concept_id += 1
+                loader.add("concepts", ["id", "chapter_id", "concept_name"],
+                           (concept_id, chapter_id, f"{chapter_name} - concept {c + 1}"))
+                for q in range(args.questions_per_concept):
+                    question_id += 1
+                    level = rng.choices(levels, weights)[0]
+                    loader.add("questions", ["id", "concept_id", "difficulty", "question_text"],
+                               (question_id, concept_id, level,
+                                f"[{subject} {chapter_number}.{c + 1}] Synthetic {level} question {q + 1}: which option is correct?"))
+                    correct = rng.randrange(4)
+                    for i, label in enumerate(bench_support.OPTION_LABELS):
+                        option_id += 1
+                        loader.add("mcq_options", ["id", "question_id", "label", "option_text", "is_correct"],
+                                   (option_id, question_id, label, f"Option {label} of question {question_id}",
+                                    1 if i == correct else 0))
+                    difficulty = DIFFICULTY_LEVEL[level] + chapter_shift + rng.gauss(0, 0.4)
+                    questions.append((question_id, (subject, chapter_number), difficulty,
+                                      bench_support.OPTION_LABELS[correct]))
+    return questions
+
+
+def generate_users(loader, rng, args, password_hash):
+    """Admin (id 1) plus students. Returns [(user_id, ability)]."""
+    loader.add("users", ["id", "username", "phone_number", "password_hash", "role", "created_at"],
+               (1, "admin", "0000000000", password_hash, "admin", START_DATE.strftime("%Y-%m-%d %H:%M:%S")))
+    students = []
+    span_minutes = args.days * 24 * 60
+    for i in range(args.users):
+        user_id = i + 2
+        created_at = START_DATE + timedelta(minutes=rng.randrange(span_minutes))
+        loader.add("users",
+                   ["id", "username", "phone_number", "password_hash", "role",
+                    "school_name", "class_name", "board_name", "created_at"],
+                   (user_id, f"student{user_id:06d}", f"9{user_id:09d}", password_hash, "student",
+                    f"School {rng.randrange(args.schools) + 1}", "9", rng.choice(bench_support.BOARDS),
+                    created_at.strftime("%Y-%m-%d %H:%M:%S")))
+        loader.add("students", ["user_id", "name", "class"], (user_id, f"student{user_id:06d}", "9"))
+        students.append((user_id, rng.gauss(0.3, 1.0)))
+    return students
+
+
+def answer(rng, ability, question):
+    """(selected label or None, is_correct) for one question"""
+    _, _, difficulty, correct_label = question
+    if rng.random() < 0.03:
+        return None, 0
+    if rng.random() < probability_correct(ability, difficulty):
+        return correct_label, 1
+    return rng.choice([label for label in bench_support.OPTION_LABELS if label != correct_label]), 0
+
+
+def generate_activity(loader, rng, args, questions, students):
+    """Admin tests, custom attempts and admin attempts with their responses"""
+    by_chapter = {}
+    for question in questions:
+        by_chapter.setdefault(question[1], []).append(question)
+    chapter_keys = list(by_chapter)
+
+    admin_tests = []
+    admin_question_id = 0
+    for t in range(args.admin_tests):
+        subject = rng.choice(list({key[0] for key in chapter_keys}))
+        chapters = rng.sample([key for key in chapter_keys if key[0] == subject], k=min(3, len(chapter_keys)))
+        pool = [question for key in chapters for question in by_chapter[key]]
+        test_questions = rng.sample(pool, min(args.admin_test_questions, len(pool)))
+        created_at = START_DATE + timedelta(days=rng.randrange(args.days))
+        loader.add("admin_tests",
+                   ["admin_test_id", "test_name", "created_by", "total_questions", "duration_minutes",
+                    "easy_percentage", "medium_percentage", "hard_percentage", "chapters", "is_active",
+                    "allow_retake", "created_at"],
+                   (t + 1, f"{subject} Unit Test {t + 1}", 1, len(test_questions), 30, 40, 40, 20,
+                    ",".join(str(key[1]) for key in chapters), 1, 1 if t % 3 == 0 else 0,
+                    created_at.strftime("%Y-%m-%d %H:%M:%S")))
+        for order, question in enumerate(test_questions, start=1):
+            admin_question_id += 1
+            loader.add("admin_test_questions", ["id", "admin_test_id", "question_id", "question_order"],
+                       (admin_question_id, t + 1, question[0], order))
+        admin_tests.append((t + 1, test_questions))
+
+    attempt_id = admin_attempt_id = response_id = admin_response_id = 0
+    report_every = max(1, len(students) // 10)
+    for n, (user_id, ability) in enumerate(students, start=1):
+        attempts = max(0, int(rng.gauss(args.attempts, args.attempts / 3)))
+        taken = START_DATE + timedelta(days=rng.randrange(args.days))
+        sat_admin = set()
+        for k in range(attempts):
+            taken += timedelta(hours=rng.randrange(6, 96))
+            # Practice helps a little
+            current = ability + 0.02 * k
+            stamp = taken.strftime("%Y-%m-%d %H:%M:%S")
+
+            if admin_tests and rng.random() < args.admin_share:
+                test_id, test_questions = rng.choice(admin_tests)
+                if test_id in sat_admin:
+                    continue
+                sat_admin.add(test_id)
+                admin_attempt_id += 1
+                graded = [answer(rng, current, question) for question in test_questions]
+                score = sum(correct for _, correct in graded)
+                loader.add("admin_test_attempts",
+                           ["attempt_id", "admin_test_id", "user_id", "score", "total_questions", "percentage", "attempted_at"],
+                           (admin_attempt_id, test_id, user_id, score, len(test_questions),
+                            round(score * 100.0 / len(test_questions), 2), stamp))
+                for question, (label, correct) in zip(test_questions, graded):
+                    admin_response_id += 1
+                    loader.add("admin_test_responses",
+                               ["response_id", "attempt_id", "question_id", "selected_answer", "is_correct"],
+                               (admin_response_id, admin_attempt_id, question[0], label, correct))
+            else:
+                # Custom tests cover one to three chapters of a subject
+                subject = rng.choice(chapter_keys)[0]
+                chapters = rng.sample([key for key in chapter_keys if key[0] == subject], k=rng.randint(1, 3))
+                pool = [question for key in chapters for question in by_chapter[key]]
+                test_questions = rng.sample(pool, min(args.responses, len(pool)))
+                attempt_id += 1
+                graded = [answer(rng, current, question) for question in test_questions]
+                loader.add("test_attempts", ["id", "student_id", "total_questions", "score", "started_at"],
+                           (attempt_id, user_id, len(test_questions), sum(correct for _, correct in graded), stamp))
+                for question, (label, correct) in zip(test_questions, graded):
+                    response_id += 1
+                    loader.add("responses", ["id", "attempt_id", "question_id", "selected_label", "is_correct"],
+                               (response_id, attempt_id, question[0], label, correct))
+        if n % report_every == 0:
+            print(f"  {n}/{len(students)} students, {response_id + admin_response_id} responses so far")
+
+
+def reset_sequences(cur):
+    """Move PostgreSQL id sequences past the explicitly inserted ids"""
+    for table, column in (
+        ("users", "id"), ("chapters", "id"), ("concepts", "id"), ("questions", "id"), ("mcq_options", "id"),
+        ("test_attempts", "id"), ("responses", "id"), ("admin_tests", "admin_test_id"),
+        ("admin_test_questions", "id"), ("admin_test_attempts", "attempt_id"),
+        ("admin_test_responses", "response_id"),
+    ):
+        cur.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), COALESCE(MAX({column}), 1)) FROM {table}"
+        )
+
+
+def run(args):
+    if args.postgres:
+        if os.getenv("USE_POSTGRES", "false").lower() != "true":
+            raise SystemExit("--postgres needs USE_POSTGRES=true and the POSTGRES_* settings in the environment")
+    else:
+        if os.path.exists(args.db):
+            if not args.force:
+                raise SystemExit(f"{args.db} exists - pass --force to overwrite it")
+            os.remove(args.db)
+        bench_support.use_scratch_database(args.db)
+
+    import bcrypt
+    from db_connection import get_connection
+
+    rng = random.Random(args.seed)
+    password_hash = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(args.bcrypt_rounds)).decode()
+
+    conn = get_connection()
+    if not args.postgres:
+        # Bulk load only - durability does not matter until the final commit
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+    else:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM questions")
+        if cur.fetchone()[0]:
+            conn.close()
+            raise SystemExit("The PostgreSQL database already has questions - load into an empty schema")
+    loader = Loader(conn, args.postgres, args.batch_size)
+
+    started = time.perf_counter()
+    try:
+        print("Generating question bank...")
+        questions = generate_bank(loader, rng, args)
+        print(f"Generating {args.users} students...")
+        students = generate_users(loader, rng, args, password_hash)
+        print("Generating attempts and responses...")
+        generate_activity(loader, rng, args, questions, students)
+        loader.finish()
+        if args.postgres:
+            reset_sequences(loader.cur)
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    load_s = time.perf_counter() - started
+
+    if not args.skip_derived:
+        print("Rebuilding rollups and leaderboard...")
+        from question_bank import bump_bank_revision
+        from analytics_rollups import rebuild_rollups
+        from leaderboard_engine import rebuild_leaderboard
+        rebuild_rollups()
+        rebuild_leaderboard()
+        bump_bank_revision()
+
+    print("=" * 60)
+    print(f"DATASET GENERATED in {load_s:.1f}s (+ derived tables {time.perf_counter() - started - load_s:.1f}s)")
+    print("=" * 60)
+    for table, count in sorted(loader.counts.items()):
+        print(f"{table:<24}{count:>12,}")
+    print(f"All users (admin and student000002...) log in with password '{PASSWORD}'")
+    if not args.postgres:
+        print(f"Use it with: SQLITE_DB_PATH={args.db} streamlit run streamlit_app.py")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "database", "quiz_synthetic.db"),
+                        help="SQLite file to create")
+    parser.add_argument("--force", action="store_true", help="overwrite an existing --db file")
+    parser.add_argument("--postgres", action="store_true", help="load into the PostgreSQL database from the environment")
+    parser.add_argument("--concepts-per-chapter", type=int, default=8)
+    parser.add_argument("--questions-per-concept", type=int, default=60, help="x 38 chapters x concepts = bank size")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--schools", type=int, default=200)
+    parser.add_argument("--days", type=int, default=300, help="period the activity is spread over")
+    parser.add_argument("--attempts", type=int, default=20, help="mean attempts per student")
+    parser.add_argument("--responses", type=int, default=10, help="questions per custom test")
+    parser.add_argument("--admin-tests", type=int, default=40)
+    parser.add_argument("--admin-test-questions", type=int, default=25)
+    parser.add_argument("--admin-share", type=float, default=0.3, help="fraction of attempts that are admin tests")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--batch-size", type=int, default=20000)
+    parser.add_argument("--skip-derived", action="store_true", help="do not rebuild rollups / leaderboard")
+    parser.add_argument("--seed", type=int, default=42)
+    sys.exit(run(parser.parse_args()))
@@ -1,5 +1,93 @@
+import os
 import random
-from db_connection import get_connection, get_placeholder, adapt_query, get_last_insert_id, USE_POSTGRES
+from db_connection import (
+    get_connection, get_placeholder, adapt_query, get_last_insert_id, USE_POSTGRES,
+    register_statement, execute_statement, array_param
+)
+from question_bank import get_question_bank, split_counts, check_feasibility
+from admin_test_papers import (
+    ensure_paper_table, build_paper, store_paper, read_paper, delete_paper, paper_questions
+)
+from app_cache import get_cache
+
+# Max ids per option fetch - bounds the size of one array parameter / result set
+OPTION_FETCH_CHUNK = 500
+
+# The id list is a single array parameter, so one prepared statement serves any number of ids
+OPTIONS_QUERY = register_statement(
+    "options_by_question",
+    """
+    SELECT question_id, label, option_text, is_correct
+    FROM mcq_options
+    WHERE question_id = ANY(%s)
+    ORDER BY question_id, label
+    """
+)
+
+REMOVED_QUESTION_TEXT = "This question has been removed from the question bank."
+
+# Per-student admin test catalogs, invalidated on submission and on test changes
+_catalog_cache = get_cache(
+    "student_test_catalog",
+    ttl=float(os.getenv("STUDENT_CATALOG_TTL", "300")),
+    max_entries=int(os.getenv("STUDENT_CATALOG_MAX_ENTRIES", "2048"))
+)
+
+# Materialized admin test papers keyed by admin_test_id, shared by
+# every session; invalidated when a test is changed or deleted
+_paper_cache = get_cache(
+    "admin_test_papers",
+    ttl=float(os.getenv("ADMIN_TEST_PAPER_TTL", "3600")),
+    max_entries=int(os.getenv("ADMIN_TEST_PAPER_CACHE_SIZE", "64"))
+)
+
+
+def fetch_options_by_question(cur, question_ids):
+    """
+    Fetch the options of many questions with one query per 500 ids
+    (instead of one query per question).
+    
+    Returns:
+        dict question_id -> list of (label, option_text, is_correct), ordered by label
+    """
+    options_by_question = {qid: [] for qid in question_ids}
+    if not options_by_question:
+        return options_by_question
+    
+    unique_ids = list(options_by_question)
+    for start in range(0, len(unique_ids), OPTION_FETCH_CHUNK):
+        chunk = unique_ids[start:start + OPTION_FETCH_CHUNK]
+        execute_statement(cur, OPTIONS_QUERY, (array_param(chunk),))
+        for qid, label, option_text, is_correct in cur.fetchall():
+            options_by_question[qid].append((label, option_text, is_correct))
+    
+    return options_by_question
+
+
+def build_questions(cur, question_rows, shuffle_options=True):
+    """
+    Turn (id, text[, difficulty]) rows into question dicts with their options,
+    fetching all options in one batched query.
+    """
+    options_by_question = fetch_options_by_question(cur, [row[0] for row in question_rows])
+    
+    questions = []
+    for row in question_rows:
+        qid, qtext = row[0], row[1]
+        options = list(options_by_question[qid])
+        if shuffle_options:
+            random.shuffle(options)
+        
+        question = {
+            "id": qid,
+            "text": qtext,
+            "options": options
+        }
+        if len(row) > 2:
+            question["difficulty"] = row[2]
+        questions.append(question)
+    
+    return questions
 
 
 def generate_test_from_concepts(concept_ids, total_questions, easy_pct=30, medium_pct=30, hard_pct=40):
@@ -19,64 +107,7 @@ def generate_test_from_concepts(concept_ids, total_questions, easy_pct=30, mediu
     if easy_pct + medium_pct + hard_pct != 100:
         raise ValueError("Percentages must add up to 100")
     
-    conn = get_connection()
-    cur = conn.cursor()
-    
-    # Calculate required questions per difficulty
-    easy_count = round(total_questions * easy_pct / 100)
-    medium_count = round(total_questions * medium_pct / 100)
-    hard_count = total_questions - easy_count - medium_count  # Ensure exact total
-    
-    # Use appropriate placeholder for database type
-    placeholder = get_placeholder()
-    concept_placeholders = ",".join([placeholder] * len(concept_ids))
-    
-    selected_questions = []
-    
-    # Fetch questions for each difficulty level
-    for difficulty, count in [("easy", easy_count), ("medium", medium_count), ("hard", hard_count)]:
-        if count == 0:
-            continue
-            
-        query = """
-            SELECT q.id, q.question_text, q.difficulty
-            FROM questions q
-            WHERE q.concept_id IN ({})
-              AND q.difficulty = {}
-        """.format(concept_placeholders, placeholder)
-        
-        cur.execute(query, (*concept_ids, difficulty))
-        rows = cur.fetchall()
-        
-        if len(rows) < count:
-            conn.close()
-            return None  # Not enough questions of this difficulty
-        
-        random.shuffle(rows)
-        selected_questions.extend(rows[:count])
-    
-    # Shuffle all selected questions
-    random.shuffle(selected_questions)
-    
-    # Build final question list with options
-    questions = []
-    for qid, qtext, difficulty in selected_questions:
-        cur.execute(
-            "SELECT label, option_text, is_correct FROM mcq_options WHERE question_id = {}".format(placeholder),
-            (qid,)
-        )
-        options = cur.fetchall()
-        random.shuffle(options)
-        
-        questions.append({
-            "id": qid,
-            "text": qtext,
-            "difficulty": difficulty,
-            "options": options
-        })
-    
-    conn.close()
-    return questions
+    return _sample_test(get_question_bank(), concept_ids, total_questions, easy_pct, medium_pct)
 
 
 def generate_test_with_difficulty_cap(chapters, total_questions, easy_pct=30, medium_pct=30, hard_pct=40, subject="Physics"):
@@ -97,67 +128,109 @@ def generate_test_with_difficulty_cap(chapters, total_questions, easy_pct=30, me
     if easy_pct + medium_pct + hard_pct != 100:
         raise ValueError("Percentages must add up to 100")
     
-    conn = get_connection()
-    cur = conn.cursor()
-    
-    # Calculate required questions per difficulty
-    easy_count = round(total_questions * easy_pct / 100)
-    medium_count = round(total_questions * medium_pct / 100)
-    hard_count = total_questions - easy_count - medium_count  # Ensure exact total
+    bank = get_question_bank()
+    concept_ids = bank.concepts_for_chapters(chapters, subject)
+    return _sample_test(bank, concept_ids, total_questions, easy_pct, medium_pct)
+
+
+def _sample_test(bank, concept_ids, total_questions, easy_pct, medium_pct):
+    """
+    Sample a test from the in-memory question bank (no DB queries).
     
-    # Use appropriate placeholder for database type
-    placeholder = get_placeholder()
-    ch_placeholders = ",".join([placeholder] * len(chapters))
+    Returns:
+        list of question dicts or None if insufficient questions
+    """
+    # Reject infeasible requests up front from the availability matrix
+    if not check_feasibility(bank.availability_matrix(), concept_ids, total_questions, easy_pct, medium_pct)["feasible"]:
+        return None
     
-    selected_questions = []
+    selected_rows = []
     
-    # Fetch questions for each difficulty level
-    for difficulty, count in [("easy", easy_count), ("medium", medium_count), ("hard", hard_count)]:
+    # Pick questions for each difficulty level from the (concept, difficulty) pools
+    for difficulty, count in split_counts(total_questions, easy_pct, medium_pct).items():
         if count == 0:
             continue
-            
-        query = """
-            SELECT q.id, q.question_text, q.difficulty
-            FROM questions q
-            JOIN concepts c ON q.concept_id = c.id
-            JOIN chapters ch ON c.chapter_id = ch.id
-            WHERE ch.chapter_number IN ({})
-              AND ch.subject = {}
-              AND q.difficulty = {}
-        """.format(ch_placeholders, placeholder, placeholder)
-        
-        cur.execute(query, (*chapters, subject, difficulty))
-        rows = cur.fetchall()
         
-        if len(rows) < count:
-            conn.close()
+        rows = bank.sample(concept_ids, difficulty, count)
+        if rows is None:
             return None  # Not enough questions of this difficulty
         
-        random.shuffle(rows)
-        selected_questions.extend(rows[:count])
+        selected_rows.extend(rows)
     
     # Shuffle all selected questions
-    random.shuffle(selected_questions)
+    random.shuffle(selected_rows)
+    
+    # Build final question list with (shuffled) options
+    return [bank.question(i) for i in selected_rows]
+
+
+def questions_by_ids(question_ids, seed=None):
+    """
+    Rebuild a test from its question ids: one question dict per id, in id
+    order, so the same (ids, seed) always gives the same test. Each
+    question's options are shuffled by its own Random(seed, id), so where
+    one question is read from cannot change another's option order.
+    Served from the shared question bank; questions no longer in the bank
+    are read from the database, and ids in neither keep their position as
+    a placeholder with no options (see removed_question).
+    """
+    bank = get_question_bank()
+    missing = [qid for qid in question_ids if not bank.has_question(qid)]
+    fallback = {q["id"]: q for q in _questions_from_db(missing)} if missing else {}
     
-    # Build final question list with options
     questions = []
-    for qid, qtext, difficulty in selected_questions:
+    for qid in question_ids:
+        rng = random.Random(f"{seed}:{qid}") if seed is not None else random.Random()
+        if qid in fallback:
+            question = dict(fallback[qid], options=list(fallback[qid]["options"]))
+            rng.shuffle(question["options"])
+        elif bank.has_question(qid):
+            question = bank.question(bank.index_of(qid), rng=rng)
+        else:
+            question = removed_question(qid)  # deleted since the test started
+        questions.append(question)
+    return questions
+
+
+def removed_question(question_id):
+    """Placeholder for a question deleted since the test started - it cannot be answered"""
+    return {"id": question_id, "text": REMOVED_QUESTION_TEXT, "difficulty": None, "options": []}
+
+
+def question_concepts(question_ids):
+    """Concept id of each question id, in order (0 if it is not in the bank)"""
+    bank = get_question_bank()
+    return [
+        bank.concept_of[bank.index_of(qid)] if bank.has_question(qid) else 0
+        for qid in question_ids
+    ]
+
+
+def concept_names(concept_ids):
+    """Dict concept_id -> "Subject Ch N: name" for the concepts known to the bank"""
+    bank = get_question_bank()
+    names = {}
+    for concept_id in concept_ids:
+        info = bank.concept_info(concept_id)
+        if info is not None:
+            chapter, subject = info
+            names[concept_id] = f"{subject} Ch {chapter}: {bank.concept_name(concept_id)}"
+    return names
+
+
+def _questions_from_db(question_ids):
+    """Question dicts (options in label order) for ids missing from the bank; unknown ids are skipped"""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        placeholders = ",".join([get_placeholder()] * len(question_ids))
         cur.execute(
-            "SELECT label, option_text, is_correct FROM mcq_options WHERE question_id = {}".format(placeholder),
-            (qid,)
+            f"SELECT id, question_text, difficulty FROM questions WHERE id IN ({placeholders})",
+            tuple(question_ids)
         )
-        options = cur.fetchall()
-        random.shuffle(options)
-        
-        questions.append({
-            "id": qid,
-            "text": qtext,
-            "difficulty": difficulty,
-            "options": options
-        })
-    
-    conn.close()
-    return questions
+        return build_questions(cur, cur.fetchall(), shuffle_options=False)
+    finally:
+        conn.close()
 
 
 def generate_test(chapters, difficulties, total_questions):
@@ -196,20 +269,7 @@ def generate_test(chapters, difficulties, total_questions):
     random.shuffle(rows)
     selected = rows[:total_questions]
 
-    questions = []
-    for qid, qtext in selected:
-        cur.execute(
-            "SELECT label, option_text, is_correct FROM mcq_options WHERE question_id = {}".format(placeholder),
-            (qid,)
-        )
-        options = cur.fetchall()
-        random.shuffle(options)
-
-        questions.append({
-            "id": qid,
-            "text": qtext,
-            "options": options
-        })
+    questions = build_questions(cur, selected)
 
     conn.close()
     return questions
@@ -234,26 +294,27 @@ def create_admin_test(test_name, chapters, total_questions, duration_minutes,
     Returns:
         int - admin_test_id or None if failed
     """
+    # Generate questions with difficulty distribution (in memory - infeasible
+    # requests are rejected before a connection is opened)
+    if concept_ids:
+        # Use concept-based generation
+        questions = generate_test_from_concepts(
+            concept_ids, total_questions, easy_pct, medium_pct, hard_pct
+        )
+    else:
+        # Use chapter-based generation
+        questions = generate_test_with_difficulty_cap(
+            chapters, total_questions, easy_pct, medium_pct, hard_pct, subject
+        )
+    
+    if questions is None:
+        return None
+    
+    ensure_paper_table()
     conn = get_connection()
     cur = conn.cursor()
     
     try:
-        # Generate questions with difficulty distribution
-        if concept_ids:
-            # Use concept-based generation
-            questions = generate_test_from_concepts(
-                concept_ids, total_questions, easy_pct, medium_pct, hard_pct
-            )
-        else:
-            # Use chapter-based generation
-            questions = generate_test_with_difficulty_cap(
-                chapters, total_questions, easy_pct, medium_pct, hard_pct, subject
-            )
-        
-        if questions is None:
-            conn.close()
-            return None
-        
         # Store chapters as comma-separated string
         chapters_str = ",".join(map(str, chapters))
         
@@ -294,8 +355,12 @@ def create_admin_test(test_name, chapters, total_questions, duration_minutes,
             """.format(placeholder, placeholder, placeholder)
             cur.execute(query, (admin_test_id, q["id"], order))
         
+        # Materialize the paper (questions, options, variants) with the test
+        store_paper(cur, admin_test_id, build_paper(questions, get_question_bank().fingerprint))
+        
         conn.commit()
         conn.close()
+        invalidate_student_catalog()
         return admin_test_id
         
     except Exception as e:
@@ -304,16 +369,54 @@ def create_admin_test(test_name, chapters, total_questions, duration_minutes,
         raise e
 
 
-def get_admin_test_questions(admin_test_id):
+def get_admin_test_questions(admin_test_id, seed=None):
     """
-    Retrieve all questions for an admin test in correct order.
+    Retrieve all questions for an admin test in correct order, with the
+    option order determined by `seed` (see admin_test_papers.paper_questions).
+    
+    The paper comes from the shared paper cache - one keyed read of the
+    materialized paper on a miss, no queries on a hit.
     
     Returns:
         list of question dicts with options
     """
+    return paper_questions(get_admin_test_paper(admin_test_id), seed)
+
+
+def get_admin_test_paper(admin_test_id):
+    """
+    The (shared, read-only) paper of an admin test, exactly as it was
+    created. Empty papers (unknown or deleted tests) are not cached.
+    """
+    return _paper_cache.get_or_load(
+        admin_test_id, lambda: _load_paper(admin_test_id), cache_if=lambda paper: bool(paper["ids"])
+    )
+
+
+def _load_paper(admin_test_id):
+    """
+    Read the stored paper. Papers are never rebuilt once stored, so a test
+    in progress keeps matching its question ids whatever happens to the
+    bank; tests created before papers existed are materialized here on
+    first use.
+    """
+    ensure_paper_table()
     conn = get_connection()
     cur = conn.cursor()
     
+    try:
+        paper = read_paper(cur, admin_test_id)
+        if paper is None:
+            paper = _materialize_paper(cur, admin_test_id)
+            conn.commit()
+    finally:
+        conn.close()
+    
+    return paper
+
+
+def _materialize_paper(cur, admin_test_id):
+    """Build the paper of a test from admin_test_questions and store it. Returns the stored paper."""
     placeholder = get_placeholder()
     
     # Get questions in order
@@ -326,27 +429,41 @@ def get_admin_test_questions(admin_test_id):
     """.format(placeholder)
     
     cur.execute(query, (admin_test_id,))
-    
     question_rows = cur.fetchall()
     
-    questions = []
-    for qid, qtext, difficulty in question_rows:
-        cur.execute(
-            "SELECT label, option_text, is_correct FROM mcq_options WHERE question_id = {}".format(placeholder),
-            (qid,)
-        )
-        options = cur.fetchall()
-        random.shuffle(options)  # Shuffle options for each student
-        
-        questions.append({
-            "id": qid,
-            "text": qtext,
-            "difficulty": difficulty,
-            "options": options
-        })
+    paper = build_paper(build_questions(cur, question_rows, shuffle_options=False), get_question_bank().fingerprint)
+    if not question_rows:
+        return paper  # unknown or deleted test - nothing to store
     
-    conn.close()
-    return questions
+    # Another process may have stored it first - serve whichever paper won
+    store_paper(cur, admin_test_id, paper)
+    return read_paper(cur, admin_test_id) or paper
+
+
+def delete_admin_test(admin_test_id):
+    """Delete an admin test together with its question list and materialized paper"""
+    ensure_paper_table()
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        placeholder = get_placeholder()
+        delete_paper(cur, admin_test_id)
+        # Explicitly, as SQLite does not enforce the ON DELETE CASCADE
+        cur.execute(f"DELETE FROM admin_test_questions WHERE admin_test_id = {placeholder}", (admin_test_id,))
+        cur.execute(f"DELETE FROM admin_tests WHERE admin_test_id = {placeholder}", (admin_test_id,))
+        conn.commit()
+    finally:
+        conn.close()
+    invalidate_admin_test(admin_test_id)
+
+
+def invalidate_admin_test(admin_test_id=None):
+    """Drop the cached papers of a test (or all tests) and the student catalogs after a test change"""
+    if admin_test_id is None:
+        _paper_cache.invalidate()
+    else:
+        _paper_cache.invalidate(admin_test_id)
+    invalidate_student_catalog()
 
 
 def get_available_admin_tests():
@@ -376,3 +493,60 @@ def get_available_admin_tests():
     tests = cur.fetchall()
     conn.close()
     return tests
+
+
+def _load_student_test_catalog(user_id):
+    conn = get_connection()
+    cur = conn.cursor()
+    placeholder = get_placeholder()
+    
+    # Database-agnostic query for boolean/integer is_active
+    if USE_POSTGRES:
+        active_check = "at.is_active = true"
+    else:
+        active_check = "at.is_active = 1"
+    
+    try:
+        cur.execute(f"""
+            SELECT 
+                at.admin_test_id, at.test_name, at.total_questions,
+                at.duration_minutes, at.easy_percentage, at.medium_percentage,
+                at.hard_percentage, u.username, at.created_at,
+                at.allow_retake, COALESCE(a.attempts, 0)
+            FROM admin_tests at
+            JOIN users u ON at.created_by = u.id
+            LEFT JOIN (
+                SELECT admin_test_id, COUNT(*) AS attempts
+                FROM admin_test_attempts
+                WHERE user_id = {placeholder}
+                GROUP BY admin_test_id
+            ) a ON a.admin_test_id = at.admin_test_id
+            WHERE {active_check}
+            ORDER BY at.created_at DESC
+        """, (user_id,))
+        return [
+            row[:9] + (bool(row[9]), row[10])
+            for row in cur.fetchall()
+        ]
+    finally:
+        conn.close()
+
+
+def get_student_test_catalog(user_id):
+    """
+    Active admin tests together with their retake flag and this student's
+    attempt count - one query, cached per user.
+    
+    Returns:
+        list of (admin_test_id, test_name, total_questions, duration_minutes,
+                 easy_pct, medium_pct, hard_pct, creator, created_at,
+                 allow_retake, attempts_count)
+    """
+    # A catalog loaded while this user's cache entry is invalidated (e.g. their
+    # submission was just written) is served once but not cached
+    return _catalog_cache.get_or_load(user_id, lambda: _load_student_test_catalog(user_id))
+
+
+def invalidate_student_catalog(user_id=None):
+    """Drop one student's cached catalog (after they submit), or all of them (after test changes)"""
+    _catalog_cache.invalidate(user_id)
@@ -9,6 +9,7 @@ Supports: Biology, Chemistry, Physics
 import json
 import os
 from db_connection import get_connection, get_placeholder, USE_POSTGRES
+from question_bank import bump_bank_revision
 
 # Base path to Question folder
 QUESTION_BASE_PATH = r"Question"
@@ -184,6 +185,9 @@ def main():
         stats = process_subject(subject)
         overall_stats[subject] = stats
     
+    # Tell running apps to reload their question bank caches
+    bump_bank_revision()
+    
     # Final summary
     print("\n" + "═" * 63)
     print("  OVERALL SUMMARY")
@@ -10,6 +10,7 @@ Run this after:
 import json
 import os
 from db_connection import get_connection, get_placeholder, USE_POSTGRES
+from question_bank import bump_bank_revision
 
 # Path to Chemistry questions folder
 CHEMISTRY_FOLDER = r"Question\Chemistry"
@@ -154,8 +155,12 @@ def main():
         except Exception as e:
             print(f"\n❌ Failed to insert {file}: {e}")
             print("Stopping...")
+            bump_bank_revision()
             return
     
+    # Tell running apps to reload their question bank caches
+    bump_bank_revision()
+    
     print("\n═" * 63)
     print("  ✅ ALL CHEMISTRY CHAPTERS INSERTED SUCCESSFULLY!")
     print("═" * 63)
@@ -8,6 +8,7 @@ Run this after completing database migrations
 import json
 import os
 from db_connection import get_connection, get_placeholder, USE_POSTGRES
+from question_bank import bump_bank_revision
 
 # Paths to omitted chapter files
 CHAPTER_1_FILE = r"Question\Physics\chapter_1_omitted.json"
@@ -146,6 +147,9 @@ def main():
     # Insert Chapter 6
     insert_chapter_data(CHAPTER_6_FILE, subject="Physics")
     
+    # Tell running apps to reload their question bank caches
+    bump_bank_revision()
+    
     print("\n═" * 63)
     print("  ✅ ALL OMITTED CHAPTERS INSERTED SUCCESSFULLY!")
     print("═" * 63)
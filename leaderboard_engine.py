@@ -0,0 +1,240 @@
+"""
+Leaderboard ranking engine.
+
+The old leaderboard query LEFT JOINed test_attempts, admin_test_attempts
+and responses in one pass, so rows multiplied (custom attempts x admin
+attempts x responses) before GROUP BY - inflating the SUMs and making the
+query cost explode as students took more tests.
+
+Instead, per-student totals live in the materialized leaderboard_scores
+table:
+
+- updated on every submission, in the same transaction as the attempt
+  (see submission_queue)
+- rebuilt by aggregating each source independently (rebuild_leaderboard)
+- served top-N per board straight from the ranking indexes (get_leaderboard)
+
+As before, "hard correct" counts correct answers to hard questions in
+custom tests.
+"""
+import sys
+import threading
+
+from db_connection import get_connection, get_placeholder
+from analytics_rollups import META_SCHEMA, is_built, mark_built
+
+LEADERBOARD_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS leaderboard_scores (
+        user_id INTEGER PRIMARY KEY,
+        board_name VARCHAR(100),
+        custom_tests INTEGER NOT NULL DEFAULT 0,
+        admin_tests INTEGER NOT NULL DEFAULT 0,
+        total_tests INTEGER NOT NULL DEFAULT 0,
+        score_total INTEGER NOT NULL DEFAULT 0,
+        question_total INTEGER NOT NULL DEFAULT 0,
+        hard_correct INTEGER NOT NULL DEFAULT 0,
+        accuracy REAL NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_leaderboard_rank
+    ON leaderboard_scores (hard_correct DESC, accuracy DESC, total_tests DESC)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_leaderboard_board_rank
+    ON leaderboard_scores (board_name, hard_correct DESC, accuracy DESC, total_tests DESC)
+    """,
+    META_SCHEMA,
+]
+
+RANK_ORDER = "s.hard_correct DESC, s.accuracy DESC, s.total_tests DESC"
+
+# Accuracy after adding the incoming row to the stored one (ON CONFLICT sees the old values)
+MERGED_ACCURACY = """
+    COALESCE(ROUND(
+        (leaderboard_scores.score_total + excluded.score_total) * 100.0
+        / NULLIF(leaderboard_scores.question_total + excluded.question_total, 0), 2
+    ), 0)
+"""
+
+_ready = False
+_ready_lock = threading.Lock()
+
+
+def ensure_leaderboard_table():
+    """Create leaderboard_scores once per process and backfill it if it was never built"""
+    global _ready
+    if _ready:
+        return
+    with _ready_lock:
+        if _ready:
+            return
+        conn = get_connection()
+        cur = conn.cursor()
+        try:
+            for statement in LEADERBOARD_SCHEMA:
+                cur.execute(statement)
+            conn.commit()
+            built = is_built(cur, "leaderboard")
+        finally:
+            conn.close()
+
+        if not built:
+            rebuild_leaderboard()
+        _ready = True
+
+
+def _record(cur, user_id, custom_tests, admin_tests, score, total_questions, hard_correct_sql, hard_params):
+    placeholder = get_placeholder()
+    cur.execute(f"""
+        INSERT INTO leaderboard_scores
+            (user_id, board_name, custom_tests, admin_tests, total_tests,
+             score_total, question_total, hard_correct, accuracy)
+        SELECT u.id, u.board_name, {placeholder}, {placeholder}, {placeholder},
+               {placeholder}, {placeholder}, ({hard_correct_sql}),
+               COALESCE(ROUND({placeholder} * 100.0 / NULLIF({placeholder}, 0), 2), 0)
+        FROM users u
+        WHERE u.id = {placeholder}
+        ON CONFLICT (user_id) DO UPDATE SET
+            custom_tests = leaderboard_scores.custom_tests + excluded.custom_tests,
+            admin_tests = leaderboard_scores.admin_tests + excluded.admin_tests,
+            total_tests = leaderboard_scores.total_tests + excluded.total_tests,
+            score_total = leaderboard_scores.score_total + excluded.score_total,
+            question_total = leaderboard_scores.question_total + excluded.question_total,
+            hard_correct = leaderboard_scores.hard_correct + excluded.hard_correct,
+            accuracy = {MERGED_ACCURACY}
+    """, (
+        custom_tests, admin_tests, custom_tests + admin_tests,
+        score, total_questions, *hard_params,
+        score, total_questions,
+        user_id
+    ))
+
+
+def record_custom_attempt(cur, user_id, attempt_id, score, total_questions):
+    """Add a freshly inserted custom attempt (responses included) to the leaderboard"""
+    placeholder = get_placeholder()
+    hard_correct_sql = f"""
+        SELECT COUNT(*)
+        FROM responses r
+        JOIN questions q ON r.question_id = q.id
+        WHERE r.attempt_id = {placeholder} AND q.difficulty = 'hard' AND r.is_correct = 1
+    """
+    _record(cur, user_id, 1, 0, score, total_questions, hard_correct_sql, (attempt_id,))
+
+
+def record_admin_attempt(cur, user_id, score, total_questions):
+    """Add an admin test attempt to the leaderboard"""
+    _record(cur, user_id, 0, 1, score, total_questions, "SELECT 0", ())
+
+
+def update_board(cur, user_id, board_name):
+    """Keep the denormalized board in sync after a profile edit"""
+    placeholder = get_placeholder()
+    cur.execute(
+        f"UPDATE leaderboard_scores SET board_name = {placeholder} WHERE user_id = {placeholder}",
+        (board_name, user_id)
+    )
+
+
+def remove_user(cur, user_id):
+    remove_users(cur, [user_id])
+
+
+def remove_users(cur, user_ids):
+    marks = ", ".join([get_placeholder()] * len(user_ids))
+    cur.execute(f"DELETE FROM leaderboard_scores WHERE user_id IN ({marks})", tuple(user_ids))
+
+
+def rebuild_leaderboard():
+    """Recompute leaderboard_scores, aggregating each source on its own before joining"""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        for statement in LEADERBOARD_SCHEMA:
+            cur.execute(statement)
+        cur.execute("DELETE FROM leaderboard_scores")
+        cur.execute("""
+            INSERT INTO leaderboard_scores
+                (user_id, board_name, custom_tests, admin_tests, total_tests,
+                 score_total, question_total, hard_correct, accuracy)
+            SELECT
+                u.id,
+                u.board_name,
+                COALESCE(c.tests, 0),
+                COALESCE(a.tests, 0),
+                COALESCE(c.tests, 0) + COALESCE(a.tests, 0),
+                COALESCE(c.score, 0) + COALESCE(a.score, 0),
+                COALESCE(c.total, 0) + COALESCE(a.total, 0),
+                COALESCE(h.hard_correct, 0),
+                COALESCE(ROUND(
+                    (COALESCE(c.score, 0) + COALESCE(a.score, 0)) * 100.0
+                    / NULLIF(COALESCE(c.total, 0) + COALESCE(a.total, 0), 0), 2
+                ), 0)
+            FROM users u
+            LEFT JOIN (
+                SELECT student_id, COUNT(*) AS tests, SUM(score) AS score, SUM(total_questions) AS total
+                FROM test_attempts
+                GROUP BY student_id
+            ) c ON c.student_id = u.id
+            LEFT JOIN (
+                SELECT user_id, COUNT(*) AS tests, SUM(score) AS score, SUM(total_questions) AS total
+                FROM admin_test_attempts
+                GROUP BY user_id
+            ) a ON a.user_id = u.id
+            LEFT JOIN (
+                SELECT t.student_id, COUNT(*) AS hard_correct
+                FROM responses r
+                JOIN test_attempts t ON r.attempt_id = t.id
+                JOIN questions q ON r.question_id = q.id
+                WHERE q.difficulty = 'hard' AND r.is_correct = 1
+                GROUP BY t.student_id
+            ) h ON h.student_id = u.id
+            WHERE c.student_id IS NOT NULL OR a.user_id IS NOT NULL
+        """)
+        mark_built(cur, "leaderboard")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def get_leaderboard(board_name=None, limit=50):
+    """
+    Top `limit` students, optionally for one board.
+
+    Returns:
+        list of (username, school_name, class_name, board_name, total_tests, accuracy, hard_correct)
+    """
+    ensure_leaderboard_table()
+    placeholder = get_placeholder()
+    board_condition = f"AND s.board_name = {placeholder}" if board_name else ""
+    params = ((board_name,) if board_name else ()) + (limit,)
+
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            SELECT u.username, u.school_name, u.class_name, s.board_name,
+                   s.total_tests, s.accuracy, s.hard_correct
+            FROM leaderboard_scores s
+            JOIN users u ON u.id = s.user_id
+            WHERE u.role = 'student' AND s.total_tests > 0 {board_condition}
+            ORDER BY {RANK_ORDER}
+            LIMIT {placeholder}
+        """, params)
+        return cur.fetchall()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    if "--rebuild" in sys.argv:
+        print("🔄 Rebuilding leaderboard...")
+        rebuild_leaderboard()
+        print("✅ Leaderboard rebuilt")
+    else:
+        print("Usage: python leaderboard_engine.py --rebuild")
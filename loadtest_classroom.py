@@ -0,0 +1,310 @@
+"""
+Load test: a classroom of students sitting one admin test at the same time.
+
+Each simulated student runs in its own thread and goes through the same
+code paths as the app:
+
+1. auth.login()                                   (bcrypt check + user lookup)
+2. get_admin_test_paper() + get_admin_test_questions(seed)
+                                                  (start the test, render its questions)
+3. answers every question after a think time       (no DB - session state)
+4. scoring.score_test() + graded_responses() + submission_queue.submit()
+                                                  (what submit_test scores and persists)
+
+and the harness reports, per step, p50/p95/p99 latency, DB round trips
+(statements counted by query_stats) and errors, then how long the
+submission queue takes to drain into the database.
+
+By default it runs against a scratch SQLite database seeded with a
+synthetic bank. With --postgres it uses the database configured in the
+environment (USE_POSTGRES=true, POSTGRES_*) - point it at a local stand-in,
+never production: it creates loadtest_* users and an admin test.
+
+Usage:
+    python loadtest_classroom.py
+    python loadtest_classroom.py --students 60 --questions 40 --think 0.5 --ramp 10
+    USE_POSTGRES=true POSTGRES_HOST=localhost ... python loadtest_classroom.py --postgres --students 200
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import bench_support
+
+STEPS = ("login", "load_test", "score", "submit")
+PASSWORD = "loadtest-password"
+
+
+def prepare_database(args):
+    """Scratch SQLite database (unless --postgres) and a private submission journal"""
+    db_path = None
+    if args.postgres and os.getenv("USE_POSTGRES", "false").lower() != "true":
+        raise SystemExit("--postgres needs USE_POSTGRES=true and the POSTGRES_* settings in the environment")
+    if not args.postgres:
+        db_path = bench_support.use_scratch_database()
+        bench_support.seed_question_bank(db_path, questions_per_concept=max(30, args.questions))
+    fd, journal_path = tempfile.mkstemp(prefix="loadtest_journal_", suffix=".db")
+    os.close(fd)
+    os.environ["SUBMISSION_QUEUE_PATH"] = journal_path
+    return db_path, journal_path
+
+
+def create_students(args):
+    """Insert loadtest_* students that do not exist yet; all share one bcrypt hash. Returns usernames."""
+    import bcrypt
+    from db_connection import get_connection, get_placeholder, bulk_insert
+
+    password_hash = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(args.bcrypt_rounds)).decode()
+    usernames = [f"loadtest_{i:05d}" for i in range(args.students)]
+
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT username FROM users WHERE username LIKE 'loadtest%'")
+        existing = {row[0] for row in cur.fetchall()}
+        bulk_insert(
+            cur, "users",
+            ["username", "phone_number", "password_hash", "role", "school_name", "class_name", "board_name"],
+            [
+                (username, f"LT{i:08d}", password_hash, "student", "Load Test School", "9", "ICSE")
+                for i, username in enumerate(usernames) if username not in existing
+            ]
+        )
+        # Existing loadtest users may carry a hash from another run
+        cur.execute(
+            f"UPDATE users SET password_hash = {get_placeholder()} WHERE username LIKE 'loadtest%'",
+            (password_hash,)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return usernames
+
+
+def create_test(args):
+    """Create the admin test the class will sit. Returns its id."""
+    from db_connection import get_connection, get_placeholder
+    from generate_test_engine import create_admin_test
+
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            f"SELECT DISTINCT chapter_number FROM chapters WHERE subject = {get_placeholder()} ORDER BY chapter_number",
+            (args.subject,)
+        )
+        chapters = [row[0] for row in cur.fetchall()]
+        cur.execute("SELECT MIN(id) FROM users")
+        created_by = cur.fetchone()[0]
+    finally:
+        conn.close()
+
+    test_id = create_admin_test(
+        f"Load test {time.strftime('%Y-%m-%d %H:%M:%S')}", chapters, args.questions, 60,
+        40, 40, 20, created_by, subject=args.subject, allow_retake=True
+    )
+    if not test_id:
+        raise SystemExit(f"Could not create a {args.questions}-question {args.subject} test - is the bank seeded?")
+    return test_id
+
+
+class Recorder:
+    """Latencies, round trips and errors per step, shared by the student threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {step: [] for step in STEPS}
+        self.round_trips = {step: [] for step in STEPS}
+        self.errors = Counter()
+        self.error_samples = {}
+
+    def step(self, name, fn, *args):
+        """Run one step, timing it and counting its statements. Returns (ok, result)."""
+        from query_stats import track_render
+
+        with track_render(f"loadtest:{name}") as statements:
+            start = time.perf_counter()
+            try:
+                result = fn(*args)
+                ok = True
+            except Exception as e:
+                result, ok = e, False
+            elapsed = time.perf_counter() - start
+            queries, _ = statements.totals()
+
+        with self._lock:
+            self.latencies[name].append(elapsed)
+            self.round_trips[name].append(queries)
+            if not ok:
+                self.errors[name] += 1
+                self.error_samples.setdefault(name, repr(result)[:200])
+        return ok, result
+
+    def fail(self, name, message):
+        with self._lock:
+            self.errors[name] += 1
+            self.error_samples.setdefault(name, message)
+
+
+def student_session(index, username, test_id, args, recorder):
+    from auth import login
+    from generate_test_engine import get_admin_test_paper, get_admin_test_questions, question_concepts
+    from scoring import score_test, total_score, graded_responses
+    from submission_queue import submit
+
+    rng = random.Random(args.seed + index)
+    time.sleep(rng.uniform(0, args.ramp))
+
+    ok, user = recorder.step("login", login, username, PASSWORD)
+    if not ok:
+        return
+    if not user:
+        recorder.fail("login", "invalid credentials")
+        return
+
+    # Like start_test(): the session keeps the paper's question ids and a seed
+    seed = rng.getrandbits(32)
+    ok, questions = recorder.step(
+        "load_test", lambda: get_admin_test_paper(test_id) and get_admin_test_questions(test_id, seed)
+    )
+    if not ok:
+        return
+    if not questions:
+        recorder.fail("load_test", "no questions returned")
+        return
+
+    answers = {}
+    for question in questions:
+        time.sleep(rng.uniform(0.5, 1.5) * args.think)
+        if rng.random() < args.skip_rate:
+            continue
+        options = question["options"]
+        correct = [option[0] for option in options if option[2]]
+        if correct and rng.random() < args.accuracy:
+            answers[question["id"]] = correct[0]
+        else:
+            answers[question["id"]] = rng.choice(options)[0]
+
+    # Like submit_test(): rebuild the questions from the seed and score them once
+    ok, scored = recorder.step("score", lambda: score_test(
+        get_admin_test_questions(test_id, seed), answers, question_concepts([q["id"] for q in questions])
+    ))
+    if not ok:
+        return
+    score = total_score(scored)
+    graded = graded_responses(scored, answers)
+    recorder.step("submit", submit, "admin", {
+        "admin_test_id": test_id,
+        "user_id": user["id"],
+        "username": user["username"],
+        "score": score,
+        "total_questions": len(questions),
+        "responses": graded,
+    })
+
+
+def wait_for_drain(timeout):
+    """Seconds until the submission journal is empty (None if it did not drain)"""
+    from submission_queue import WRITE_BEHIND, get_submission_queue
+    if not WRITE_BEHIND:
+        return 0.0
+    queue = get_submission_queue()
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if queue.pending_count() == 0:
+            return time.perf_counter() - start
+        time.sleep(0.1)
+    return None
+
+
+def count_attempts(test_id):
+    from db_connection import get_connection, get_placeholder
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT COUNT(*) FROM admin_test_attempts WHERE admin_test_id = {get_placeholder()}", (test_id,))
+        return cur.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def report(args, recorder, wall_s, drain_s, attempts):
+    print("=" * 86)
+    print(f"CLASSROOM LOAD TEST - {args.students} students, {args.questions} questions, "
+          f"think {args.think:.2f}s/question, ramp {args.ramp:.0f}s")
+    print("=" * 86)
+    print(f"{'step':<11}{'count':>7}{'errors':>8}{'err %':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'max ms':>10}{'queries/op':>12}")
+    for step in STEPS:
+        latencies = recorder.latencies[step]
+        count = len(latencies)
+        errors = recorder.errors[step]
+        error_rate = errors * 100.0 / max(1, count or errors)
+        round_trips = recorder.round_trips[step]
+
+        def ms(pct):
+            return bench_support.percentile(latencies, pct) * 1000
+
+        print(f"{step:<11}{count:>7}{errors:>8}{error_rate:>7.1f}{ms(50):>10.1f}{ms(95):>10.1f}{ms(99):>10.1f}"
+              f"{(max(latencies) if latencies else 0) * 1000:>10.1f}"
+              f"{(sum(round_trips) / len(round_trips) if round_trips else 0):>12.1f}")
+    for step, sample in recorder.error_samples.items():
+        print(f"  first {step} error: {sample}")
+
+    submitted = len(recorder.latencies["submit"]) - recorder.errors["submit"]
+    print(f"wall time: {wall_s:.1f}s")
+    if drain_s is None:
+        print(f"submission queue: NOT drained after {args.drain_timeout:.0f}s")
+    else:
+        print(f"submission queue drained {drain_s:.1f}s after the last student finished")
+    print(f"new attempts in database: {attempts} / {submitted} submitted {'✅' if attempts == submitted else '❌'}")
+
+
+def run(args):
+    db_path, journal_path = prepare_database(args)
+    print("Preparing students and test...")
+    usernames = create_students(args)
+    test_id = args.admin_test_id or create_test(args)
+    attempts_before = count_attempts(test_id)
+
+    recorder = Recorder()
+    threads = [
+        threading.Thread(target=student_session, args=(i, username, test_id, args, recorder), daemon=True)
+        for i, username in enumerate(usernames)
+    ]
+    print(f"Running {len(threads)} students against admin test {test_id}...")
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_s = time.perf_counter() - start
+
+    drain_s = wait_for_drain(args.drain_timeout)
+    attempts = count_attempts(test_id) - attempts_before
+    report(args, recorder, wall_s, drain_s, attempts)
+
+    for path in (db_path, journal_path):
+        if path and os.path.exists(path) and drain_s is not None:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--questions", type=int, default=20, help="test length")
+    parser.add_argument("--think", type=float, default=0.2, help="mean seconds spent per question")
+    parser.add_argument("--ramp", type=float, default=5.0, help="students log in spread over this many seconds")
+    parser.add_argument("--accuracy", type=float, default=0.6, help="chance a student knows the answer")
+    parser.add_argument("--skip-rate", type=float, default=0.05, help="chance a question is left unanswered")
+    parser.add_argument("--subject", default="Physics")
+    parser.add_argument("--admin-test-id", type=int, help="sit an existing admin test instead of creating one")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12, help="cost of the shared password hash (12 = auth.create_user)")
+    parser.add_argument("--drain-timeout", type=float, default=120.0)
+    parser.add_argument("--postgres", action="store_true", help="use the PostgreSQL database from the environment")
+    parser.add_argument("--seed", type=int, default=42)
+    run(parser.parse_args())
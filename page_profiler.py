@@ -0,0 +1,238 @@
+"""
+Opt-in per-render profiling of the Streamlit pages.
+
+With PAGE_PROFILE=1 the router runs each page function (admin_page,
+setup_page, test_page, result_page, ...) through run_page(), which
+measures for that render:
+
+- wall clock and CPU time (of the script thread)
+- memory allocated (tracemalloc peak above the starting point, and net)
+- widgets registered and SQL statements / DB time (from query_stats)
+
+and appends one JSON line per render to PAGE_PROFILE_FILE.
+PAGE_PROFILE=functions additionally runs cProfile and stores the most
+expensive functions of each render (slower - use it for a few renders).
+
+tracemalloc is process-wide, so allocation figures include whatever
+other sessions did concurrently; profile with a single user for clean
+numbers.
+
+Summarize a profile file, ranking pages and functions by cost:
+
+    python page_profiler.py
+    python page_profiler.py --file database/page_profile.jsonl --top 20
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+import query_stats
+
+MODE = os.getenv("PAGE_PROFILE", "").lower()
+ENABLED = MODE in ("1", "true", "on", "functions")
+PROFILE_FUNCTIONS = MODE == "functions"
+PROFILE_FILE = os.getenv(
+    "PAGE_PROFILE_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "database", "page_profile.jsonl")
+)
+TOP_FUNCTIONS = int(os.getenv("PAGE_PROFILE_TOP_FUNCTIONS", "15"))
+
+_write_lock = threading.Lock()
+
+
+def _widget_count():
+    """Widgets registered so far in this script run, or None outside Streamlit"""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+    except Exception:
+        return None
+    if ctx is None:
+        return None
+    widget_ids = getattr(getattr(ctx, "shared", None), "widget_ids_this_run", None)
+    if widget_ids is None:
+        widget_ids = getattr(ctx, "widget_ids_this_run", None)
+    if widget_ids is None:
+        return None
+    return len(widget_ids.snapshot()) if hasattr(widget_ids, "snapshot") else len(widget_ids)
+
+
+def _top_functions(profiler):
+    """[(function, cumulative s, own s, calls)] of a finished cProfile run, most expensive first"""
+    import pstats
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, name), (_, calls, own_s, cumulative_s, _) in stats.stats.items():
+        rows.append((f"{os.path.basename(filename)}:{line}({name})", cumulative_s, own_s, calls))
+    rows.sort(key=lambda row: row[1], reverse=True)
+    return [
+        {"function": function, "cum_ms": round(cum_s * 1000, 2), "own_ms": round(own_s * 1000, 2), "calls": calls}
+        for function, cum_s, own_s, calls in rows[:TOP_FUNCTIONS]
+    ]
+
+
+def _write(record):
+    line = json.dumps(record, default=str)
+    with _write_lock:
+        os.makedirs(os.path.dirname(PROFILE_FILE) or ".", exist_ok=True)
+        with open(PROFILE_FILE, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def run_page(name, page_function):
+    """Call page_function(), profiling the render when PAGE_PROFILE is set"""
+    if not ENABLED:
+        return page_function()
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    memory_before, _ = tracemalloc.get_traced_memory()
+    widgets_before = _widget_count()
+    render = query_stats.current_render()
+    queries_before, db_before = render.totals() if render is not None else (0, 0.0)
+
+    profiler = None
+    if PROFILE_FUNCTIONS:
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # another profiler is active on this thread
+            profiler = None
+
+    outcome = "ok"
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        return page_function()
+    except BaseException as e:
+        # st.rerun() / st.stop() end a render by raising - not an error
+        outcome = "rerun" if type(e).__name__ in ("RerunException", "StopException") else f"error: {type(e).__name__}"
+        raise
+    finally:
+        cpu_s = time.thread_time() - cpu_start
+        wall_s = time.perf_counter() - wall_start
+        if profiler is not None:
+            profiler.disable()
+        memory_after, memory_peak = tracemalloc.get_traced_memory()
+        widgets_after = _widget_count()
+        queries_after, db_after = render.totals() if render is not None else (0, 0.0)
+
+        record = {
+            "at": datetime.now().isoformat(timespec="seconds"),
+            "page": name,
+            "outcome": outcome,
+            "wall_ms": round(wall_s * 1000, 2),
+            "cpu_ms": round(cpu_s * 1000, 2),
+            "alloc_peak_kb": round((memory_peak - memory_before) / 1024, 1),
+            "alloc_net_kb": round((memory_after - memory_before) / 1024, 1),
+            "widgets": None if widgets_after is None else widgets_after - (widgets_before or 0),
+            "queries": queries_after - queries_before,
+            "db_ms": round((db_after - db_before) * 1000, 2),
+        }
+        if profiler is not None:
+            record["functions"] = _top_functions(profiler)
+        try:
+            _write(record)
+        except OSError:
+            pass
+
+
+# ================= SUMMARY =================
+def load_records(path):
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+
+def summarize(records):
+    """
+    Returns:
+        (pages, functions) - pages: list of per-page dicts ranked by total wall time;
+        functions: list of (page, function, total cum ms, renders seen, calls) ranked by cum ms
+    """
+    by_page = {}
+    for record in records:
+        by_page.setdefault(record["page"], []).append(record)
+
+    def mean(values):
+        values = [value for value in values if value is not None]
+        return round(sum(values) / len(values), 2) if values else None
+
+    def p95(values):
+        """Nearest-rank 95th percentile"""
+        ordered = sorted(values)
+        return ordered[max(0, min(len(ordered) - 1, int(round(0.95 * len(ordered) + 0.5)) - 1))]
+
+    pages = []
+    for page, page_records in by_page.items():
+        walls = [record["wall_ms"] for record in page_records]
+        pages.append({
+            "page": page,
+            "renders": len(page_records),
+            "total_ms": round(sum(walls), 1),
+            "mean_ms": mean(walls),
+            "p95_ms": p95(walls),
+            "max_ms": max(walls),
+            "cpu_ms": mean([record["cpu_ms"] for record in page_records]),
+            "db_ms": mean([record.get("db_ms") for record in page_records]),
+            "queries": mean([record.get("queries") for record in page_records]),
+            "alloc_peak_kb": mean([record.get("alloc_peak_kb") for record in page_records]),
+            "widgets": mean([record.get("widgets") for record in page_records]),
+        })
+    pages.sort(key=lambda page: page["total_ms"], reverse=True)
+
+    functions = {}
+    for record in records:
+        for entry in record.get("functions", []):
+            key = (record["page"], entry["function"])
+            total = functions.setdefault(key, [0.0, 0, 0])
+            total[0] += entry["cum_ms"]
+            total[1] += 1
+            total[2] += entry["calls"]
+    ranked = sorted(
+        ((page, function, round(cum_ms, 1), renders, calls) for (page, function), (cum_ms, renders, calls) in functions.items()),
+        key=lambda row: row[2], reverse=True
+    )
+    return pages, ranked
+
+
+def print_summary(path, top=15):
+    records = load_records(path)
+    if not records:
+        print(f"No profile records in {path}")
+        return
+    pages, functions = summarize(records)
+
+    print("=" * 110)
+    print(f"PAGE RENDER PROFILE - {len(records)} renders from {path}")
+    print("=" * 110)
+    print(f"{'page':<16}{'renders':>8}{'total ms':>11}{'mean':>9}{'p95':>9}{'max':>9}"
+          f"{'cpu':>9}{'db ms':>8}{'queries':>9}{'alloc KB':>10}{'widgets':>9}")
+    for page in pages:
+        print(f"{page['page']:<16}{page['renders']:>8}{page['total_ms']:>11.1f}{page['mean_ms']:>9.1f}"
+              f"{page['p95_ms']:>9.1f}{page['max_ms']:>9.1f}{page['cpu_ms'] or 0:>9.1f}{page['db_ms'] or 0:>8.1f}"
+              f"{page['queries'] or 0:>9.1f}{page['alloc_peak_kb'] or 0:>10.1f}{page['widgets'] or 0:>9.1f}")
+
+    if functions:
+        print()
+        print(f"TOP {top} FUNCTIONS BY CUMULATIVE TIME (PAGE_PROFILE=functions renders)")
+        for page, function, cum_ms, renders, calls in functions[:top]:
+            print(f"{cum_ms:>10.1f} ms  {page:<12} {function}  ({renders} renders, {calls} calls)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", default=PROFILE_FILE, help="profile JSONL file")
+    parser.add_argument("--top", type=int, default=15, help="functions to list")
+    args = parser.parse_args()
+    print_summary(args.file, args.top)
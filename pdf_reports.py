@@ -0,0 +1,251 @@
+"""
+Background generation of the PDF result report.
+
+Building the reportlab document (tables plus the per-question review)
+takes far longer than rendering the result page, so it is done on demand
+in a small worker pool: request_report() snapshots what the report needs
+and queues it, and the finished PDF is kept in a bounded process-wide
+cache keyed by the attempt's submission id. Attempts never change once
+submitted, so reruns and repeated downloads are served from the cache.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+
+from app_cache import get_cache
+from scoring import difficulty_breakdown, difficulty_counts
+
+REPORT_WORKERS = int(os.getenv("PDF_REPORT_WORKERS", "2"))
+REPORT_CACHE_TTL = float(os.getenv("PDF_REPORT_CACHE_TTL", "3600"))
+REPORT_CACHE_SIZE = int(os.getenv("PDF_REPORT_CACHE_SIZE", "200"))
+
+_reports = get_cache("pdf_reports", ttl=REPORT_CACHE_TTL, max_entries=REPORT_CACHE_SIZE)
+_pending = {}  # key -> Future of a report being built
+_pending_lock = threading.Lock()
+# Threads are only started on the first submit, so creating the pool up front is free
+_executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix="pdf-report")
+
+
+def _build_and_cache(key, report):
+    pdf = build_report(report)
+    _reports.put(key, pdf)
+    with _pending_lock:
+        _pending.pop(key, None)
+    return pdf
+
+
+def request_report(key, report):
+    """
+    Start building the report for `key` unless it is cached or already queued.
+    
+    Returns:
+        bytes of the PDF if it is ready, else None (see get_report)
+    """
+    pdf = get_report(key)
+    if pdf is not None:
+        return pdf
+    with _pending_lock:
+        if key not in _pending:
+            _pending[key] = _executor.submit(_build_and_cache, key, report)
+    return get_report(key)
+
+
+def get_report(key):
+    """
+    PDF bytes of a finished report, or None while it is still being built
+    (or was never requested). A failed build raises its error once and is
+    forgotten, so the next request retries.
+    """
+    pdf = _reports.get(key)
+    if pdf is not None:
+        return pdf
+    with _pending_lock:
+        future = _pending.get(key)
+        if future is None or not future.done():
+            return None
+        del _pending[key]
+    return future.result()
+
+
+def is_pending(key):
+    """True while the report for `key` is queued or being built"""
+    with _pending_lock:
+        future = _pending.get(key)
+    return future is not None and not future.done()
+
+
+def build_report(report):
+    """
+    Render a report snapshot to PDF.
+    
+    Args:
+        report: dict with score, total, time_taken (seconds), questions
+                (question dicts in test order, options as displayed) and
+                scored (scoring.score_test arrays for those questions)
+    
+    Returns:
+        bytes
+    """
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=18)
+    
+    # Container for the 'Flowable' objects
+    elements = []
+    
+    # Define styles
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        textColor=colors.HexColor('#1f77b4'),
+        spaceAfter=30,
+        alignment=TA_CENTER
+    )
+    
+    heading_style = ParagraphStyle(
+        'CustomHeading',
+        parent=styles['Heading2'],
+        fontSize=16,
+        textColor=colors.HexColor('#2ca02c'),
+        spaceAfter=12,
+        spaceBefore=12
+    )
+    
+    normal_style = styles['Normal']
+    
+    # Test data
+    score = report["score"]
+    test = report["questions"]
+    scored = report["scored"]
+    total = report["total"]
+    percentage = round((score / total) * 100, 2)
+    minutes, seconds = divmod(int(report["time_taken"]), 60)
+    
+    # Title
+    elements.append(Paragraph("🎯 Test Analytics & Results", title_style))
+    elements.append(Spacer(1, 0.2*inch))
+    
+    # Performance Overview
+    elements.append(Paragraph("Performance Overview", heading_style))
+    
+    grade = "A+" if percentage >= 90 else "A" if percentage >= 80 else "B" if percentage >= 70 else "C" if percentage >= 60 else "D" if percentage >= 50 else "F"
+    accuracy = f"{percentage}%"
+    
+    performance_data = [
+        ['Metric', 'Value'],
+        ['Score', f'{score}/{total}'],
+        ['Percentage', f'{percentage}%'],
+        ['Grade', grade],
+        ['Time Taken', f'{minutes}m {seconds}s'],
+        ['Accuracy', accuracy]
+    ]
+    
+    perf_table = Table(performance_data, colWidths=[2.5*inch, 2.5*inch])
+    perf_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]))
+    
+    elements.append(perf_table)
+    elements.append(Spacer(1, 0.3*inch))
+    
+    # Difficulty Breakdown
+    elements.append(Paragraph("Difficulty-wise Analysis", heading_style))
+    
+    # Difficulty stats from the scored arrays
+    by_difficulty = difficulty_breakdown(scored)
+    easy_correct, easy_total = difficulty_counts(by_difficulty, "easy")
+    medium_correct, medium_total = difficulty_counts(by_difficulty, "medium")
+    hard_correct, hard_total = difficulty_counts(by_difficulty, "hard")
+    
+    diff_data = [['Difficulty', 'Correct', 'Total', 'Accuracy']]
+    for row in by_difficulty.itertuples():
+        diff_data.append([row.Index.title(), str(row.correct), str(row.total), f'{round(row.accuracy, 1)}%'])
+    
+    diff_table = Table(diff_data, colWidths=[1.5*inch, 1.5*inch, 1.5*inch, 1.5*inch])
+    diff_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.lightblue),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]))
+    
+    elements.append(diff_table)
+    elements.append(Spacer(1, 0.3*inch))
+    
+    # Insights
+    elements.append(Paragraph("Insights & Recommendations", heading_style))
+    
+    insights_text = ""
+    
+    # Strengths
+    if easy_total > 0 and easy_correct / easy_total >= 0.8:
+        insights_text += "✓ Strong grasp of fundamental concepts (Easy questions).<br/>"
+    if medium_total > 0 and medium_correct / medium_total >= 0.7:
+        insights_text += "✓ Good understanding of moderate complexity topics.<br/>"
+    if hard_total > 0 and hard_correct / hard_total >= 0.6:
+        insights_text += "✓ Excellent problem-solving skills on challenging questions!<br/>"
+    
+    insights_text += "<br/>"
+    
+    # Weaknesses
+    if easy_total > 0 and easy_correct / easy_total < 0.6:
+        insights_text += "⚠ Focus on strengthening basic fundamentals.<br/>"
+    if medium_total > 0 and medium_correct / medium_total < 0.5:
+        insights_text += "⚠ Need more practice on moderate difficulty topics.<br/>"
+    if hard_total > 0 and hard_correct / hard_total < 0.4:
+        insights_text += "⚠ Work on advanced problem-solving techniques.<br/>"
+    
+    elements.append(Paragraph(insights_text, normal_style))
+    elements.append(Spacer(1, 0.3*inch))
+    
+    # Question Review
+    elements.append(PageBreak())
+    elements.append(Paragraph("Question-by-Question Review", heading_style))
+    
+    for k, q in enumerate(test):
+        i = k + 1
+        is_correct = bool(scored["is_correct"][k])
+        result_icon = "✓" if is_correct else "✗"
+        
+        # Question text
+        q_text = f"<b>Q{i}. {q['text']}</b> [{result_icon}]"
+        elements.append(Paragraph(q_text, normal_style))
+        elements.append(Spacer(1, 0.1*inch))
+        
+        # Options
+        for j, (opt_label, opt_text, _) in enumerate(q["options"]):
+            prefix = ""
+            
+            if j == scored["selected"][k]:
+                prefix = "➤ Your answer: "
+            if j == scored["correct"][k]:
+                prefix += "✓ Correct: "
+            
+            opt_line = f"{prefix}{opt_label}. {opt_text}"
+            elements.append(Paragraph(opt_line, normal_style))
+        
+        elements.append(Spacer(1, 0.2*inch))
+    
+    # Build PDF
+    doc.build(elements)
+    return buffer.getvalue()
@@ -0,0 +1,356 @@
+"""
+Query timing instrumentation for all database access.
+
+get_connection() (db_connection) wraps every connection in
+InstrumentedConnection, whose cursors time each execute() and record:
+
+- the statement fingerprint (literals -> ?, IN/VALUES lists collapsed)
+- duration, rows returned (counted as they are fetched) or affected
+- the call site - the first frame outside the database layer
+
+Statistics are aggregated process-wide and per page render (see
+track_render(), used by the router in streamlit_app.py). Statements
+slower than SLOW_QUERY_MS are logged to the "query_stats" logger - and to
+SLOW_QUERY_LOG, when set - and kept in a short recent list. The ranked
+report is shown on the admin settings page, or dumped with dump_report().
+
+QUERY_STATS=false turns the wrappers off entirely.
+"""
+import functools
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+ENABLED = os.getenv("QUERY_STATS", "true").lower() == "true"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "250"))
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG")
+RECENT_RENDERS = int(os.getenv("QUERY_STATS_RECENT_RENDERS", "100"))
+
+logger = logging.getLogger("query_stats")
+if SLOW_QUERY_LOG:
+    _handler = logging.FileHandler(SLOW_QUERY_LOG)
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+# Frames in these files are the database layer, not the call site
+_LAYER_FILES = {os.path.abspath(__file__), os.path.abspath(os.path.join(os.path.dirname(__file__), "db_connection.py"))}
+_LAYER_PACKAGES = (os.sep + "psycopg2" + os.sep,)
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ROWS_RE = re.compile(r"(\([^()]*\))(?:\s*,\s*\([^()]*\))+")
+_PARAM_RE = re.compile(r"%s|\$\d+")
+
+
+@functools.lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """Normalized statement text: literals and parameters -> ?, lists collapsed, whitespace squeezed"""
+    if isinstance(sql, bytes):
+        sql = sql.decode("utf-8", errors="replace")
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _PARAM_RE.sub("?", sql)
+    sql = " ".join(sql.split())
+    sql = _LIST_RE.sub("(?, ...)", sql)
+    sql = _ROWS_RE.sub(r"\1, ...", sql)
+    return sql
+
+
+def call_site():
+    """'file.py:line in function' of the first frame outside the database layer"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename not in _LAYER_FILES and not any(package in filename for package in _LAYER_PACKAGES):
+            return f"{os.path.basename(filename)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "?"
+
+
+class QueryStats:
+    """Per-fingerprint counters (calls, time, rows, call sites); thread-safe"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def record(self, key, elapsed, rows, site):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = {"calls": 0, "total_s": 0.0, "max_s": 0.0, "rows": 0, "sites": Counter()}
+            entry["calls"] += 1
+            entry["total_s"] += elapsed
+            entry["max_s"] = max(entry["max_s"], elapsed)
+            entry["rows"] += rows
+            entry["sites"][site] += 1
+
+    def add_rows(self, key, rows):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry["rows"] += rows
+
+    def totals(self):
+        with self._lock:
+            return (
+                sum(entry["calls"] for entry in self._entries.values()),
+                sum(entry["total_s"] for entry in self._entries.values()),
+            )
+
+    def report(self, limit=20, sort="total_s"):
+        """
+        Statements ranked by `sort` (total_s, max_s, calls or rows), most expensive first.
+
+        Returns:
+            list of dicts: fingerprint, calls, total_ms, avg_ms, max_ms, rows, top call sites
+        """
+        with self._lock:
+            items = [(key, dict(entry, sites=entry["sites"].most_common(3))) for key, entry in self._entries.items()]
+        items.sort(key=lambda item: item[1][sort], reverse=True)
+        return [
+            {
+                "fingerprint": key,
+                "calls": entry["calls"],
+                "total_ms": round(entry["total_s"] * 1000, 2),
+                "avg_ms": round(entry["total_s"] * 1000 / entry["calls"], 3),
+                "max_ms": round(entry["max_s"] * 1000, 2),
+                "rows": entry["rows"],
+                "call_sites": [f"{site} (x{count})" for site, count in entry["sites"]],
+            }
+            for key, entry in items[:limit]
+        ]
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_stats = QueryStats()
+_renders = deque(maxlen=RECENT_RENDERS)
+_slow = deque(maxlen=50)
+_local = threading.local()
+
+
+def record(sql, elapsed, rows, site):
+    """Add one executed statement to the process-wide and current render statistics. Returns its key."""
+    key = fingerprint(sql)
+    _stats.record(key, elapsed, rows, site)
+    render = getattr(_local, "render", None)
+    if render is not None:
+        render.record(key, elapsed, rows, site)
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        entry = {
+            "at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "ms": round(elapsed * 1000, 1),
+            "rows": rows,
+            "site": site,
+            "page": getattr(_local, "render_name", None),
+            "fingerprint": key,
+        }
+        _slow.append(entry)
+        logger.warning("slow query %.1f ms at %s: %s", entry["ms"], site, key)
+    return key
+
+
+def add_rows(key, rows):
+    _stats.add_rows(key, rows)
+    render = getattr(_local, "render", None)
+    if render is not None:
+        render.add_rows(key, rows)
+
+
+class track_render:
+    """
+    Context manager collecting the statements run by one page render on this thread.
+    The summary is kept in recent_renders() when the block exits (also on st.rerun()).
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._previous = (getattr(_local, "render", None), getattr(_local, "render_name", None))
+        _local.render = QueryStats()
+        _local.render_name = self.name
+        self._started = time.perf_counter()
+        return _local.render
+
+    def __exit__(self, exc_type, exc, tb):
+        render = _local.render
+        _local.render, _local.render_name = self._previous
+        queries, db_s = render.totals()
+        slowest = render.report(limit=1, sort="total_s")
+        _renders.append({
+            "page": self.name,
+            "at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "wall_ms": round((time.perf_counter() - self._started) * 1000, 1),
+            "queries": queries,
+            "db_ms": round(db_s * 1000, 1),
+            "top": slowest[0]["fingerprint"] if slowest else None,
+        })
+        return False
+
+
+def current_render():
+    """QueryStats of the render running on this thread, or None"""
+    return getattr(_local, "render", None)
+
+
+def report(limit=20, sort="total_s"):
+    """Process-wide statements ranked by cost (see QueryStats.report)"""
+    return _stats.report(limit, sort)
+
+
+def recent_renders():
+    """Summaries of the latest page renders, newest first"""
+    return list(reversed(_renders))
+
+
+def render_summary():
+    """page -> renders, avg / max queries and DB time per render, over the recent renders"""
+    pages = {}
+    for render in list(_renders):
+        page = pages.setdefault(render["page"], {"renders": 0, "queries": 0, "db_ms": 0.0, "max_queries": 0, "max_db_ms": 0.0})
+        page["renders"] += 1
+        page["queries"] += render["queries"]
+        page["db_ms"] += render["db_ms"]
+        page["max_queries"] = max(page["max_queries"], render["queries"])
+        page["max_db_ms"] = max(page["max_db_ms"], render["db_ms"])
+    return {
+        name: {
+            "renders": page["renders"],
+            "avg_queries": round(page["queries"] / page["renders"], 1),
+            "max_queries": page["max_queries"],
+            "avg_db_ms": round(page["db_ms"] / page["renders"], 1),
+            "max_db_ms": page["max_db_ms"],
+        }
+        for name, page in sorted(pages.items())
+    }
+
+
+def slow_queries():
+    """Latest statements over SLOW_QUERY_MS, newest first"""
+    return list(reversed(_slow))
+
+
+def reset():
+    _stats.reset()
+    _renders.clear()
+    _slow.clear()
+
+
+def dump_report(path, limit=100):
+    """Write the ranked report, per-page summary and slow queries to a JSON file"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "slow_query_ms": SLOW_QUERY_MS,
+            "statements": report(limit),
+            "pages": render_summary(),
+            "slow_queries": slow_queries(),
+        }, f, indent=2)
+    return path
+
+
+# ================= WRAPPERS =================
+class InstrumentedCursor:
+    """DB-API cursor wrapper that times execute() / executemany() and counts fetched rows"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._key = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _run(self, method, sql, args):
+        site = call_site()
+        start = time.perf_counter()
+        try:
+            method(sql, *args)
+        finally:
+            elapsed = time.perf_counter() - start
+            rowcount = getattr(self._cursor, "rowcount", -1)
+            # rowcount is rows affected for DML; SELECT rows are counted as they are fetched
+            affected = rowcount if rowcount and rowcount > 0 and self._cursor.description is None else 0
+            self._key = record(sql, elapsed, affected, site)
+        return self
+
+    def execute(self, sql, *args):
+        return self._run(self._cursor.execute, sql, args)
+
+    def executemany(self, sql, *args):
+        return self._run(self._cursor.executemany, sql, args)
+
+    def _fetched(self, rows):
+        if self._key is not None and rows:
+            add_rows(self._key, rows)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        self._fetched(1 if row is not None else 0)
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        self._fetched(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._fetched(len(rows))
+        return rows
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._fetched(1)
+            yield row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._cursor.close()
+        return False
+
+
+class InstrumentedConnection:
+    """Connection wrapper whose cursors are InstrumentedCursors; everything else is delegated"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+
+    def execute(self, sql, *args):
+        """sqlite3-style shortcut"""
+        return self.cursor().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        return self.cursor().executemany(sql, *args)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+
+def instrument(conn):
+    """Wrap a connection when instrumentation is enabled"""
+    return InstrumentedConnection(conn) if ENABLED else conn
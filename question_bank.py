@@ -0,0 +1,404 @@
+"""
+In-memory question bank index used by test generation.
+
+The whole bank (questions + options + concept/chapter/subject metadata) is
+loaded once per process into compact, array-backed columns and shared by
+every Streamlit session. Tests are sampled from precomputed
+(concept, difficulty) pools, so generating a test issues no DB queries.
+
+The bank is versioned: a cheap fingerprint query (row counts / max ids and
+the bank_revision counter) is run at most every QUESTION_BANK_CHECK_INTERVAL
+seconds, and the index is rebuilt when the fingerprint changes (e.g. after
+insert_all_chapters.py).
+"""
+import os
+import random
+import sys
+import threading
+import time
+from array import array
+
+from db_connection import get_connection
+
+# How often (seconds) to check whether the bank changed in the database
+CHECK_INTERVAL = float(os.getenv("QUESTION_BANK_CHECK_INTERVAL", "60"))
+
+DIFFICULTY_ORDER = ("easy", "medium", "hard")
+
+# Bumped by scripts that edit the bank in place (see bump_bank_revision), so
+# changes that keep row counts / max ids unchanged are still detected
+BANK_REVISION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bank_revision (
+    id INTEGER PRIMARY KEY,
+    revision INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+FINGERPRINT_QUERY = """
+    SELECT
+        (SELECT COALESCE(MAX(revision), 0) FROM bank_revision),
+        (SELECT COUNT(*) FROM questions),
+        (SELECT COALESCE(MAX(id), 0) FROM questions),
+        (SELECT COUNT(*) FROM mcq_options),
+        (SELECT COALESCE(MAX(id), 0) FROM mcq_options),
+        (SELECT COUNT(*) FROM concepts),
+        (SELECT COUNT(*) FROM chapters)
+"""
+
+
+class QuestionBank:
+    """
+    Immutable snapshot of the question bank.
+
+    Questions are stored column-wise (row index i describes one question):
+        ids[i], concept_ids[i], difficulty_codes[i], texts[i]
+    and options are stored flat, question i owning the slice
+        option_offsets[i]:option_offsets[i + 1]
+    of option_labels / option_texts / option_correct.
+    """
+
+    def __init__(self, fingerprint, generation, concept_rows, question_rows, option_rows):
+        self.fingerprint = fingerprint
+        self.generation = generation
+        self.loaded_at = time.time()
+
+        # ---- Concepts: id -> (chapter_number, subject) ----
+        self.concept_ids = array("i")
+        self.concept_chapters = array("i")
+        self.concept_subjects = []
+        self.concept_names = []
+        self._concept_index = {}
+        for concept_id, concept_name, chapter_number, subject in concept_rows:
+            self._concept_index[concept_id] = len(self.concept_ids)
+            self.concept_ids.append(concept_id)
+            self.concept_chapters.append(chapter_number or 0)
+            self.concept_subjects.append(sys.intern(subject or ""))
+            self.concept_names.append(concept_name)
+
+        # ---- Questions ----
+        self.difficulty_names = list(DIFFICULTY_ORDER)
+        difficulty_codes = {name: code for code, name in enumerate(self.difficulty_names)}
+
+        self.ids = array("i")
+        self.concept_of = array("i")
+        self.difficulty_codes = array("b")
+        self.texts = []
+        self._index = {}
+        for qid, concept_id, difficulty, text in question_rows:
+            difficulty = sys.intern((difficulty or "").lower())
+            if difficulty not in difficulty_codes:
+                difficulty_codes[difficulty] = len(self.difficulty_names)
+                self.difficulty_names.append(difficulty)
+            self._index[qid] = len(self.ids)
+            self.ids.append(qid)
+            self.concept_of.append(concept_id or 0)
+            self.difficulty_codes.append(difficulty_codes[difficulty])
+            self.texts.append(text)
+        self._difficulty_codes = difficulty_codes
+
+        # ---- Options (rows ordered by question_id, label) ----
+        grouped = {}
+        for qid, label, option_text, is_correct in option_rows:
+            grouped.setdefault(qid, []).append((label, option_text, is_correct))
+
+        self.option_offsets = array("i", [0])
+        self.option_labels = []
+        self.option_texts = []
+        self.option_correct = array("b")
+        for qid in self.ids:
+            for label, option_text, is_correct in grouped.get(qid, ()):
+                self.option_labels.append(sys.intern(label))
+                # Many options repeat ("All of the above", "None of these", units...)
+                self.option_texts.append(sys.intern(option_text))
+                self.option_correct.append(1 if is_correct else 0)
+            self.option_offsets.append(len(self.option_labels))
+
+        # ---- Pools: (concept_id, difficulty_code) -> question row indices ----
+        pools = {}
+        for i in range(len(self.ids)):
+            pools.setdefault((self.concept_of[i], self.difficulty_codes[i]), array("i")).append(i)
+        self._pools = pools
+        self._availability = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ---------------- lookups ----------------
+    def has_question(self, qid):
+        return qid in self._index
+
+    def index_of(self, qid):
+        return self._index[qid]
+
+    def difficulty_code(self, difficulty):
+        """Code for a difficulty name, or None if no question has it"""
+        return self._difficulty_codes.get(difficulty)
+
+    def options(self, i):
+        """Options of question row i as (label, option_text, is_correct) tuples, ordered by label"""
+        start, end = self.option_offsets[i], self.option_offsets[i + 1]
+        return [
+            (self.option_labels[j], self.option_texts[j], self.option_correct[j])
+            for j in range(start, end)
+        ]
+
+    def question(self, i, shuffle_options=True, rng=random):
+        """Question row i as the dict shape used throughout the app"""
+        options = self.options(i)
+        if shuffle_options:
+            rng.shuffle(options)
+        return {
+            "id": self.ids[i],
+            "text": self.texts[i],
+            "difficulty": self.difficulty_names[self.difficulty_codes[i]],
+            "options": options
+        }
+
+    def concept_info(self, concept_id):
+        """(chapter_number, subject) of a concept, or None"""
+        idx = self._concept_index.get(concept_id)
+        if idx is None:
+            return None
+        return self.concept_chapters[idx], self.concept_subjects[idx]
+
+    def concept_name(self, concept_id):
+        """Name of a concept, or None"""
+        idx = self._concept_index.get(concept_id)
+        return None if idx is None else self.concept_names[idx]
+
+    def concepts_for_chapters(self, chapters, subject):
+        """Concept ids belonging to the given chapter numbers of a subject"""
+        wanted = set(chapters)
+        return [
+            self.concept_ids[idx]
+            for idx in range(len(self.concept_ids))
+            if self.concept_subjects[idx] == subject and self.concept_chapters[idx] in wanted
+        ]
+
+    # ---------------- sampling ----------------
+    def availability_matrix(self, subject=None):
+        """
+        Question counts per (concept, difficulty) for one subject (all when None).
+
+        Returns:
+            dict concept_id -> {difficulty: count} (every difficulty present, zeros included).
+            Memoized on this immutable snapshot - callers must not modify it.
+        """
+        if subject in self._availability:
+            return self._availability[subject]
+        matrix = {}
+        for idx in range(len(self.concept_ids)):
+            if subject is None or self.concept_subjects[idx] == subject:
+                matrix[self.concept_ids[idx]] = {name: 0 for name in DIFFICULTY_ORDER}
+        for (concept_id, code), pool in self._pools.items():
+            counts = matrix.get(concept_id)
+            if counts is not None:
+                counts[self.difficulty_names[code]] = len(pool)
+        self._availability[subject] = matrix
+        return matrix
+
+    def pool_size(self, concept_ids, difficulty):
+        code = self._difficulty_codes.get(difficulty)
+        if code is None:
+            return 0
+        return sum(len(self._pools.get((cid, code), ())) for cid in set(concept_ids))
+
+    def sample(self, concept_ids, difficulty, count, rng=random):
+        """
+        Pick `count` distinct question row indices of one difficulty from the
+        union of the concepts' pools. Returns None if the pools are too small.
+        """
+        code = self._difficulty_codes.get(difficulty)
+        if code is None:
+            return None if count > 0 else []
+        candidates = array("i")
+        for cid in set(concept_ids):
+            pool = self._pools.get((cid, code))
+            if pool:
+                candidates.extend(pool)
+        if len(candidates) < count:
+            return None
+        return rng.sample(candidates, count)
+
+    # ---------------- introspection ----------------
+    def memory_footprint(self):
+        """Approximate memory used by the index, in bytes, per component"""
+        def strings_size(values):
+            seen = set()
+            total = sys.getsizeof(values)
+            for value in values:
+                if id(value) not in seen:
+                    seen.add(id(value))
+                    total += sys.getsizeof(value)
+            return total
+
+        def mapping_size(mapping):
+            return sys.getsizeof(mapping) + sum(sys.getsizeof(v) for v in mapping.values())
+
+        footprint = {
+            "question_columns": sum(sys.getsizeof(a) for a in (self.ids, self.concept_of, self.difficulty_codes)),
+            "question_texts": strings_size(self.texts),
+            "option_columns": sys.getsizeof(self.option_offsets) + sys.getsizeof(self.option_correct),
+            "option_strings": strings_size(self.option_labels) + strings_size(self.option_texts),
+            "concepts": sum(sys.getsizeof(a) for a in (self.concept_ids, self.concept_chapters))
+                        + strings_size(self.concept_subjects) + strings_size(self.concept_names)
+                        + sys.getsizeof(self._concept_index),
+            "pools": mapping_size(self._pools),
+            "id_index": sys.getsizeof(self._index),
+        }
+        footprint["total"] = sum(footprint.values())
+        return footprint
+
+    def stats(self):
+        return {
+            "generation": self.generation,
+            "questions": len(self.ids),
+            "options": len(self.option_labels),
+            "concepts": len(self.concept_ids),
+            "pools": len(self._pools),
+            "loaded_at": self.loaded_at,
+            "memory_bytes": self.memory_footprint()["total"],
+        }
+
+
+def split_counts(total_questions, easy_pct, medium_pct):
+    """Questions needed per difficulty for a total and an easy/medium split (hard gets the rest)"""
+    easy_count = round(total_questions * easy_pct / 100)
+    medium_count = round(total_questions * medium_pct / 100)
+    return {
+        "easy": easy_count,
+        "medium": medium_count,
+        "hard": total_questions - easy_count - medium_count,  # Ensure exact total
+    }
+
+
+def available_by_difficulty(matrix, concept_ids):
+    """Sum an availability matrix over the selected concepts: {difficulty: count}"""
+    totals = {name: 0 for name in DIFFICULTY_ORDER}
+    for concept_id in set(concept_ids):
+        for difficulty, count in matrix.get(concept_id, {}).items():
+            totals[difficulty] = totals.get(difficulty, 0) + count
+    return totals
+
+
+def check_feasibility(matrix, concept_ids, total_questions, easy_pct, medium_pct):
+    """
+    Whether a test can be generated from the selection, computed locally from
+    an availability matrix.
+
+    Returns:
+        dict with "feasible" (bool), "needed", "available" and "short"
+        ({difficulty: count} - "short" only lists difficulties that lack questions)
+    """
+    needed = split_counts(total_questions, easy_pct, medium_pct)
+    available = available_by_difficulty(matrix, concept_ids)
+    short = {
+        difficulty: count - available.get(difficulty, 0)
+        for difficulty, count in needed.items()
+        if count > available.get(difficulty, 0)
+    }
+    return {"feasible": not short, "needed": needed, "available": available, "short": short}
+
+
+def _read_fingerprint(cur):
+    cur.execute(FINGERPRINT_QUERY)
+    return tuple(cur.fetchone())
+
+
+def load_question_bank(generation=1):
+    """Read the whole bank from the database and build a QuestionBank"""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(BANK_REVISION_SCHEMA)
+        conn.commit()
+        fingerprint = _read_fingerprint(cur)
+
+        cur.execute("""
+            SELECT c.id, c.concept_name, ch.chapter_number, ch.subject
+            FROM concepts c
+            JOIN chapters ch ON c.chapter_id = ch.id
+            ORDER BY ch.subject, ch.chapter_number, c.id
+        """)
+        concept_rows = cur.fetchall()
+
+        cur.execute("SELECT id, concept_id, difficulty, question_text FROM questions ORDER BY id")
+        question_rows = cur.fetchall()
+
+        cur.execute("""
+            SELECT question_id, label, option_text, is_correct
+            FROM mcq_options
+            ORDER BY question_id, label
+        """)
+        option_rows = cur.fetchall()
+    finally:
+        conn.close()
+
+    return QuestionBank(fingerprint, generation, concept_rows, question_rows, option_rows)
+
+
+_bank = None
+_last_check = 0.0
+_bank_lock = threading.Lock()
+
+
+def get_question_bank(force_check=False):
+    """
+    Return the shared QuestionBank, loading it on first use and rebuilding it
+    when the bank fingerprint in the database has changed.
+    """
+    global _bank, _last_check
+
+    now = time.monotonic()
+    if _bank is not None and not force_check and now - _last_check < CHECK_INTERVAL:
+        return _bank
+
+    with _bank_lock:
+        now = time.monotonic()
+        if _bank is not None and not force_check and now - _last_check < CHECK_INTERVAL:
+            return _bank
+
+        if _bank is None:
+            _bank = load_question_bank()
+        else:
+            conn = get_connection()
+            cur = conn.cursor()
+            try:
+                fingerprint = _read_fingerprint(cur)
+            finally:
+                conn.close()
+            if fingerprint != _bank.fingerprint:
+                _bank = load_question_bank(_bank.generation + 1)
+        _last_check = time.monotonic()
+        return _bank
+
+
+def invalidate_question_bank():
+    """Force a fingerprint check (and reload if changed) on the next access"""
+    global _last_check
+    _last_check = 0.0
+
+
+def bump_bank_revision():
+    """
+    Record that the bank was edited, so every running app reloads its index
+    (and the reference-data caches keyed on it) at the next fingerprint check.
+    Call after committing inserts/updates to chapters, concepts, questions or options.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(BANK_REVISION_SCHEMA)
+        cur.execute("UPDATE bank_revision SET revision = revision + 1 WHERE id = 1")
+        if cur.rowcount == 0:
+            cur.execute("INSERT INTO bank_revision (id, revision) VALUES (1, 1)")
+        conn.commit()
+    finally:
+        conn.close()
+    invalidate_question_bank()
+
+
+def get_question_bank_stats():
+    """Stats of the currently loaded bank, or None if it was never loaded"""
+    bank = _bank
+    return bank.stats() if bank is not None else None
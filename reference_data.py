@@ -0,0 +1,151 @@
+"""
+Cached reference data for the test setup pages (concepts per chapter,
+concept ids of chapters, question availability).
+
+Lookups are read-through: the first request loads from the database and
+later ones are served from process-wide caches (see app_cache), so
+re-rendering the setup pages issues no queries in steady state.
+
+Entries are keyed on the question bank generation, so they go stale
+together with the in-memory bank when insert_all_chapters.py & co. change
+the bank (detected by the bank fingerprint check / bump_bank_revision).
+invalidate_reference_data() drops everything at once; the TTL is only a
+safety net. Question availability is read from the in-memory bank's
+(concept, difficulty) availability matrix. Chapter names are the static
+CHAPTER_NAMES dict below and need no caching.
+"""
+import os
+
+from app_cache import get_cache
+from db_connection import get_connection, get_placeholder
+from question_bank import get_question_bank, invalidate_question_bank, available_by_difficulty
+
+REFERENCE_TTL = float(os.getenv("REFERENCE_CACHE_TTL", "600"))
+
+_concepts_cache = get_cache("concepts_by_chapter", ttl=REFERENCE_TTL, max_entries=32)
+
+# Chapter name mappings - Physics and Chemistry
+CHAPTER_NAMES = {
+    "Biology": {
+        1: "Introducing Biology (Scope and Branches)",
+        2: "Cell - The Unit of Life",
+        3: "Tissues: Plant and Animal Tissues",
+        4: "The Flower",
+        5: "Pollination and Fertilization",
+        6: "Seed: Structure and Germination",
+        7: "Respiration in Plants",
+        8: "Five Kingdom Classification",
+        9: "Economic Importance of Bacteria and Fungi",
+        10: "Nutrition",
+        11: "Digestive System",
+        12: "Skeleton, Movement and Locomotion",
+        13: "Skin: The Jack of All Trades",
+        14: "The Respiratory System",
+        15: "Hygiene: A Key to Healthy Life",
+        16: "Diseases: Cause and Control",
+        17: "Aids to Health",
+        18: "Health Organizations",
+        19: "Waste Generation and Management"
+    },
+    "Physics": {
+        1: "Measurements and Experimentation",
+        2: "Motion in One Dimension",
+        3: "Laws of Motion",
+        4: "Pressure in Fluids",
+        5: "Upthrust in Fluids and Archimedes' Principle",
+        6: "Heat and Energy",
+        7: "Reflection of Light",
+        8: "Propagation of Sound Waves",
+        9: "Current Electricity",
+        10: "Magnetism"
+    },
+    "Chemistry": {
+        1: "The Language of Chemistry",
+        2: "Chemical Changes and Reactions",
+        3: "Water",
+        4: "Atomic Structure and Chemical Bonding",
+        5: "The Periodic Table",
+        6: "Study of the First Element - Hydrogen",
+        7: "Study of Gas Laws",
+        8: "Atmospheric Pollution",
+        9: "Practical Work"
+    }
+}
+
+
+def _generation():
+    return get_question_bank().generation
+
+
+def _load_concepts_by_chapter(subject):
+    conn = get_connection()
+    cur = conn.cursor()
+    placeholder = get_placeholder()
+    try:
+        cur.execute(f'''
+            SELECT ch.chapter_number, c.id, c.concept_name
+            FROM concepts c
+            JOIN chapters ch ON c.chapter_id = ch.id
+            WHERE ch.subject = {placeholder}
+            ORDER BY ch.chapter_number, c.id
+        ''', (subject,))
+        rows = cur.fetchall()
+    finally:
+        conn.close()
+
+    concepts_by_chapter = {}
+    for ch_num, concept_id, concept_name in rows:
+        if ch_num not in concepts_by_chapter:
+            concepts_by_chapter[ch_num] = []
+        concepts_by_chapter[ch_num].append((concept_id, concept_name))
+    return concepts_by_chapter
+
+
+def get_concepts_by_chapter(subject="Physics"):
+    """Get all concepts grouped by chapter for a specific subject"""
+    return _concepts_cache.get_or_load(
+        (_generation(), subject),
+        lambda: _load_concepts_by_chapter(subject)
+    )
+
+
+def get_concept_ids_for_chapters(subject, chapters):
+    """Concept ids belonging to the given chapter numbers of a subject"""
+    concepts_by_chapter = get_concepts_by_chapter(subject)
+    return [
+        concept_id
+        for ch_num in chapters
+        for concept_id, _ in concepts_by_chapter.get(ch_num, [])
+    ]
+
+
+def get_availability_matrix(subject=None):
+    """
+    Question counts per (concept, difficulty) for a subject, from the in-memory
+    bank (no DB queries). Use question_bank.check_feasibility() on it to validate
+    any selection and difficulty split locally.
+    """
+    return get_question_bank().availability_matrix(subject)
+
+
+def count_questions(concept_ids, difficulties=None):
+    """Number of questions in the given concepts (optionally only some difficulties)"""
+    totals = available_by_difficulty(get_availability_matrix(), concept_ids)
+    return sum(count for difficulty, count in totals.items() if difficulties is None or difficulty in difficulties)
+
+
+def count_questions_in_chapters(chapters, difficulties):
+    """Number of questions of the given difficulties in these chapter numbers (any subject)"""
+    bank = get_question_bank()
+    wanted = set(chapters)
+    concept_ids = [
+        concept_id for concept_id in get_availability_matrix()
+        if bank.concept_info(concept_id)[0] in wanted
+    ]
+    return count_questions(concept_ids, difficulties)
+
+
+def invalidate_reference_data():
+    """Drop all cached reference data and re-check the bank on next access"""
+    _concepts_cache.invalidate()
+    invalidate_question_bank()
@@ -71,4 +71,10 @@ CREATE INDEX IF NOT EXISTS idx_questions_concept ON questions(concept_id);
 CREATE INDEX IF NOT EXISTS idx_mcq_options_question ON mcq_options(question_id);
 CREATE INDEX IF NOT EXISTS idx_test_attempts_student ON test_attempts(student_id);
 CREATE INDEX IF NOT EXISTS idx_responses_attempt ON responses(attempt_id);
-CREATE INDEX IF NOT EXISTS idx_responses_question ON responses(question_id);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_responses_question ON responses(question_id);
+
+-- Student directory: keyset pagination and prefix search (see student_directory.py).
+-- The created_at / school_name indexes live in all_database_migrations.sql,
+-- after the ADD COLUMN statements for those columns.
+CREATE INDEX IF NOT EXISTS idx_users_username_search ON users(LOWER(username) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_users_phone_search ON users(phone_number text_pattern_ops);
\ No newline at end of file
@@ -0,0 +1,103 @@
+"""
+Grading of submitted answers.
+
+Pure functions shared by the Streamlit pages and the headless tools
+(load test, benchmarks) - nothing here touches Streamlit or the database.
+
+A submission is scored once by score_test() into compact per-question
+NumPy arrays; the score, the responses to store and the per-difficulty /
+per-concept breakdowns shown on the result page and in the PDF report are
+all derived from those arrays without walking the options again.
+"""
+import numpy as np
+import pandas as pd
+
+DIFFICULTY_NAMES = ("easy", "medium", "hard")
+DIFFICULTY_CODES = {name: code for code, name in enumerate(DIFFICULTY_NAMES)}
+
+
+def score_test(questions, answers, concept_ids=None):
+    """
+    Score a submission into per-question arrays, in test order.
+    
+    Returns:
+        dict of NumPy arrays:
+            question_id, selected (option index as displayed, -1 = unanswered),
+            correct (index of the correct option, -1 = none), is_correct (bool),
+            difficulty (code in DIFFICULTY_NAMES, -1 = other), concept_id (0 = unknown)
+    """
+    count = len(questions)
+    selected = np.full(count, -1, dtype=np.int8)
+    correct = np.full(count, -1, dtype=np.int8)
+    for k, q in enumerate(questions):
+        selected_label = answers.get(q["id"])
+        for j, (label, _, is_correct) in enumerate(q["options"]):
+            if is_correct and correct[k] < 0:
+                correct[k] = j
+            if selected_label and label == selected_label:
+                selected[k] = j
+
+    return {
+        "question_id": np.array([q["id"] for q in questions], dtype=np.int64),
+        "selected": selected,
+        "correct": correct,
+        "is_correct": (selected >= 0) & (selected == correct),
+        "difficulty": np.array(
+            [DIFFICULTY_CODES.get((q.get("difficulty") or "").lower(), -1) for q in questions], dtype=np.int8
+        ),
+        "concept_id": np.asarray(concept_ids if concept_ids is not None else np.zeros(count), dtype=np.int64),
+    }
+
+
+def total_score(scored):
+    return int(scored["is_correct"].sum())
+
+
+def graded_responses(scored, answers):
+    """(question_id, selected_label, is_correct) rows to store for a scored submission"""
+    return [
+        (int(qid), answers.get(int(qid)), int(is_correct))
+        for qid, is_correct in zip(scored["question_id"], scored["is_correct"])
+    ]
+
+
+def difficulty_breakdown(scored):
+    """
+    Returns:
+        DataFrame indexed by difficulty name (only difficulties in the test)
+        with columns correct, total, accuracy (percent)
+    """
+    known = scored["difficulty"] >= 0
+    codes = scored["difficulty"][known]
+    total = np.bincount(codes, minlength=len(DIFFICULTY_NAMES))
+    correct = np.bincount(codes, weights=scored["is_correct"][known], minlength=len(DIFFICULTY_NAMES))
+    present = np.flatnonzero(total)
+    return pd.DataFrame(
+        {
+            "correct": correct[present].astype(int),
+            "total": total[present],
+            "accuracy": correct[present] * 100.0 / total[present],
+        },
+        index=[DIFFICULTY_NAMES[code] for code in present],
+    )
+
+
+def difficulty_counts(by_difficulty, difficulty):
+    """(correct, total) of one difficulty from difficulty_breakdown()"""
+    if difficulty not in by_difficulty.index:
+        return 0, 0
+    row = by_difficulty.loc[difficulty]
+    return int(row["correct"]), int(row["total"])
+
+
+def concept_breakdown(scored):
+    """
+    Returns:
+        DataFrame indexed by concept_id with columns correct, total, accuracy
+        (percent), weakest concept first
+    """
+    frame = pd.DataFrame({"concept_id": scored["concept_id"], "is_correct": scored["is_correct"]})
+    breakdown = frame.groupby("concept_id")["is_correct"].agg(correct="sum", total="size")
+    breakdown["correct"] = breakdown["correct"].astype(int)
+    breakdown["accuracy"] = breakdown["correct"] * 100.0 / breakdown["total"]
+    return breakdown.sort_values(["accuracy", "total"], ascending=[True, False])
@@ -1,97 +1,64 @@
 import streamlit as st
+import streamlit.components.v1 as components
+import html
+import json
+import math
+import os
+import random
 import time
+from array import array
 from datetime import datetime
 import pytz
-from io import BytesIO
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
 
 from auth import login, create_user
 from generate_test_engine import (
-    generate_test, 
-    generate_test_with_difficulty_cap,
     generate_test_from_concepts,
     create_admin_test,
     get_admin_test_questions,
-    get_available_admin_tests
+    get_admin_test_paper,
+    questions_by_ids,
+    question_concepts,
+    concept_names,
+    delete_admin_test,
+    invalidate_admin_test,
+    get_student_test_catalog,
+    fetch_options_by_question
 )
-from db_connection import get_connection, get_placeholder, USE_POSTGRES
+from db_connection import get_connection, get_placeholder, get_pool_stats, get_statement_stats, USE_POSTGRES
+from question_bank import get_question_bank
+from submission_queue import submit as submit_attempt, pending_submission_count, pending_admin_submissions, get_submission_queue_stats, get_dead_submissions, requeue_dead_submissions
+from analytics_rollups import ensure_rollup_tables, rebuild_rollups
+from leaderboard_engine import get_leaderboard, update_board, ensure_leaderboard_table
+from student_directory import count_students, list_students, delete_students
+from reference_data import (
+    CHAPTER_NAMES,
+    get_concepts_by_chapter,
+    get_concept_ids_for_chapters,
+    get_availability_matrix,
+    count_questions_in_chapters,
+    invalidate_reference_data
+)
+from question_bank import available_by_difficulty, check_feasibility
+from app_cache import get_cache, get_cache_stats
+from scoring import score_test, total_score, graded_responses, difficulty_breakdown, difficulty_counts, concept_breakdown
+from pdf_reports import request_report, get_report, is_pending
+import query_stats
+from query_stats import track_render
+from page_profiler import run_page
 
 st.set_page_config("Class 9 ICSE Test Platform", layout="wide")
 
-# Chapter name mappings - Physics and Chemistry
-CHAPTER_NAMES = {
-    "Biology": {
-        1: "Introducing Biology (Scope and Branches)",
-        2: "Cell - The Unit of Life",
-        3: "Tissues: Plant and Animal Tissues",
-        4: "The Flower",
-        5: "Pollination and Fertilization",
-        6: "Seed: Structure and Germination",
-        7: "Respiration in Plants",
-        8: "Five Kingdom Classification",
-        9: "Economic Importance of Bacteria and Fungi",
-        10: "Nutrition",
-        11: "Digestive System",
-        12: "Skeleton, Movement and Locomotion",
-        13: "Skin: The Jack of All Trades",
-        14: "The Respiratory System",
-        15: "Hygiene: A Key to Healthy Life",
-        16: "Diseases: Cause and Control",
-        17: "Aids to Health",
-        18: "Health Organizations",
-        19: "Waste Generation and Management"
-    },
-    "Physics": {
-        1: "Measurements and Experimentation",
-        2: "Motion in One Dimension",
-        3: "Laws of Motion",
-        4: "Pressure in Fluids",
-        5: "Upthrust in Fluids and Archimedes' Principle",
-        6: "Heat and Energy",
-        7: "Reflection of Light",
-        8: "Propagation of Sound Waves",
-        9: "Current Electricity",
-        10: "Magnetism"
-    },
-    "Chemistry": {
-        1: "The Language of Chemistry",
-        2: "Chemical Changes and Reactions",
-        3: "Water",
-        4: "Atomic Structure and Chemical Bonding",
-        5: "The Periodic Table",
-        6: "Study of the First Element - Hydrogen",
-        7: "Study of Gas Laws",
-        8: "Atmospheric Pollution",
-        9: "Practical Work"
-    }
-}
+# Test timer mode:
+#   "client"    - countdown ticks in the browser; only a small timer fragment
+#                 re-runs on the server every TEST_TIMER_SYNC_SECONDS (and at expiry)
+#   "heartbeat" - legacy full-script rerun every 0.5s
+TEST_TIMER_MODE = os.getenv("TEST_TIMER_MODE", "client").lower()
+TEST_TIMER_SYNC_SECONDS = int(os.getenv("TEST_TIMER_SYNC_SECONDS", "15"))
 
-def get_concepts_by_chapter(subject="Physics"):
-    """Get all concepts grouped by chapter for a specific subject"""
-    conn = get_connection()
-    cur = conn.cursor()
-    placeholder = get_placeholder()
-    cur.execute(f'''
-        SELECT ch.chapter_number, c.id, c.concept_name 
-        FROM concepts c 
-        JOIN chapters ch ON c.chapter_id = ch.id 
-        WHERE ch.subject = {placeholder}
-        ORDER BY ch.chapter_number, c.id
-    ''', (subject,))
-    rows = cur.fetchall()
-    conn.close()
-    
-    concepts_by_chapter = {}
-    for ch_num, concept_id, concept_name in rows:
-        if ch_num not in concepts_by_chapter:
-            concepts_by_chapter[ch_num] = []
-        concepts_by_chapter[ch_num].append((concept_id, concept_name))
-    return concepts_by_chapter
+# Students per page in the admin test results view
+RESULTS_PAGE_SIZE = int(os.getenv("RESULTS_PAGE_SIZE", "20"))
+# Students per page in the admin Students tab
+STUDENTS_PAGE_SIZE = int(os.getenv("STUDENTS_PAGE_SIZE", "25"))
 
 def format_timestamp(timestamp):
     """Convert timestamp to IST timezone"""
@@ -133,8 +100,9 @@ def admin_page():
 
 
 def show_admin_statistics():
-    """Display admin statistics (original admin_page content)"""
+    """Display admin statistics (original admin_page content), read from the analytics rollups"""
 
+    ensure_rollup_tables()
     conn = get_connection()
     cur = conn.cursor()
 
@@ -147,17 +115,12 @@ def show_admin_statistics():
     total_students = cur.fetchone()[0]
 
     cur.execute(
-        "SELECT COUNT(*) FROM test_attempts"
+        "SELECT COALESCE(SUM(tests_taken), 0), SUM(ratio_sum) / NULLIF(SUM(tests_taken), 0) FROM rollup_student"
     )
-    total_tests = cur.fetchone()[0]
-
-    cur.execute(
-        "SELECT AVG(score*1.0/total_questions) FROM test_attempts"
-    )
-    avg_score = cur.fetchone()[0]
+    total_tests, avg_score = cur.fetchone()
     
     cur.execute(
-        "SELECT COUNT(*) FROM responses"
+        "SELECT COALESCE(SUM(attempts), 0) FROM rollup_difficulty"
     )
     total_questions_answered = cur.fetchone()[0]
 
@@ -176,15 +139,14 @@ def show_admin_statistics():
         SELECT 
             u.id,
             u.username,
-            COUNT(t.id) AS tests_taken,
-            ROUND(AVG(t.score*1.0/t.total_questions)*100, 2) AS avg_accuracy,
-            MAX(t.score*1.0/t.total_questions)*100 AS best_score,
-            MIN(t.score*1.0/t.total_questions)*100 AS worst_score,
-            MAX(t.started_at) AS last_test_date
-        FROM users u
-        JOIN test_attempts t ON u.id = t.student_id
-        WHERE u.role='student'
-        GROUP BY u.id, u.username
+            s.tests_taken,
+            ROUND(CAST(s.ratio_sum * 100 / s.tests_taken AS NUMERIC), 2) AS avg_accuracy,
+            s.best_ratio * 100 AS best_score,
+            s.worst_ratio * 100 AS worst_score,
+            s.last_test_at AS last_test_date
+        FROM rollup_student s
+        JOIN users u ON u.id = s.student_id
+        WHERE u.role='student' AND s.tests_taken > 0
         ORDER BY avg_accuracy DESC
     """)
     student_data = cur.fetchall()
@@ -255,14 +217,12 @@ def show_admin_statistics():
             cur.execute(f"""
                 SELECT 
                     ch.chapter_number,
-                    ROUND(AVG(r.is_correct)*100, 2) AS accuracy,
-                    COUNT(r.id) AS questions_attempted
-                FROM responses r
-                JOIN test_attempts t ON r.attempt_id = t.id
-                JOIN questions q ON r.question_id = q.id
-                JOIN concepts c ON q.concept_id = c.id
+                    ROUND(SUM(sc.correct) * 100.0 / SUM(sc.attempts), 2) AS accuracy,
+                    SUM(sc.attempts) AS questions_attempted
+                FROM rollup_student_concept sc
+                JOIN concepts c ON sc.concept_id = c.id
                 JOIN chapters ch ON c.chapter_id = ch.id
-                WHERE t.student_id = {placeholder}
+                WHERE sc.student_id = {placeholder} AND sc.attempts > 0
                 GROUP BY ch.chapter_number
                 ORDER BY accuracy ASC
             """, (student_id,))
@@ -285,16 +245,13 @@ def show_admin_statistics():
 
     cur.execute("""
         SELECT 
-            ch.chapter_number,
-            ROUND(AVG(r.is_correct)*100, 2) AS accuracy,
-            COUNT(r.id) AS total_attempts,
-            SUM(r.is_correct) AS correct_answers
-        FROM responses r
-        JOIN questions q ON r.question_id = q.id
-        JOIN concepts c ON q.concept_id = c.id
-        JOIN chapters ch ON c.chapter_id = ch.id
-        GROUP BY ch.chapter_number
-        ORDER BY ch.chapter_number
+            chapter_number,
+            ROUND(correct * 100.0 / attempts, 2) AS accuracy,
+            attempts AS total_attempts,
+            correct AS correct_answers
+        FROM rollup_chapter
+        WHERE attempts > 0
+        ORDER BY chapter_number
     """)
     chapter_df = cur.fetchall()
 
@@ -342,15 +299,14 @@ def show_admin_statistics():
     
     cur.execute("""
         SELECT 
-            q.difficulty,
-            COUNT(r.id) AS attempts,
-            SUM(r.is_correct) AS correct,
-            ROUND(AVG(r.is_correct)*100, 2) AS accuracy
-        FROM responses r
-        JOIN questions q ON r.question_id = q.id
-        GROUP BY q.difficulty
+            difficulty,
+            attempts,
+            correct,
+            ROUND(correct * 100.0 / attempts, 2) AS accuracy
+        FROM rollup_difficulty
+        WHERE attempts > 0
         ORDER BY 
-            CASE q.difficulty
+            CASE difficulty
                 WHEN 'easy' THEN 1
                 WHEN 'medium' THEN 2
                 WHEN 'hard' THEN 3
@@ -379,15 +335,13 @@ def show_admin_statistics():
             c.id,
             c.concept_name,
             ch.chapter_number,
-            COUNT(r.id) AS total_attempts,
-            SUM(r.is_correct) AS correct_answers,
-            ROUND(AVG(r.is_correct)*100, 2) AS accuracy
-        FROM concepts c
+            rc.attempts AS total_attempts,
+            rc.correct AS correct_answers,
+            ROUND(rc.correct * 100.0 / rc.attempts, 2) AS accuracy
+        FROM rollup_concept rc
+        JOIN concepts c ON rc.concept_id = c.id
         JOIN chapters ch ON c.chapter_id = ch.id
-        LEFT JOIN questions q ON q.concept_id = c.id
-        LEFT JOIN responses r ON r.question_id = q.id
-        GROUP BY c.id, c.concept_name, ch.chapter_number
-        HAVING COUNT(r.id) > 0
+        WHERE rc.attempts > 0
         ORDER BY accuracy ASC
     """)
     concept_stats = cur.fetchall()
@@ -427,15 +381,12 @@ def show_admin_statistics():
         cur.execute(f"""
             SELECT 
                 u.username,
-                COUNT(r.id) AS attempts,
-                SUM(r.is_correct) AS correct,
-                ROUND(AVG(r.is_correct)*100, 2) AS accuracy
-            FROM responses r
-            JOIN test_attempts t ON r.attempt_id = t.id
-            JOIN users u ON t.student_id = u.id
-            JOIN questions q ON r.question_id = q.id
-            WHERE q.concept_id = {placeholder}
-            GROUP BY u.username
+                sc.attempts,
+                sc.correct,
+                ROUND(sc.correct * 100.0 / sc.attempts, 2) AS accuracy
+            FROM rollup_student_concept sc
+            JOIN users u ON sc.student_id = u.id
+            WHERE sc.concept_id = {placeholder} AND sc.attempts > 0
             ORDER BY accuracy ASC, attempts DESC
         """, (selected_concept_id,))
         student_concept_performance = cur.fetchall()
@@ -523,19 +474,7 @@ def create_test_interface():
         
         # Get all concept IDs from selected chapters
         if chapters:
-            conn = get_connection()
-            cur = conn.cursor()
-            placeholder = get_placeholder()
-            chapter_placeholders = ",".join([placeholder] * len(chapters))
-            cur.execute(f"""
-                SELECT c.id
-                FROM concepts c
-                JOIN chapters ch ON c.chapter_id = ch.id
-                WHERE ch.chapter_number IN ({chapter_placeholders})
-                AND ch.subject = {placeholder}
-            """, tuple(chapters) + (subject,))
-            selected_concept_ids = [row[0] for row in cur.fetchall()]
-            conn.close()
+            selected_concept_ids = get_concept_ids_for_chapters(subject, chapters)
     
     else:  # Select by Concepts
         # Get concepts grouped by chapter for selected subject
@@ -571,20 +510,15 @@ def create_test_interface():
         st.info("📚 Please select at least one chapter or concept to create a test")
         return
     
-    # Get available questions for selected concepts
-    conn = get_connection()
-    cur = conn.cursor()
-    placeholder = get_placeholder()
-    concept_placeholders = ",".join([placeholder] * len(selected_concept_ids))
-    cur.execute(f"""
-        SELECT COUNT(*)
-        FROM questions
-        WHERE concept_id IN ({concept_placeholders})
-    """, tuple(selected_concept_ids))
-    available_questions = cur.fetchone()[0]
-    conn.close()
+    # Get available questions for selected concepts (from the in-memory availability matrix)
+    availability = get_availability_matrix(subject)
+    available_by_diff = available_by_difficulty(availability, selected_concept_ids)
+    available_questions = sum(available_by_diff.values())
     
-    st.info(f"📊 Available questions from selection: {available_questions}")
+    st.info(
+        f"📊 Available questions from selection: {available_questions} "
+        f"(🟢 {available_by_diff['easy']} Easy · 🟡 {available_by_diff['medium']} Medium · 🔴 {available_by_diff['hard']} Hard)"
+    )
     
     # Difficulty distribution
     st.markdown("### ⚡ Difficulty Distribution")
@@ -625,16 +559,17 @@ def create_test_interface():
             st.info("💡 Biology questions may not be loaded yet. Run: `python insert_all_chapters.py`")
         return
     
-    # Show breakdown
+    # Show breakdown and check it against the availability matrix
+    feasibility = check_feasibility(availability, selected_concept_ids, total_questions, easy_pct, medium_pct)
     if total_questions > 0:
-        easy_count = round(total_questions * easy_pct / 100)
-        medium_count = round(total_questions * medium_pct / 100)
-        hard_count = total_questions - easy_count - medium_count
-        
-        st.info(f"📊 Question Breakdown: {easy_count} Easy + {medium_count} Medium + {hard_count} Hard = {total_questions} Total")
+        needed = feasibility["needed"]
+        st.info(f"📊 Question Breakdown: {needed['easy']} Easy + {needed['medium']} Medium + {needed['hard']} Hard = {total_questions} Total")
+        if total_pct == 100 and not feasibility["feasible"]:
+            shortages = ", ".join(f"{count} more {difficulty}" for difficulty, count in feasibility["short"].items())
+            st.error(f"❌ Not enough questions for this distribution (need {shortages}). Adjust the difficulty percentages or selection.")
     
     # Create test button
-    if st.button("🚀 Create Test", type="primary", disabled=(total_pct != 100 or not selected_concept_ids or not test_name)):
+    if st.button("🚀 Create Test", type="primary", disabled=(total_pct != 100 or not selected_concept_ids or not test_name or not feasibility["feasible"])):
         with st.spinner("Creating test..."):
             try:
                 admin_test_id = create_admin_test(
@@ -717,6 +652,7 @@ def manage_tests_interface():
                     if st.button(f"🚫 Deactivate", key=f"deactivate_{test_id}"):
                         cur.execute(f"UPDATE admin_tests SET is_active = {active_val} WHERE admin_test_id = {placeholder}", (test_id,))
                         conn.commit()
+                        invalidate_admin_test(test_id)
                         st.success("Test deactivated")
                         time.sleep(0.5)
                         st.rerun()
@@ -724,14 +660,14 @@ def manage_tests_interface():
                     if st.button(f"✅ Activate", key=f"activate_{test_id}"):
                         cur.execute(f"UPDATE admin_tests SET is_active = {inactive_val} WHERE admin_test_id = {placeholder}", (test_id,))
                         conn.commit()
+                        invalidate_admin_test(test_id)
                         st.success("Test activated")
                         time.sleep(0.5)
                         st.rerun()
                 
                 # Delete test
                 if st.button(f"🗑️ Delete", key=f"delete_{test_id}", type="secondary"):
-                    cur.execute(f"DELETE FROM admin_tests WHERE admin_test_id = {placeholder}", (test_id,))
-                    conn.commit()
+                    delete_admin_test(test_id)
                     st.warning("Test deleted")
                     time.sleep(0.5)
                     st.rerun()
@@ -789,7 +725,34 @@ def show_test_results(test_id, test_name, total_questions):
     if attempted:
         st.markdown("#### ✅ Students Who Attempted")
         
-        for user_id, username, attempt_id, score, percentage, attempted_at in attempted:
+        start, end = render_pagination(len(attempted), RESULTS_PAGE_SIZE, key=f"results_page_{test_id}")
+        page = attempted[start:end]
+        
+        # Weak chapters (<60%) of every attempt on this page - one grouped query
+        attempt_ids = [r[2] for r in page]
+        attempt_placeholders = ",".join([placeholder] * len(attempt_ids))
+        cur.execute(f"""
+            SELECT 
+                r.attempt_id,
+                ch.chapter_number,
+                COUNT(r.response_id) as total,
+                SUM(r.is_correct) as correct,
+                ROUND(AVG(r.is_correct) * 100, 1) as accuracy
+            FROM admin_test_responses r
+            JOIN questions q ON r.question_id = q.id
+            JOIN concepts c ON q.concept_id = c.id
+            JOIN chapters ch ON c.chapter_id = ch.id
+            WHERE r.attempt_id IN ({attempt_placeholders})
+            GROUP BY r.attempt_id, ch.chapter_number
+            HAVING AVG(r.is_correct) * 100 < 60
+            ORDER BY r.attempt_id, AVG(r.is_correct) ASC
+        """, tuple(attempt_ids))
+        
+        weak_by_attempt = {}
+        for attempt_id, ch_num, total, correct, acc in cur.fetchall():
+            weak_by_attempt.setdefault(attempt_id, []).append((ch_num, total, correct, acc))
+        
+        for user_id, username, attempt_id, score, percentage, attempted_at in page:
             # Use container with custom styling instead of expander
             emoji = '🌟' if percentage >= 80 else '✅' if percentage >= 60 else '⚠️'
             
@@ -805,23 +768,7 @@ def show_test_results(test_id, test_name, total_questions):
                 
                 with col2:
                     # Get weak concepts/chapters
-                    cur.execute(f"""
-                        SELECT 
-                            ch.chapter_number,
-                            COUNT(r.response_id) as total,
-                            SUM(r.is_correct) as correct,
-                            ROUND(AVG(r.is_correct) * 100, 1) as accuracy
-                        FROM admin_test_responses r
-                        JOIN questions q ON r.question_id = q.id
-                        JOIN concepts c ON q.concept_id = c.id
-                        JOIN chapters ch ON c.chapter_id = ch.id
-                        WHERE r.attempt_id = {placeholder}
-                        GROUP BY ch.chapter_number
-                        HAVING AVG(r.is_correct) * 100 < 60
-                        ORDER BY AVG(r.is_correct) ASC
-                    """, (attempt_id,))
-                    
-                    weak_chapters = cur.fetchall()
+                    weak_chapters = weak_by_attempt.get(attempt_id, [])
                     
                     if weak_chapters:
                         st.markdown("**⚠️ Needs Improvement:**")
@@ -868,16 +815,11 @@ def show_student_test_details(attempt_id, username, test_id, total_questions):
     
     results = cur.fetchall()
     
+    # Options of every question in one batched query
+    options_by_question = fetch_options_by_question(cur, [r[0] for r in results])
+    
     for qid, qtext, difficulty, selected_answer, is_correct, order in results:
-        # Get options for this question
-        cur.execute(f"""
-            SELECT label, option_text, is_correct
-            FROM mcq_options
-            WHERE question_id = {placeholder}
-            ORDER BY label
-        """, (qid,))
-        
-        options = cur.fetchall()
+        options = options_by_question[qid]
         
         # Display question with result
         result_emoji = "✅" if is_correct else "❌"
@@ -907,152 +849,224 @@ def show_student_test_details(attempt_id, username, test_id, total_questions):
 if "user" not in st.session_state:
     st.session_state.user = None
     st.session_state.page = "login"
-    st.session_state.test = None
+    st.session_state.test_ids = None
+    st.session_state.test_seed = None
     st.session_state.start_time = None
     st.session_state.answers = {}
     st.session_state.duration = None
     st.session_state.score = None
+    st.session_state.scored = None
+    st.session_state.submitted_at = None
 
 # ================= HELPERS =================
-def get_available_count(chapters, difficulties):
-    conn = get_connection()
-    cur = conn.cursor()
-    total = 0
-    
-    placeholder = get_placeholder()
-
-    for d in difficulties:
-        ch_p = ",".join([placeholder] * len(chapters))
-        cur.execute(
-            """
-            SELECT COUNT(*)
-            FROM questions q
-            JOIN concepts c ON q.concept_id=c.id
-            JOIN chapters ch ON c.chapter_id=ch.id
-            WHERE ch.chapter_number IN ({})
-              AND q.difficulty = {}
-            """.format(ch_p, placeholder),
-            (*chapters, d)
-        )
-        result = cur.fetchone()
-        total += result[0]
+def current_time_taken():
+    """Seconds from the start of the test to its submission (or now, if not submitted)"""
+    if not st.session_state.get("start_time"):
+        return 0
+    end = st.session_state.get("submitted_at") or time.time()
+    return int(end - st.session_state.start_time)
+
+def start_test(question_ids, test_type, duration_seconds, admin_test_id=None):
+    """
+    Start a test. The session keeps only the question ids and a shuffle seed;
+    the questions are rebuilt from the shared bank / paper cache when needed.
+    """
+    st.session_state.test_ids = array("l", question_ids)
+    st.session_state.test_seed = random.getrandbits(32)
+    st.session_state.test_type = test_type
+    if admin_test_id is not None:
+        st.session_state.admin_test_id = admin_test_id
+    st.session_state.start_time = time.time()
+    st.session_state.timer_final_sync = False
+    st.session_state.answers = {}
+    st.session_state.scored = None
+    st.session_state.submitted_at = None
+    st.session_state.current_page = 0
+    st.session_state.duration = duration_seconds
+    st.session_state.page = "test"
+
+def current_test():
+    """Question dicts of the running test, rebuilt deterministically from its ids and seed"""
+    if st.session_state.get("test_type") == "admin":
+        return get_admin_test_questions(st.session_state.admin_test_id, st.session_state.test_seed)
+    return questions_by_ids(st.session_state.test_ids, st.session_state.test_seed)
+
+def current_scores(test=None):
+    """
+    Scored arrays of the running test (scoring.score_test), computed once per
+    submission and kept in the session for the result page and PDF report.
+    """
+    scored = st.session_state.get("scored")
+    if scored is None:
+        if test is None:
+            test = current_test()
+        # Concepts of the questions actually scored - questions deleted from
+        # the bank since the test started are missing from `test`
+        scored = score_test(test, st.session_state.answers, question_concepts([q["id"] for q in test]))
+        st.session_state.scored = scored
+    return scored
 
-    conn.close()
-    return total
+def get_available_count(chapters, difficulties):
+    return count_questions_in_chapters(chapters, difficulties)
+
+def render_pagination(total_items, page_size, key):
+    """Page selector for long lists. Returns the (start, end) slice of the current page."""
+    pages = max(1, -(-total_items // page_size))
+    if pages == 1:
+        return 0, total_items
+    page = st.number_input(
+        f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1, key=key
+    )
+    start = (page - 1) * page_size
+    st.caption(f"Showing {start + 1}-{min(start + page_size, total_items)} of {total_items}")
+    return start, min(start + page_size, total_items)
 
 def show_students_list():
-    """Display list of all students with their info"""
+    """Display a searchable, paginated list of students with their info"""
     st.subheader("👥 Registered Students")
-    
-    conn = get_connection()
-    cur = conn.cursor()
-    placeholder = get_placeholder()
-    
+
+    search = st.text_input(
+        "🔍 Search students",
+        key="student_search",
+        placeholder="Username, phone number or school (starts with...)"
+    ).strip()
+
+    # Keyset cursors of the pages visited so far; reset when the search changes
+    if st.session_state.get("student_search_applied") != search:
+        st.session_state.student_search_applied = search
+        st.session_state.student_page_cursors = [None]
+        st.session_state.selected_students = {}
+    cursors = st.session_state.student_page_cursors
+    selected = st.session_state.selected_students
+
     try:
-        cur.execute(f"""
-            SELECT id, username, phone_number, school_name, class_name, board_name, recovery_code, created_at 
-            FROM users 
-            WHERE role = {placeholder}
-            ORDER BY created_at DESC
-        """, ('student',))
-        students = cur.fetchall()
-        
-        if not students:
-            st.info("No students registered yet.")
-            return
-        
-        st.success(f"Total Students: {len(students)}")
-        
-        # Display as detailed cards
-        st.markdown("---")
-        for student_id, username, phone, school, class_name, board, recovery_code, created_at in students:
-            col1, col2, col3 = st.columns([3, 2, 1])
-            with col1:
-                st.write(f"**👤 {username}**")
-                st.caption(f"🏫 {school or 'N/A'} | 📚 Class {class_name or 'N/A'} | 📋 {board or 'N/A'}")
-            with col2:
-                st.write(f"📱 {phone}")
-                st.write(f"🔑 Recovery: `{recovery_code or 'N/A'}`")
-                if created_at:
-                    st.caption(f"📅 Registered: {format_timestamp(created_at)}")
-            with col3:
-                if st.button("🗑️ Delete", key=f"delete_student_{student_id}", type="secondary"):
-                    st.session_state[f'confirm_delete_{student_id}'] = True
-                    st.rerun()
-            
-            # Show confirmation dialog if delete was clicked
-            if st.session_state.get(f'confirm_delete_{student_id}', False):
-                with st.container():
-                    st.warning(f"⚠️ Are you sure you want to delete **{username}**? This will permanently remove:")
-                    st.markdown("""
-                    - Their account and login credentials
-                    - All test attempts and results
-                    - All test responses
-                    - This action CANNOT be undone!
-                    """)
-                    
-                    col_yes, col_no = st.columns(2)
-                    with col_yes:
-                        if st.button("✅ Yes, Delete Permanently", key=f"confirm_yes_{student_id}", type="primary"):
-                            delete_student(student_id, username)
-                            del st.session_state[f'confirm_delete_{student_id}']
-                            st.rerun()
-                    with col_no:
-                        if st.button("❌ No, Cancel", key=f"confirm_no_{student_id}"):
-                            del st.session_state[f'confirm_delete_{student_id}']
-                            st.rerun()
-            
-            st.divider()
-    
+        total = count_students(search)
+        students, next_cursor = list_students(search, after=cursors[-1], limit=STUDENTS_PAGE_SIZE)
     except Exception as e:
         st.error(f"Error loading students: {str(e)}")
-    finally:
-        conn.close()
+        return
 
-def delete_student(student_id, username):
-    """Delete a student and all their associated data"""
-    conn = get_connection()
-    cur = conn.cursor()
-    placeholder = get_placeholder()
-    
+    if not students:
+        st.info("No students match your search." if search else "No students registered yet.")
+        return
+
+    first = (len(cursors) - 1) * STUDENTS_PAGE_SIZE
+    st.success(f"{'Matching' if search else 'Total'} Students: {total}")
+    st.caption(f"Showing {first + 1}-{first + len(students)} of {total}")
+
+    # Bulk delete of the students ticked on any page
+    if selected:
+        st.warning(f"☑️ {len(selected)} student(s) selected")
+        col_bulk, col_clear = st.columns(2)
+        with col_bulk:
+            if st.button(f"🗑️ Delete {len(selected)} Selected", key="bulk_delete_students", type="secondary"):
+                st.session_state.confirm_bulk_delete = True
+                st.rerun()
+        with col_clear:
+            if st.button("✖️ Clear Selection", key="clear_student_selection"):
+                unselect_students(list(selected))
+                st.rerun()
+
+        if st.session_state.get("confirm_bulk_delete", False):
+            st.warning(f"⚠️ Are you sure you want to delete **{len(selected)}** students? "
+                       "This will permanently remove their accounts, test attempts and responses. "
+                       "This action CANNOT be undone!")
+            col_yes, col_no = st.columns(2)
+            with col_yes:
+                if st.button("✅ Yes, Delete All Selected", key="confirm_bulk_yes", type="primary"):
+                    delete_students_with_feedback(list(selected), f"{len(selected)} students")
+                    st.session_state.confirm_bulk_delete = False
+                    st.rerun()
+            with col_no:
+                if st.button("❌ No, Cancel", key="confirm_bulk_no"):
+                    st.session_state.confirm_bulk_delete = False
+                    st.rerun()
+
+    # Display as detailed cards
+    st.markdown("---")
+    for student_id, username, phone, school, class_name, board, recovery_code, created_at in students:
+        col0, col1, col2, col3 = st.columns([0.5, 3, 2, 1])
+        with col0:
+            st.checkbox("Select", value=student_id in selected, key=f"select_student_{student_id}",
+                        label_visibility="collapsed", on_change=toggle_student_selection, args=(student_id, username))
+        with col1:
+            st.write(f"**👤 {username}**")
+            st.caption(f"🏫 {school or 'N/A'} | 📚 Class {class_name or 'N/A'} | 📋 {board or 'N/A'}")
+        with col2:
+            st.write(f"📱 {phone}")
+            st.write(f"🔑 Recovery: `{recovery_code or 'N/A'}`")
+            if created_at:
+                st.caption(f"📅 Registered: {format_timestamp(created_at)}")
+        with col3:
+            if st.button("🗑️ Delete", key=f"delete_student_{student_id}", type="secondary"):
+                st.session_state[f'confirm_delete_{student_id}'] = True
+                st.rerun()
+
+        # Show confirmation dialog if delete was clicked
+        if st.session_state.get(f'confirm_delete_{student_id}', False):
+            with st.container():
+                st.warning(f"⚠️ Are you sure you want to delete **{username}**? This will permanently remove:")
+                st.markdown("""
+                - Their account and login credentials
+                - All test attempts and results
+                - All test responses
+                - This action CANNOT be undone!
+                """)
+
+                col_yes, col_no = st.columns(2)
+                with col_yes:
+                    if st.button("✅ Yes, Delete Permanently", key=f"confirm_yes_{student_id}", type="primary"):
+                        delete_student(student_id, username)
+                        del st.session_state[f'confirm_delete_{student_id}']
+                        st.rerun()
+                with col_no:
+                    if st.button("❌ No, Cancel", key=f"confirm_no_{student_id}"):
+                        del st.session_state[f'confirm_delete_{student_id}']
+                        st.rerun()
+
+        st.divider()
+
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if st.button("⬅️ Previous", key="students_prev", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+    with col_page:
+        st.caption(f"Page {len(cursors)} of {max(1, -(-total // STUDENTS_PAGE_SIZE))}")
+    with col_next:
+        if st.button("Next ➡️", key="students_next", disabled=next_cursor is None):
+            cursors.append(next_cursor)
+            st.rerun()
+
+def toggle_student_selection(student_id, username):
+    """Checkbox callback - runs before the rerun, so the bulk actions see the new selection"""
+    if st.session_state.get(f"select_student_{student_id}"):
+        st.session_state.selected_students[student_id] = username
+    else:
+        st.session_state.selected_students.pop(student_id, None)
+
+def unselect_students(student_ids):
+    """Drop students from the bulk selection (and untick their checkboxes)"""
+    selected = st.session_state.get("selected_students", {})
+    for student_id in student_ids:
+        selected.pop(student_id, None)
+        st.session_state.pop(f"select_student_{student_id}", None)
+
+def delete_students_with_feedback(student_ids, label):
+    """Delete students and all their data, reporting the outcome in the UI"""
     try:
-        # Delete from users table (CASCADE should handle related records)
-        # But we'll explicitly delete to be safe
-        
-        # Delete test responses (custom tests)
-        cur.execute(f"""
-            DELETE FROM responses 
-            WHERE attempt_id IN (
-                SELECT id FROM test_attempts WHERE student_id = {placeholder}
-            )
-        """, (student_id,))
-        
-        # Delete test attempts (custom tests)
-        cur.execute(f"DELETE FROM test_attempts WHERE student_id = {placeholder}", (student_id,))
-        
-        # Delete admin test responses
-        cur.execute(f"""
-            DELETE FROM admin_test_responses 
-            WHERE attempt_id IN (
-                SELECT attempt_id FROM admin_test_attempts WHERE user_id = {placeholder}
-            )
-        """, (student_id,))
-        
-        # Delete admin test attempts
-        cur.execute(f"DELETE FROM admin_test_attempts WHERE user_id = {placeholder}", (student_id,))
-        
-        # Finally, delete the user account
-        cur.execute(f"DELETE FROM users WHERE id = {placeholder}", (student_id,))
-        
-        conn.commit()
-        st.success(f"✅ Successfully deleted student **{username}** and all their data!")
-        time.sleep(2)
-        
+        deleted = delete_students(student_ids)
     except Exception as e:
-        conn.rollback()
         st.error(f"❌ Error deleting student: {str(e)}")
-    finally:
-        conn.close()
+        return
+    unselect_students(student_ids)
+    if deleted:
+        st.success(f"✅ Successfully deleted **{label}** and all their data!")
+        time.sleep(2)
+
+def delete_student(student_id, username):
+    """Delete a student and all their associated data"""
+    delete_students_with_feedback([student_id], f"student {username}")
 
 def admin_settings():
     """Admin settings page for changing credentials"""
@@ -1096,6 +1110,136 @@ def admin_settings():
                 st.session_state.clear()
                 st.session_state.page = "login"
                 st.rerun()
+    
+    st.markdown("---")
+    st.markdown("### 🔌 Database Connection Pool")
+    pool_stats = get_pool_stats()
+    if pool_stats is None:
+        st.caption("Connection pooling is only used with PostgreSQL (SQLite connections are local).")
+    else:
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("In Use / Size", f"{pool_stats['in_use']}/{pool_stats['size']}", f"max {pool_stats['max_size']}")
+        col2.metric("Hit Rate", f"{pool_stats['hit_rate'] * 100:.1f}%", f"{pool_stats['hits']} hits / {pool_stats['misses']} misses")
+        col3.metric("Waits", pool_stats['waits'], f"max {pool_stats['wait_time_max']:.2f}s")
+        col4.metric("Timeouts", pool_stats['timeouts'])
+        with st.expander("Raw pool metrics"):
+            st.json(pool_stats)
+    statement_stats = get_statement_stats()
+    st.caption(
+        f"Registered statements: {statement_stats['registered']} | compiled: {statement_stats['compiled']} | "
+        f"prepared on server: {statement_stats['prepared']} | executions: {statement_stats['executions']}"
+    )
+    
+    st.markdown("### 🐢 Query Timing")
+    if not query_stats.ENABLED:
+        st.caption("Query instrumentation is disabled (QUERY_STATS=false).")
+    else:
+        st.caption(f"Statements slower than {query_stats.SLOW_QUERY_MS:.0f} ms are logged (SLOW_QUERY_MS).")
+        page_summary = query_stats.render_summary()
+        if page_summary:
+            st.dataframe([
+                {"Page": page, "Renders": stats['renders'], "Avg Queries": stats['avg_queries'],
+                 "Max Queries": stats['max_queries'], "Avg DB ms": stats['avg_db_ms'], "Max DB ms": stats['max_db_ms']}
+                for page, stats in page_summary.items()
+            ], use_container_width=True)
+        sort_by = st.selectbox(
+            "Rank statements by", ["total_s", "max_s", "calls", "rows"],
+            format_func=lambda key: {"total_s": "Total time", "max_s": "Slowest call", "calls": "Calls", "rows": "Rows"}[key],
+            key="query_report_sort"
+        )
+        statement_report = query_stats.report(limit=25, sort=sort_by)
+        if statement_report:
+            st.dataframe([
+                {"Statement": row['fingerprint'][:200], "Calls": row['calls'], "Total ms": row['total_ms'],
+                 "Avg ms": row['avg_ms'], "Max ms": row['max_ms'], "Rows": row['rows'],
+                 "Call sites": ", ".join(row['call_sites'])}
+                for row in statement_report
+            ], use_container_width=True)
+        slow = query_stats.slow_queries()
+        if slow:
+            with st.expander(f"Recent slow queries ({len(slow)})"):
+                st.dataframe(slow, use_container_width=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button(
+                "⬇️ Download query report (JSON)",
+                data=json.dumps({
+                    "statements": query_stats.report(limit=100, sort=sort_by),
+                    "pages": page_summary,
+                    "slow_queries": slow
+                }, indent=2),
+                file_name="query_report.json",
+                mime="application/json",
+                key="download_query_report"
+            )
+        with col2:
+            if st.button("🧹 Reset query statistics", key="reset_query_stats_btn"):
+                query_stats.reset()
+                st.rerun()
+    
+    st.markdown("### 📨 Submission Queue")
+    queue_stats = get_submission_queue_stats()
+    if queue_stats is None:
+        st.caption("Write-behind is disabled (WRITE_BEHIND=false) - submissions are saved synchronously.")
+    else:
+        col1, col2, col3, col4, col5 = st.columns(5)
+        col1.metric("Pending", queue_stats['pending'])
+        col2.metric("Flushed", queue_stats['flushed'], f"{queue_stats['batches']} batches")
+        col3.metric("Failures", queue_stats['failures'])
+        col4.metric("Dead-lettered", queue_stats['dead'])
+        col5.metric("Worker", "🟢 Running" if queue_stats['worker_alive'] else "🔴 Stopped")
+        if queue_stats['last_error']:
+            st.caption(f"Last error: {queue_stats['last_error']}")
+        if queue_stats['dead']:
+            with st.expander(f"☠️ Dead-lettered submissions ({queue_stats['dead']})", expanded=False):
+                st.caption("These kept failing with a permanent error (e.g. a deleted user) and are not saved yet. "
+                           "Fix the cause, then requeue them - they are kept in the journal until then.")
+                st.dataframe([
+                    {"Submission": row['submission_id'], "Kind": row['kind'], "User": row['user_id'],
+                     "Admin Test": row['admin_test_id'], "Attempts": row['attempts'], "Error": row['last_error'],
+                     "Failed At": datetime.fromtimestamp(row['failed_at']).strftime('%Y-%m-%d %H:%M:%S')}
+                    for row in get_dead_submissions()
+                ], use_container_width=True)
+                if st.button("🔁 Requeue all", key="requeue_dead_btn"):
+                    requeued = requeue_dead_submissions()
+                    st.success(f"✅ {requeued} submission(s) queued for another try")
+                    st.rerun()
+    
+    st.markdown("### 🧠 Question Bank Index")
+    bank = get_question_bank()
+    bank_stats = bank.stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Questions", bank_stats['questions'])
+    col2.metric("Options", bank_stats['options'])
+    col3.metric("Pools", bank_stats['pools'])
+    col4.metric("Memory", f"{bank_stats['memory_bytes'] / (1024 * 1024):.2f} MB", f"v{bank_stats['generation']}")
+    with st.expander("Memory footprint by component"):
+        st.json(bank.memory_footprint())
+    
+    st.markdown("### 🗃️ Reference Data Caches")
+    cache_stats = get_cache_stats()
+    if cache_stats:
+        st.dataframe([
+            {
+                "Cache": name,
+                "Entries": stats['entries'],
+                "Hits": stats['hits'],
+                "Misses": stats['misses'],
+                "Hit Rate": f"{stats['hit_rate'] * 100:.1f}%",
+                "TTL (s)": stats['ttl']
+            }
+            for name, stats in cache_stats.items()
+        ], use_container_width=True)
+    if st.button("🧹 Clear reference caches", key="clear_reference_caches_btn"):
+        invalidate_reference_data()
+        st.success("✅ Caches cleared - data will be reloaded on next use")
+    
+    st.markdown("### 📊 Analytics Rollups")
+    st.caption("The statistics dashboard reads precomputed rollups that are updated on every submission.")
+    if st.button("🔄 Rebuild analytics rollups", key="rebuild_rollups_btn"):
+        with st.spinner("Rebuilding rollups from all test data..."):
+            rebuild_rollups()
+        st.success("✅ Rollups rebuilt")
 
 def logout():
     st.session_state.clear()
@@ -1380,6 +1524,10 @@ def show_student_history():
         # Sort by timestamp descending
         all_results.sort(key=lambda x: x['timestamp'], reverse=True)
         
+        pending = pending_submission_count(user_id)
+        if pending:
+            st.info(f"⏳ {pending} recent submission(s) are still being saved and will appear here shortly.")
+        
         if not all_results:
             st.info("📭 No test history yet. Take a test to see your results here!")
             return
@@ -1437,107 +1585,130 @@ def show_student_history():
         conn.close()
 
 
-def show_history_test_details(attempt_id, test_type):
-    """Show detailed Q&A review for a past test attempt"""
-    st.subheader("📖 Test Review")
+# Saved attempts never change, so their assembled reviews can be cached indefinitely
+_review_cache = get_cache("attempt_review", ttl=float(os.getenv("REVIEW_CACHE_TTL", "3600")), max_entries=256)
+
+REVIEW_PAGE_SIZE = int(os.getenv("REVIEW_PAGE_SIZE", "10"))
+
+DIFFICULTY_BADGES = {
+    "easy": ("🟢 Easy", "#90EE90"),
+    "medium": ("🟡 Medium", "#FFE4A0"),
+    "hard": ("🔴 Hard", "#FFB6C6"),
+}
+
+
+def load_attempt_review(attempt_id, test_type):
+    """
+    All questions of an attempt with the student's answers and every option,
+    in one query.
     
+    Returns:
+        list of dicts: text, selected, is_correct, difficulty, options [(label, text, is_correct)]
+    """
     conn = get_connection()
     cursor = conn.cursor()
     placeholder = get_placeholder()
     
+    if test_type == 'custom':
+        response_table, id_column, answer_column = "responses", "id", "selected_label"
+    else:
+        response_table, id_column, answer_column = "admin_test_responses", "response_id", "selected_answer"
+    
     try:
-        if test_type == 'custom':
-            # Get custom test responses
-            query = f"""
-                SELECT 
-                    q.question_text,
-                    r.selected_label, r.is_correct, q.difficulty, q.id
-                FROM responses r
-                JOIN questions q ON r.question_id = q.id
-                WHERE r.attempt_id = {placeholder}
-                ORDER BY r.id
-            """
+        cursor.execute(f"""
+            SELECT 
+                r.{id_column}, q.question_text,
+                r.{answer_column}, r.is_correct, q.difficulty,
+                o.label, o.option_text, o.is_correct
+            FROM {response_table} r
+            JOIN questions q ON r.question_id = q.id
+            LEFT JOIN mcq_options o ON o.question_id = q.id
+            WHERE r.attempt_id = {placeholder}
+            ORDER BY r.{id_column}, o.label
+        """, (attempt_id,))
+        rows = cursor.fetchall()
+    finally:
+        conn.close()
+    
+    review = []
+    current_response = None
+    for response_id, question_text, selected, is_correct, difficulty, label, option_text, is_correct_opt in rows:
+        if response_id != current_response:
+            current_response = response_id
+            review.append({
+                "text": question_text,
+                "selected": selected,
+                "is_correct": bool(is_correct),
+                "difficulty": difficulty,
+                "options": []
+            })
+        if label is not None:
+            review[-1]["options"].append((label, option_text, is_correct_opt))
+    return review
+
+
+def get_attempt_review(attempt_id, test_type):
+    """Cached load_attempt_review"""
+    return _review_cache.get_or_load((test_type, attempt_id), lambda: load_attempt_review(attempt_id, test_type))
+
+
+def render_review_question(number, item):
+    """One reviewed question (header + options) as a single markdown block"""
+    badge, badge_color = DIFFICULTY_BADGES.get(item["difficulty"], DIFFICULTY_BADGES["medium"])
+    result_emoji, border_color = ("✅", "#90EE90") if item["is_correct"] else ("❌", "#FFB6C6")
+    correct_answer = next((opt[0] for opt in item["options"] if opt[2] == 1), None)
+    
+    option_lines = []
+    for label, option_text, _ in item["options"]:
+        option_text = html.escape(option_text or "")
+        if label == correct_answer:
+            option_lines.append(
+                f'<div style="background-color: #E6F4EA; padding: 6px 10px; border-radius: 6px; margin: 4px 0;">'
+                f'<b>{label}. {option_text}</b> ✓ (Correct Answer)</div>'
+            )
+        elif label == item["selected"] and not item["is_correct"]:
+            option_lines.append(
+                f'<div style="background-color: #FDECEA; padding: 6px 10px; border-radius: 6px; margin: 4px 0;">'
+                f'<b>{label}. {option_text}</b> ✗ (Your Answer)</div>'
+            )
         else:
-            # Get admin test responses
-            query = f"""
-                SELECT 
-                    q.question_text,
-                    atr.selected_answer, atr.is_correct, q.difficulty, q.id
-                FROM admin_test_responses atr
-                JOIN questions q ON atr.question_id = q.id
-                WHERE atr.attempt_id = {placeholder}
-                ORDER BY atr.response_id
-            """
-        
-        cursor.execute(query, (attempt_id,))
-        responses = cursor.fetchall()
-        
-        correct_count = sum(1 for r in responses if r[2])
-        total = len(responses)
-        
-        st.info(f"Score: {correct_count}/{total} ({(correct_count/total)*100:.1f}%)")
-        
-        for i, r in enumerate(responses, 1):
-            question_text, selected, is_correct, difficulty, question_id = r
-            
-            # Get options for this question
-            option_query = f"""
-                SELECT label, option_text, is_correct
-                FROM mcq_options
-                WHERE question_id = {placeholder}
-                ORDER BY label
-            """
-            cursor.execute(option_query, (question_id,))
-            options = cursor.fetchall()
-            
-            # Find correct answer
-            correct_answer = next((opt[0] for opt in options if opt[2] == 1), None)
-            
-            # Show difficulty badge
-            if difficulty == 'easy':
-                badge = "🟢 Easy"
-                badge_color = "#90EE90"
-            elif difficulty == 'hard':
-                badge = "🔴 Hard"
-                badge_color = "#FFB6C6"
-            else:
-                badge = "🟡 Medium"
-                badge_color = "#FFE4A0"
-            
-            # Color based on correctness
-            if is_correct:
-                result_emoji = "✅"
-                border_color = "#90EE90"
-            else:
-                result_emoji = "❌"
-                border_color = "#FFB6C6"
-            
-            with st.container():
-                st.markdown(f"""
-                <div style="border-left: 4px solid {border_color}; padding-left: 15px; margin-bottom: 20px;">
-                    <div style="display: flex; align-items: center; gap: 10px; margin-bottom: 10px;">
-                        <span style="background-color: {badge_color}; padding: 3px 10px; border-radius: 12px; font-size: 12px; font-weight: bold;">{badge}</span>
-                        <span style="font-size: 20px;">{result_emoji}</span>
-                    </div>
-                    <p style="font-size: 16px; font-weight: bold; margin: 10px 0;">Q{i}. {question_text}</p>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                for opt in options:
-                    label, option_text, is_correct_opt = opt
-                    if label == correct_answer:
-                        st.success(f"**{label}. {option_text}** ✓ (Correct Answer)")
-                    elif label == selected and not is_correct:
-                        st.error(f"**{label}. {option_text}** ✗ (Your Answer)")
-                    else:
-                        st.write(f"{label}. {option_text}")
-                
-                st.divider()
+            option_lines.append(f'<div style="padding: 6px 10px; margin: 4px 0;">{label}. {option_text}</div>')
     
+    st.markdown(f"""
+    <div style="border-left: 4px solid {border_color}; padding-left: 15px; margin-bottom: 20px;">
+        <div style="display: flex; align-items: center; gap: 10px; margin-bottom: 10px;">
+            <span style="background-color: {badge_color}; padding: 3px 10px; border-radius: 12px; font-size: 12px; font-weight: bold;">{badge}</span>
+            <span style="font-size: 20px;">{result_emoji}</span>
+        </div>
+        <p style="font-size: 16px; font-weight: bold; margin: 10px 0;">Q{number}. {html.escape(item["text"] or "")}</p>
+        {"".join(option_lines)}
+    </div>
+    <hr>
+    """, unsafe_allow_html=True)
+
+
+def show_history_test_details(attempt_id, test_type):
+    """Show detailed Q&A review for a past test attempt"""
+    st.subheader("📖 Test Review")
+    
+    try:
+        review = get_attempt_review(attempt_id, test_type)
     except Exception as e:
         st.error(f"Error loading test details: {str(e)}")
-    finally:
-        conn.close()
+        return
+    
+    correct_count = sum(1 for item in review if item["is_correct"])
+    total = len(review)
+    
+    if total == 0:
+        st.info("No answers were recorded for this attempt.")
+        return
+    
+    st.info(f"Score: {correct_count}/{total} ({(correct_count/total)*100:.1f}%)")
+    
+    start, end = render_pagination(total, REVIEW_PAGE_SIZE, key=f"review_page_{test_type}_{attempt_id}")
+    for i in range(start, end):
+        render_review_question(i + 1, review[i])
 
 
 # ================= SETUP =================
@@ -1601,6 +1772,7 @@ def student_profile_page():
                                   index=["ICSE", "CBSE", "State Board", "Other"].index(board) if board in ["ICSE", "CBSE", "State Board", "Other"] else 0)
         
         if st.form_submit_button("💾 Update Profile", type="primary"):
+            ensure_leaderboard_table()
             conn = get_connection()
             cur = conn.cursor()
             
@@ -1610,6 +1782,7 @@ def student_profile_page():
                     SET school_name = {placeholder}, class_name = {placeholder}, board_name = {placeholder}
                     WHERE id = {placeholder}
                 """, (new_school, new_class, new_board, user_id))
+                update_board(cur, user_id, new_board)
                 
                 conn.commit()
                 conn.close()
@@ -1639,66 +1812,8 @@ def leaderboard_page():
     with col2:
         st.caption("📊 Rankings based on: Accuracy, Tests Attempted, and Difficulty Level")
     
-    conn = get_connection()
-    cur = conn.cursor()
-    placeholder = get_placeholder()
-    
     try:
-        # Build query based on filter
-        if board_filter == "All Boards":
-            board_condition = ""
-            board_params = ()
-        else:
-            board_condition = f"AND u.board_name = {placeholder}"
-            board_params = (board_filter,)
-        
-        # Get leaderboard data
-        query = f"""
-            WITH user_stats AS (
-                SELECT 
-                    u.id,
-                    u.username,
-                    u.school_name,
-                    u.class_name,
-                    u.board_name,
-                    COUNT(DISTINCT ta.id) as custom_tests,
-                    COUNT(DISTINCT ata.attempt_id) as admin_tests,
-                    COALESCE(SUM(ta.score), 0) as custom_score,
-                    COALESCE(SUM(ta.total_questions), 0) as custom_total,
-                    COALESCE(SUM(ata.score), 0) as admin_score,
-                    COALESCE(SUM(ata.total_questions), 0) as admin_total,
-                    COUNT(DISTINCT CASE WHEN q.difficulty = 'hard' AND r.is_correct = 1 THEN r.id END) as hard_correct
-                FROM users u
-                LEFT JOIN test_attempts ta ON u.id = ta.student_id
-                LEFT JOIN admin_test_attempts ata ON u.id = ata.user_id
-                LEFT JOIN responses r ON ta.id = r.attempt_id
-                LEFT JOIN questions q ON r.question_id = q.id
-                WHERE u.role = 'student' {board_condition}
-                GROUP BY u.id, u.username, u.school_name, u.class_name, u.board_name
-            )
-            SELECT 
-                username,
-                school_name,
-                class_name,
-                board_name,
-                (custom_tests + admin_tests) as total_tests,
-                ROUND(
-                    CASE 
-                        WHEN (custom_total + admin_total) > 0 
-                        THEN ((custom_score + admin_score) * 100.0 / (custom_total + admin_total))
-                        ELSE 0 
-                    END, 2
-                ) as overall_accuracy,
-                hard_correct
-            FROM user_stats
-            WHERE (custom_tests + admin_tests) > 0
-            ORDER BY hard_correct DESC, overall_accuracy DESC, total_tests DESC
-            LIMIT 50
-        """
-        
-        cur.execute(query, board_params)
-        results = cur.fetchall()
-        conn.close()
+        results = get_leaderboard(None if board_filter == "All Boards" else board_filter, limit=50)
         
         if not results:
             st.info("No test data available yet. Be the first to take a test!")
@@ -1743,7 +1858,6 @@ def leaderboard_page():
     
     except Exception as e:
         st.error(f"❌ Error loading leaderboard: {e}")
-        conn.close()
 
 
 def setup_page():
@@ -1822,6 +1936,7 @@ def check_and_prompt_profile_completion():
                     st.error("❌ Please fill in all fields")
                 else:
                     # Update profile
+                    ensure_leaderboard_table()
                     conn = get_connection()
                     cur = conn.cursor()
                     
@@ -1830,6 +1945,7 @@ def check_and_prompt_profile_completion():
                         SET school_name = {placeholder}, class_name = {placeholder}, board_name = {placeholder}
                         WHERE id = {placeholder}
                     """, (school, class_name, board, user_id))
+                    update_board(cur, user_id, board)
                     
                     conn.commit()
                     conn.close()
@@ -1892,21 +2008,15 @@ def custom_test_setup():
         st.info("📚 Please select at least one concept to create a test")
         return
 
-    # Get available questions for selected concepts
-    conn = get_connection()
-    cur = conn.cursor()
-    placeholder = get_placeholder()
-    concept_placeholders = ",".join([placeholder] * len(selected_concept_ids))
+    # Get available questions for selected concepts (from the in-memory availability matrix)
+    availability = get_availability_matrix(subject)
+    available_by_diff = available_by_difficulty(availability, selected_concept_ids)
+    available = sum(available_by_diff.values())
     
-    cur.execute(f"""
-        SELECT COUNT(*)
-        FROM questions
-        WHERE concept_id IN ({concept_placeholders})
-    """, tuple(selected_concept_ids))
-    available = cur.fetchone()[0]
-    conn.close()
-    
-    st.info(f"Available questions: {available}")
+    st.info(
+        f"Available questions: {available} "
+        f"(🟢 {available_by_diff['easy']} Easy · 🟡 {available_by_diff['medium']} Medium · 🔴 {available_by_diff['hard']} Hard)"
+    )
 
     if available == 0:
         st.warning("No questions available for selected concepts")
@@ -1953,14 +2063,17 @@ def custom_test_setup():
     # Show breakdown
     st.success(f"✅ Distribution: {easy_pct}% Easy, {medium_pct}% Medium, {hard_pct}% Hard")
     
-    easy_count = round(total * easy_pct / 100)
-    medium_count = round(total * medium_pct / 100)
-    hard_count = total - easy_count - medium_count
+    feasibility = check_feasibility(availability, selected_concept_ids, total, easy_pct, medium_pct)
+    needed = feasibility["needed"]
     
-    st.info(f"📊 Your test will have: {easy_count} Easy + {medium_count} Medium + {hard_count} Hard = {total} Total")
+    st.info(f"📊 Your test will have: {needed['easy']} Easy + {needed['medium']} Medium + {needed['hard']} Hard = {total} Total")
 
     # Validation warnings
     can_start = True
+    if not feasibility["feasible"]:
+        shortages = ", ".join(f"{count} more {difficulty}" for difficulty, count in feasibility["short"].items())
+        st.error(f"❌ Not enough questions for this distribution (need {shortages}). Select more concepts or change the mix.")
+        can_start = False
     if total_pct != 100:
         st.error(f"❌ Total percentage must equal 100% (currently {total_pct}%)")
         can_start = False
@@ -1982,12 +2095,7 @@ def custom_test_setup():
             st.error("Not enough questions available with the required difficulty distribution.")
             return
 
-        st.session_state.test = questions
-        st.session_state.test_type = "custom"  # Track test type
-        st.session_state.start_time = time.time()
-        st.session_state.answers = {}
-        st.session_state.duration = duration * 60
-        st.session_state.page = "test"
+        start_test([q["id"] for q in questions], "custom", duration * 60)
         st.rerun()
 
 
@@ -1996,41 +2104,26 @@ def admin_test_selection():
     st.subheader("📋 Available Admin Tests")
     st.markdown("Take tests created by your instructors")
     
-    tests = get_available_admin_tests()
+    user_id = st.session_state.user['id']
+    tests = get_student_test_catalog(user_id)
     
     if not tests:
         st.info("No tests available at the moment. Check back later!")
         return
     
+    # Submissions still waiting in the write-behind queue count as attempts
+    pending = pending_admin_submissions(user_id)
+    
     # Display available tests
     for test in tests:
-        test_id, name, total_q, duration, easy, med, hard, creator, created_at = test
+        test_id, name, total_q, duration, easy, med, hard, creator, created_at, allow_retake, attempts_count = test
+        attempts_count += pending.get(test_id, 0)
         
         with st.expander(f"📝 {name}"):
             st.markdown(f"**Questions:** {total_q} | **Duration:** {duration} minutes")
             st.markdown(f"**Difficulty:** 🟢 {easy}% Easy, 🟡 {med}% Medium, 🔴 {hard}% Hard")
             st.markdown(f"**Created by:** {creator} on {format_timestamp(created_at)}")
             
-            # Check if student has already attempted and if retakes are allowed
-            conn = get_connection()
-            cur = conn.cursor()
-            placeholder = get_placeholder()
-            
-            # Get test settings
-            cur.execute(f"""
-                SELECT allow_retake FROM admin_tests
-                WHERE admin_test_id = {placeholder}
-            """, (test_id,))
-            allow_retake = cur.fetchone()[0] if cur.rowcount > 0 else False
-            
-            # Get attempt count
-            cur.execute(f"""
-                SELECT COUNT(*) FROM admin_test_attempts
-                WHERE admin_test_id = {placeholder} AND user_id = {placeholder}
-            """, (test_id, st.session_state.user['id']))
-            attempts_count = cur.fetchone()[0]
-            conn.close()
-            
             col1, col2 = st.columns([3, 1])
             with col1:
                 if attempts_count > 0:
@@ -2042,16 +2135,9 @@ def admin_test_selection():
                 # Show button only if no attempts OR retakes are allowed
                 if attempts_count == 0 or allow_retake:
                     if st.button(f"Start Test", key=f"start_admin_test_{test_id}", type="primary"):
-                        # Load admin test
-                        questions = get_admin_test_questions(test_id)
-                        
-                        st.session_state.test = questions
-                        st.session_state.test_type = "admin"  # Track test type
-                        st.session_state.admin_test_id = test_id  # Store admin test ID
-                        st.session_state.start_time = time.time()
-                        st.session_state.answers = {}
-                        st.session_state.duration = duration * 60
-                        st.session_state.page = "test"
+                        # Load admin test (from the shared paper cache)
+                        paper = get_admin_test_paper(test_id)
+                        start_test(paper["ids"], "admin", duration * 60, admin_test_id=test_id)
                         st.rerun()
                 else:
                     st.caption("🚫 Already completed")
@@ -2061,20 +2147,81 @@ def admin_test_selection():
 # Keeping this comment for reference - old setup_page() moved to custom_test_setup()
 
 # ================= TEST =================
+def get_remaining_test_time():
+    """Seconds left in the current test (unrounded) - the server-side clock is authoritative"""
+    return st.session_state.duration - (time.time() - st.session_state.start_time)
+
+
+def render_client_countdown(remaining):
+    """Countdown that ticks in the browser, so no server rerun is needed per second"""
+    seconds_left = math.ceil(remaining)
+    components.html(f"""
+        <div id="countdown" style="background-color: rgba(255, 227, 18, 0.1); color: rgb(146, 108, 5);
+                    border-radius: 0.5rem; padding: 16px; font-family: 'Source Sans Pro', sans-serif;
+                    font-size: 16px;">
+            ⏳ Time left: {seconds_left // 60}:{seconds_left % 60:02d}
+        </div>
+        <script>
+            const deadline = Date.now() + {remaining * 1000:.0f};
+            const box = document.getElementById("countdown");
+            function tick() {{
+                const left = Math.max(0, Math.ceil((deadline - Date.now()) / 1000));
+                const mins = Math.floor(left / 60);
+                const secs = String(left % 60).padStart(2, "0");
+                box.textContent = left > 0 ? `⏳ Time left: ${{mins}}:${{secs}}` : "⏳ Time's up - submitting...";
+            }}
+            tick();
+            setInterval(tick, 1000);
+        </script>
+    """, height=70)
+
+
+def test_timer_fragment():
+    """
+    Re-syncs the client countdown with the server clock. Runs as a fragment,
+    so its periodic reruns do not re-execute the rest of the test page.
+    """
+    remaining = get_remaining_test_time()
+    # A scheduled run (not the inline one when the fragment is registered)
+    scheduled = time.time() >= st.session_state.get("timer_next_sync", 0)
+    final_sync = st.session_state.get("timer_final_sync")
+    if remaining <= 0 or remaining <= TEST_TIMER_SYNC_SECONDS and (not final_sync or scheduled):
+        # Full rerun: test_page auto-submits on expiry, and on the final stretch
+        # re-registers this fragment to fire exactly when time runs out (again,
+        # from the current clock, if a scheduled run came in a little early)
+        st.rerun(scope="app")
+    render_client_countdown(remaining)
+
+
+def render_test_timer(remaining):
+    """Show the countdown using the configured timer mode"""
+    if TEST_TIMER_MODE == "heartbeat" or not hasattr(st, "fragment"):
+        seconds_left = math.ceil(remaining)
+        st.warning(f"⏳ Time left: {seconds_left//60}:{seconds_left%60:02d}")
+        return
+    
+    run_every = TEST_TIMER_SYNC_SECONDS
+    if remaining <= TEST_TIMER_SYNC_SECONDS:
+        # Final stretch: fire the fragment exactly when time runs out
+        run_every = max(0.25, remaining)
+        st.session_state.timer_final_sync = True
+    st.session_state.timer_next_sync = time.time() + run_every
+    st.fragment(test_timer_fragment, run_every=run_every)()
+
+
 def test_page():
     # Scroll to top when test starts
     st.markdown('<script>window.scrollTo(0, 0);</script>', unsafe_allow_html=True)
     
     st.title("Test")
 
-    elapsed = int(time.time() - st.session_state.start_time)
-    remaining = st.session_state.duration - elapsed
+    remaining = get_remaining_test_time()
 
     if remaining <= 0:
         submit_test(auto=True)
         return
 
-    st.warning(f"⏳ Time left: {remaining//60}:{remaining%60:02d}")
+    render_test_timer(remaining)
 
     # Initialize current page
     if "current_page" not in st.session_state:
@@ -2082,7 +2229,8 @@ def test_page():
     
     # Pagination settings
     questions_per_page = 5
-    total_questions = len(st.session_state.test)
+    question_ids = st.session_state.test_ids
+    total_questions = len(question_ids)
     total_pages = (total_questions + questions_per_page - 1) // questions_per_page
     
     # Calculate question range for current page
@@ -2093,9 +2241,12 @@ def test_page():
     st.info(f"📄 Page {st.session_state.current_page + 1} of {total_pages} | Questions {start_idx + 1}-{end_idx} of {total_questions}")
     
     # Display questions for current page
-    for i in range(start_idx, end_idx):
-        q = st.session_state.test[i]
+    for i, q in enumerate(current_test()[start_idx:end_idx], start=start_idx):
         # Don't show difficulty during test
+        if not q["options"]:
+            st.warning(f"**Q{i+1}.** ⚠️ {q['text']}")
+            st.markdown("---")
+            continue
         st.markdown(f"**Q{i+1}. {q['text']}**")
 
         labels = [o[0] for o in q["options"]]
@@ -2122,7 +2273,7 @@ def test_page():
     
     with col2:
         # Show answered status
-        answered = sum(1 for q in st.session_state.test if st.session_state.answers.get(q["id"]))
+        answered = sum(1 for qid in question_ids if st.session_state.answers.get(qid))
         st.info(f"📝 Answered: {answered}/{total_questions}")
     
     with col3:
@@ -2136,8 +2287,8 @@ def test_page():
     
     # Check for unanswered questions
     unanswered = []
-    for i, q in enumerate(st.session_state.test, 1):
-        if not st.session_state.answers.get(q["id"]):
+    for i, qid in enumerate(question_ids, 1):
+        if not st.session_state.answers.get(qid):
             unanswered.append(i)
 
     if st.button("📤 Submit Test", key="submit_test_btn", type="primary", use_container_width=True):
@@ -2166,390 +2317,137 @@ def test_page():
                     submit_test(auto=False)
                     return  # Stop execution here
 
-    # heartbeat rerun (Streamlit limitation) - but not if submitting
-    if not st.session_state.get("page") == "result":
-        time.sleep(0.5)
-        st.rerun()
+    # Legacy heartbeat rerun - in client mode the timer fragment handles expiry
+    if TEST_TIMER_MODE == "heartbeat" or not hasattr(st, "fragment"):
+        if not st.session_state.get("page") == "result":
+            time.sleep(0.5)
+            st.rerun()
 
 def submit_test(auto=False):
-    score = 0
-    for q in st.session_state.test:
-        qid = q["id"]
-        sel = st.session_state.answers.get(qid)
-        for opt in q["options"]:
-            if opt[0] == sel and opt[2]:
-                score += 1
+    st.session_state.scored = None
+    scored = current_scores()
+    score = total_score(scored)
+    graded = graded_responses(scored, st.session_state.answers)
 
     st.session_state.score = score
+    st.session_state.submitted_at = time.time()
+    st.session_state.last_submission_id = None
     
     # ===== SAVE TO DATABASE =====
     test_type = st.session_state.get("test_type", "custom")
     
     if test_type == "admin":
         # Save admin test attempt
-        save_admin_test_attempt(score, len(st.session_state.test))
+        save_admin_test_attempt(score, len(st.session_state.test_ids), graded)
     else:
         # Save regular test attempt
-        save_test_attempt(score, len(st.session_state.test))
+        save_test_attempt(score, len(st.session_state.test_ids), graded)
     
     st.session_state.page = "result"
     st.rerun()
 
 
-def save_admin_test_attempt(score, total_questions):
-    """Save admin test attempt and responses to database"""
-    conn = get_connection()
-    cur = conn.cursor()
+def save_admin_test_attempt(score, total_questions, graded=None):
+    """Queue admin test attempt and responses for saving to database"""
+    if graded is None:
+        graded = graded_responses(current_scores(), st.session_state.answers)
     
     try:
-        admin_test_id = st.session_state.get("admin_test_id")
-        user_id = st.session_state.user['id']
-        
-        placeholder = get_placeholder()
-        timestamp = "NOW()" if USE_POSTGRES else "CURRENT_TIMESTAMP"
-        
-        # Insert admin test attempt with correct column names
-        if USE_POSTGRES:
-            cur.execute(f"""
-                INSERT INTO admin_test_attempts (admin_test_id, user_id, score, total_questions, percentage, attempted_at)
-                VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {timestamp})
-                RETURNING attempt_id
-            """, (admin_test_id, user_id, score, total_questions, round(score * 100.0 / total_questions, 2)))
-            attempt_id = cur.fetchone()[0]
-        else:
-            cur.execute(f"""
-                INSERT INTO admin_test_attempts (admin_test_id, user_id, score, total_questions, percentage, attempted_at)
-                VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {timestamp})
-            """, (admin_test_id, user_id, score, total_questions, round(score * 100.0 / total_questions, 2)))
-            attempt_id = cur.lastrowid
-        
-        # Insert individual responses
-        for q in st.session_state.test:
-            qid = q["id"]
-            selected_label = st.session_state.answers.get(qid)
-            
-            # Check if answer is correct
-            is_correct = 0
-            if selected_label:
-                for opt in q["options"]:
-                    if opt[0] == selected_label and opt[2]:
-                        is_correct = 1
-                        break
-            
-            cur.execute(f"""
-                INSERT INTO admin_test_responses (attempt_id, question_id, selected_answer, is_correct)
-                VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder})
-            """, (attempt_id, qid, selected_label, is_correct))
-        
-        conn.commit()
-        
+        st.session_state.last_submission_id = submit_attempt("admin", {
+            "admin_test_id": st.session_state.get("admin_test_id"),
+            "user_id": st.session_state.user['id'],
+            "username": st.session_state.user['username'],
+            "score": score,
+            "total_questions": total_questions,
+            "responses": graded
+        })
     except Exception as e:
         st.error(f"❌ Database error: {e}")
-        conn.rollback()
-        
-    finally:
-        conn.close()
 
 
-def save_test_attempt(score, total_questions):
-    """Save test attempt and responses to database"""
-    conn = get_connection()
-    cur = conn.cursor()
+def save_test_attempt(score, total_questions, graded=None):
+    """Queue test attempt and responses for saving to database"""
+    if graded is None:
+        graded = graded_responses(current_scores(), st.session_state.answers)
     
     try:
-        placeholder = get_placeholder()
-        timestamp = "NOW()" if USE_POSTGRES else "CURRENT_TIMESTAMP"
-        
-        # Get user_id from username
-        cur.execute(
-            f"SELECT id FROM users WHERE username = {placeholder}",
-            (st.session_state.user['username'],)
-        )
-        user_id_result = cur.fetchone()
-        
-        if not user_id_result:
-            st.error(f"❌ User not found in database!")
-            return
-        
-        user_id = user_id_result[0]
-        
-        # Check if student record exists (CRITICAL FIX!)
-        cur.execute(
-            f"SELECT user_id FROM students WHERE user_id = {placeholder}",
-            (user_id,)
-        )
-        student_check = cur.fetchone()
-        
-        # Create student record if it doesn't exist
-        if not student_check:
-            cur.execute(
-                f"INSERT INTO students (user_id, name, class) VALUES ({placeholder}, {placeholder}, {placeholder})",
-                (user_id, st.session_state.user['username'], '9')
-            )
-            conn.commit()
-        
-        # Insert test attempt with correct column order
-        if USE_POSTGRES:
-            cur.execute(f"""
-                INSERT INTO test_attempts (student_id, total_questions, score, started_at)
-                VALUES ({placeholder}, {placeholder}, {placeholder}, {timestamp})
-                RETURNING id
-            """, (user_id, total_questions, score))
-            attempt_id = cur.fetchone()[0]
-        else:
-            cur.execute(f"""
-                INSERT INTO test_attempts (student_id, total_questions, score, started_at)
-                VALUES ({placeholder}, {placeholder}, {placeholder}, {timestamp})
-            """, (user_id, total_questions, score))
-            attempt_id = cur.lastrowid
-        
-        # Insert individual responses
-        for q in st.session_state.test:
-            qid = q["id"]
-            selected_label = st.session_state.answers.get(qid)
-            
-            # Check if answer is correct (use 1/0 for SQLite)
-            is_correct = 0
-            if selected_label:
-                for opt in q["options"]:
-                    if opt[0] == selected_label and opt[2]:
-                        is_correct = 1
-                        break
-            
-            cur.execute(f"""
-                INSERT INTO responses (attempt_id, question_id, selected_label, is_correct)
-                VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder})
-            """, (attempt_id, qid, selected_label, is_correct))
-        
-        conn.commit()
-        
+        st.session_state.last_submission_id = submit_attempt("custom", {
+            "user_id": st.session_state.user['id'],
+            "username": st.session_state.user['username'],
+            "score": score,
+            "total_questions": total_questions,
+            "responses": graded
+        })
     except Exception as e:
         st.error(f"❌ Database error: {e}")
-        conn.rollback()
-        
-    finally:
-        conn.close()
-
-def generate_pdf_report():
-    """Generate a PDF report of the test results"""
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=18)
-    
-    # Container for the 'Flowable' objects
-    elements = []
-    
-    # Define styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#1f77b4'),
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=16,
-        textColor=colors.HexColor('#2ca02c'),
-        spaceAfter=12,
-        spaceBefore=12
-    )
-    
-    normal_style = styles['Normal']
-    
-    # Get test data
-    score = st.session_state.score
-    total = len(st.session_state.test)
-    percentage = round((score / total) * 100, 2)
-    
-    # Calculate time taken
-    if hasattr(st.session_state, 'start_time'):
-        time_taken = int(time.time() - st.session_state.start_time)
-        minutes = time_taken // 60
-        seconds = time_taken % 60
-    else:
-        minutes, seconds = 0, 0
-    
-    # Title
-    elements.append(Paragraph("🎯 Test Analytics & Results", title_style))
-    elements.append(Spacer(1, 0.2*inch))
-    
-    # Performance Overview
-    elements.append(Paragraph("Performance Overview", heading_style))
-    
-    grade = "A+" if percentage >= 90 else "A" if percentage >= 80 else "B" if percentage >= 70 else "C" if percentage >= 60 else "D" if percentage >= 50 else "F"
-    accuracy = f"{percentage}%"
-    
-    performance_data = [
-        ['Metric', 'Value'],
-        ['Score', f'{score}/{total}'],
-        ['Percentage', f'{percentage}%'],
-        ['Grade', grade],
-        ['Time Taken', f'{minutes}m {seconds}s'],
-        ['Accuracy', accuracy]
-    ]
-    
-    perf_table = Table(performance_data, colWidths=[2.5*inch, 2.5*inch])
-    perf_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    elements.append(perf_table)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Difficulty Breakdown
-    elements.append(Paragraph("Difficulty-wise Analysis", heading_style))
-    
-    # Calculate difficulty stats
-    easy_correct = easy_total = medium_correct = medium_total = hard_correct = hard_total = 0
-    
-    for q in st.session_state.test:
-        difficulty = q.get("difficulty", "").lower()
-        selected_label = st.session_state.answers.get(q["id"])
-        is_correct = False
-        
-        if selected_label:
-            for opt in q["options"]:
-                if opt[0] == selected_label and opt[2]:
-                    is_correct = True
-                    break
-        
-        if difficulty == "easy":
-            easy_total += 1
-            if is_correct:
-                easy_correct += 1
-        elif difficulty == "medium":
-            medium_total += 1
-            if is_correct:
-                medium_correct += 1
-        elif difficulty == "hard":
-            hard_total += 1
-            if is_correct:
-                hard_correct += 1
-    
-    diff_data = [['Difficulty', 'Correct', 'Total', 'Accuracy']]
-    
-    if easy_total > 0:
-        easy_acc = round((easy_correct / easy_total) * 100, 1)
-        diff_data.append(['Easy', str(easy_correct), str(easy_total), f'{easy_acc}%'])
-    
-    if medium_total > 0:
-        medium_acc = round((medium_correct / medium_total) * 100, 1)
-        diff_data.append(['Medium', str(medium_correct), str(medium_total), f'{medium_acc}%'])
-    
-    if hard_total > 0:
-        hard_acc = round((hard_correct / hard_total) * 100, 1)
-        diff_data.append(['Hard', str(hard_correct), str(hard_total), f'{hard_acc}%'])
-    
-    diff_table = Table(diff_data, colWidths=[1.5*inch, 1.5*inch, 1.5*inch, 1.5*inch])
-    diff_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.lightblue),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    elements.append(diff_table)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Insights
-    elements.append(Paragraph("Insights & Recommendations", heading_style))
-    
-    insights_text = ""
-    
-    # Strengths
-    if easy_total > 0 and easy_correct / easy_total >= 0.8:
-        insights_text += "✓ Strong grasp of fundamental concepts (Easy questions).<br/>"
-    if medium_total > 0 and medium_correct / medium_total >= 0.7:
-        insights_text += "✓ Good understanding of moderate complexity topics.<br/>"
-    if hard_total > 0 and hard_correct / hard_total >= 0.6:
-        insights_text += "✓ Excellent problem-solving skills on challenging questions!<br/>"
-    
-    insights_text += "<br/>"
-    
-    # Weaknesses
-    if easy_total > 0 and easy_correct / easy_total < 0.6:
-        insights_text += "⚠ Focus on strengthening basic fundamentals.<br/>"
-    if medium_total > 0 and medium_correct / medium_total < 0.5:
-        insights_text += "⚠ Need more practice on moderate difficulty topics.<br/>"
-    if hard_total > 0 and hard_correct / hard_total < 0.4:
-        insights_text += "⚠ Work on advanced problem-solving techniques.<br/>"
-    
-    elements.append(Paragraph(insights_text, normal_style))
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Question Review
-    elements.append(PageBreak())
-    elements.append(Paragraph("Question-by-Question Review", heading_style))
-    
-    for i, q in enumerate(st.session_state.test, 1):
-        selected_label = st.session_state.answers.get(q["id"])
-        
-        # Find correct answer
-        correct_label = None
-        for opt in q["options"]:
-            if opt[2]:  # is_correct
-                correct_label = opt[0]
-                break
-        
-        is_correct = selected_label == correct_label
-        result_icon = "✓" if is_correct else "✗"
-        result_color = colors.green if is_correct else colors.red
-        
-        # Question text
-        q_text = f"<b>Q{i}. {q['text']}</b> [{result_icon}]"
-        elements.append(Paragraph(q_text, normal_style))
-        elements.append(Spacer(1, 0.1*inch))
-        
-        # Options
-        for opt in q["options"]:
-            opt_label, opt_text, is_opt_correct = opt
-            prefix = ""
-            
-            if opt_label == selected_label:
-                prefix = "➤ Your answer: "
-            if is_opt_correct:
-                prefix += "✓ Correct: "
-            
-            opt_line = f"{prefix}{opt_label}. {opt_text}"
-            elements.append(Paragraph(opt_line, normal_style))
-        
-        elements.append(Spacer(1, 0.2*inch))
-    
-    # Build PDF
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer
 
 # ================= RESULT =================
+def current_report_key():
+    """Cache key of the PDF report of the submitted attempt"""
+    submission_id = st.session_state.get("last_submission_id")
+    if submission_id:
+        return submission_id
+    # Attempt not saved - still unique to this user and test run
+    return f"unsaved-{st.session_state.user['id']}-{st.session_state.test_seed}-{st.session_state.start_time}"
+
+def pdf_status_fragment(report_key):
+    """Polls the background build and reruns the page once the PDF is ready"""
+    if not is_pending(report_key):
+        st.rerun(scope="app")
+    st.info("⏳ Preparing your PDF report...")
+
+def render_pdf_export(test, scored):
+    """
+    Download button for the PDF report. The report is only built when the
+    student asks for it, in the background (pdf_reports), and then served
+    from the cache on every rerun.
+    """
+    report_key = current_report_key()
+    try:
+        pdf = get_report(report_key)
+    except Exception as e:
+        st.error(f"Error generating PDF: {e}")
+        pdf = None
+    
+    if pdf is not None:
+        st.download_button(
+            label="📥 Download PDF Report",
+            data=pdf,
+            file_name=f"test_results_{datetime.fromtimestamp(st.session_state.submitted_at or time.time()).strftime('%Y%m%d_%H%M%S')}.pdf",
+            mime="application/pdf",
+            type="primary",
+            use_container_width=True
+        )
+    elif is_pending(report_key):
+        if hasattr(st, "fragment"):
+            st.fragment(pdf_status_fragment, run_every=1)(report_key)
+        else:
+            st.info("⏳ Preparing your PDF report...")
+            if st.button("🔄 Check again", key="pdf_refresh_btn", use_container_width=True):
+                st.rerun()
+    elif st.button("📄 Prepare PDF Report", key="prepare_pdf_btn", use_container_width=True):
+        request_report(report_key, {
+            "score": st.session_state.score,
+            "total": len(st.session_state.test_ids),
+            "time_taken": current_time_taken(),
+            "questions": test,
+            "scored": scored
+        })
+        st.rerun()
+
 def result_page():
     st.title("🎯 Test Analytics & Results")
     
     score = st.session_state.score
-    total = len(st.session_state.test)
+    test = current_test()
+    scored = current_scores(test)
+    total = len(st.session_state.test_ids)
     percentage = round((score / total) * 100, 2)
     
     # Calculate time taken
-    if hasattr(st.session_state, 'start_time'):
-        time_taken = int(time.time() - st.session_state.start_time)
-        minutes = time_taken // 60
-        seconds = time_taken % 60
-    else:
-        minutes, seconds = 0, 0
+    time_taken = current_time_taken()
+    minutes = time_taken // 60
+    seconds = time_taken % 60
     
     # ========== PERFORMANCE OVERVIEW ==========
     st.markdown("### 📊 Performance Overview")
@@ -2587,30 +2485,11 @@ def result_page():
     # ========== DIFFICULTY-WISE ANALYSIS ==========
     st.markdown("### 📈 Difficulty-wise Performance")
     
-    # Calculate difficulty breakdown
-    easy_correct = easy_total = 0
-    medium_correct = medium_total = 0
-    hard_correct = hard_total = 0
-    
-    for q in st.session_state.test:
-        difficulty = q.get('difficulty', 'medium')
-        qid = q["id"]
-        selected = st.session_state.answers.get(qid)
-        
-        is_correct = any(opt[0] == selected and opt[2] for opt in q["options"])
-        
-        if difficulty == 'easy':
-            easy_total += 1
-            if is_correct:
-                easy_correct += 1
-        elif difficulty == 'medium':
-            medium_total += 1
-            if is_correct:
-                medium_correct += 1
-        elif difficulty == 'hard':
-            hard_total += 1
-            if is_correct:
-                hard_correct += 1
+    # Difficulty breakdown from the scored arrays
+    by_difficulty = difficulty_breakdown(scored)
+    easy_correct, easy_total = difficulty_counts(by_difficulty, "easy")
+    medium_correct, medium_total = difficulty_counts(by_difficulty, "medium")
+    hard_correct, hard_total = difficulty_counts(by_difficulty, "hard")
     
     col1, col2, col3 = st.columns(3)
     
@@ -2661,27 +2540,12 @@ def result_page():
     
     with col2:
         st.markdown("#### 🎯 Difficulty Breakdown")
-        if easy_total > 0 or medium_total > 0 or hard_total > 0:
+        if not by_difficulty.empty:
             import numpy as np
             
-            difficulties = []
-            correct_counts = []
-            incorrect_counts = []
-            
-            if easy_total > 0:
-                difficulties.append('Easy')
-                correct_counts.append(easy_correct)
-                incorrect_counts.append(easy_total - easy_correct)
-            
-            if medium_total > 0:
-                difficulties.append('Medium')
-                correct_counts.append(medium_correct)
-                incorrect_counts.append(medium_total - medium_correct)
-            
-            if hard_total > 0:
-                difficulties.append('Hard')
-                correct_counts.append(hard_correct)
-                incorrect_counts.append(hard_total - hard_correct)
+            difficulties = [name.title() for name in by_difficulty.index]
+            correct_counts = by_difficulty["correct"].to_numpy()
+            incorrect_counts = (by_difficulty["total"] - by_difficulty["correct"]).to_numpy()
             
             fig, ax = plt.subplots(figsize=(5, 4))
             x = np.arange(len(difficulties))
@@ -2698,6 +2562,22 @@ def result_page():
             
             st.pyplot(fig)
     
+    # ========== CONCEPT-WISE ANALYSIS ==========
+    by_concept = concept_breakdown(scored)
+    by_concept = by_concept[by_concept.index > 0]
+    if len(by_concept) > 1:
+        st.markdown("#### 🧩 Concept-wise Performance")
+        names = concept_names(by_concept.index.tolist())
+        st.dataframe([
+            {
+                "Concept": names.get(concept_id, f"Concept {concept_id}"),
+                "Correct": int(row["correct"]),
+                "Total": int(row["total"]),
+                "Accuracy (%)": round(row["accuracy"], 1)
+            }
+            for concept_id, row in by_concept.iterrows()
+        ], use_container_width=True)
+    
     st.markdown("---")
     
     # ========== STRENGTHS & WEAKNESSES ==========
@@ -2741,36 +2621,27 @@ def result_page():
     
     # ========== DETAILED REVIEW ==========
     with st.expander("📋 Question-by-Question Review", expanded=False):
-        for i, q in enumerate(st.session_state.test, 1):
-            qid = q["id"]
-            selected = st.session_state.answers.get(qid)
-            
-            # Find correct answer
-            correct_option = None
-            is_correct = False
-            
-            for opt in q["options"]:
-                if opt[2]:  # is_correct flag
-                    correct_option = opt
-                if opt[0] == selected and opt[2]:
-                    is_correct = True
+        for k, q in enumerate(test):
+            i = k + 1
+            is_correct = bool(scored["is_correct"][k])
             
             # Display question with result indicator
             result_emoji = "✅" if is_correct else "❌"
-            difficulty = q.get('difficulty', 'medium')
+            difficulty = q.get('difficulty') or 'removed'  # None for a question deleted mid-test
             diff_badge = "🟢" if difficulty == "easy" else "🔴" if difficulty == "hard" else "🟡"
             
             st.markdown(f"**{result_emoji} Q{i}** {diff_badge} *{difficulty.title()}*")
             st.markdown(f"{q['text']}")
             
             # Show all options with indicators
-            for opt in q["options"]:
-                label, text, is_correct_opt = opt
+            for j, (label, text, _) in enumerate(q["options"]):
+                is_selected = j == scored["selected"][k]
+                is_correct_opt = j == scored["correct"][k]
                 
-                if label == selected and is_correct_opt:
+                if is_selected and is_correct_opt:
                     # Student selected correct answer - show only in green
                     st.success(f"✅ **{label}. {text}** ← Your answer (Correct!)")
-                elif label == selected and not is_correct_opt:
+                elif is_selected and not is_correct_opt:
                     # Student selected wrong answer - show in red
                     st.error(f"❌ **{label}. {text}** ← Your answer (Incorrect)")
                 elif is_correct_opt and not is_correct:
@@ -2799,18 +2670,7 @@ def result_page():
     st.markdown("### 📄 Export Results")
     col_pdf1, col_pdf2, col_pdf3 = st.columns([1, 2, 1])
     with col_pdf2:
-        try:
-            pdf_buffer = generate_pdf_report()
-            st.download_button(
-                label="📥 Download PDF Report",
-                data=pdf_buffer,
-                file_name=f"test_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
-                mime="application/pdf",
-                type="primary",
-                use_container_width=True
-            )
-        except Exception as e:
-            st.error(f"Error generating PDF: {e}")
+        render_pdf_export(test, scored)
     
     st.markdown("---")
     
@@ -2854,41 +2714,46 @@ def result_page():
             if st.button("🔄 Retake This Test", key="retake_test_btn", type="secondary"):
                 # Reload the same test
                 if st.session_state.get("test_type") == "admin":
-                    # Reload admin test
-                    questions = get_admin_test_questions(st.session_state.admin_test_id)
-                    st.session_state.test = questions
+                    # Reload admin test (new option order)
+                    paper = get_admin_test_paper(st.session_state.admin_test_id)
+                    start_test(paper["ids"], "admin", st.session_state.duration, admin_test_id=st.session_state.admin_test_id)
                 else:
                     # For custom tests, we need to regenerate
                     # Store the last test parameters if available
                     st.warning("To retake a custom test, please create a new one with the same settings.")
                     st.stop()
                 
-                # Reset test state
-                st.session_state.start_time = time.time()
-                st.session_state.answers = {}
-                st.session_state.current_page = 0
-                st.session_state.page = "test"
                 st.rerun()
 
 # ================= ROUTER =================
 if st.session_state.user is None:
-    # Check if on forgot password page
-    if st.session_state.get("page") == "forgot_password":
-        forgot_password_page()
-    else:
-        t1, t2 = st.tabs(["Login", "Signup"])
-        with t1:
-            login_page()
-        with t2:
-            signup_page()
+    render_name = "forgot_password" if st.session_state.get("page") == "forgot_password" else "login"
+elif st.session_state.user["role"] == "admin":
+    render_name = "admin"
 else:
-    if st.session_state.user["role"] == "admin":
-        admin_page()
+    render_name = st.session_state.page
+
+# Statements run during this render are aggregated per page (see query_stats)
+with track_render(render_name):
+    if st.session_state.user is None:
+        # Check if on forgot password page
+        if st.session_state.get("page") == "forgot_password":
+            run_page("forgot_password", forgot_password_page)
+        else:
+            t1, t2 = st.tabs(["Login", "Signup"])
+            with t1:
+                run_page("login", login_page)
+            with t2:
+                run_page("signup", signup_page)
     else:
-        if st.session_state.page == "setup":
-            setup_page()
-        elif st.session_state.page == "test":
-            test_page()
-        elif st.session_state.page == "result":
-            result_page()
+        # run_page() profiles each render when PAGE_PROFILE is set (see page_profiler)
+        if st.session_state.user["role"] == "admin":
+            run_page("admin", admin_page)
+        else:
+            if st.session_state.page == "setup":
+                run_page("setup", setup_page)
+            elif st.session_state.page == "test":
+                run_page("test", test_page)
+            elif st.session_state.page == "result":
+                run_page("result", result_page)
 
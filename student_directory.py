@@ -0,0 +1,201 @@
+"""
+Student directory for the admin Students tab.
+
+The old list selected every student and rendered them all on each rerun.
+Here the directory is served a page at a time:
+
+- keyset pagination on (created_at DESC, id DESC) - a page costs the same
+  whether it is the first or the hundredth, unlike OFFSET. Users created
+  before the created_at column existed have NULL there; they sort as
+  CREATED_AT_DEFAULT (oldest) so the keyset comparison still holds
+- server-side, case-insensitive prefix search on username / phone / school
+- both backed by the indexes in DIRECTORY_INDEXES (created once per process,
+  also listed in schema_postgres.sql / all_database_migrations.sql)
+
+delete_students() removes any number of students with a handful of
+set-based statements in one transaction, instead of one transaction per
+student.
+"""
+import threading
+from datetime import datetime
+
+from db_connection import get_connection, get_placeholder, USE_POSTGRES
+from analytics_rollups import ensure_rollup_tables, remove_students as remove_students_from_rollups
+from leaderboard_engine import ensure_leaderboard_table, remove_users as remove_from_leaderboard
+from generate_test_engine import invalidate_student_catalog
+
+if USE_POSTGRES:
+    CREATED_AT_DEFAULT = datetime(1970, 1, 1)
+    SORT_KEY = "COALESCE(created_at, TIMESTAMP '1970-01-01 00:00:00')"
+    # text_pattern_ops lets LIKE 'prefix%' use a btree regardless of the database collation
+    DIRECTORY_INDEXES = [
+        f"CREATE INDEX IF NOT EXISTS idx_users_role_sort_key ON users (role, ({SORT_KEY}) DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_users_username_search ON users (LOWER(username) text_pattern_ops)",
+        "CREATE INDEX IF NOT EXISTS idx_users_phone_search ON users (phone_number text_pattern_ops)",
+        "CREATE INDEX IF NOT EXISTS idx_users_school_search ON users (LOWER(school_name) text_pattern_ops)",
+    ]
+    SEARCH_COLUMNS = ["LOWER(username)", "phone_number", "LOWER(school_name)"]
+else:
+    CREATED_AT_DEFAULT = "1970-01-01 00:00:00"
+    SORT_KEY = "COALESCE(created_at, '1970-01-01 00:00:00')"
+    # SQLite's LIKE is case-insensitive and can use NOCASE indexes for prefixes
+    DIRECTORY_INDEXES = [
+        f"CREATE INDEX IF NOT EXISTS idx_users_role_sort_key ON users (role, {SORT_KEY} DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_users_username_search ON users (username COLLATE NOCASE)",
+        "CREATE INDEX IF NOT EXISTS idx_users_phone_search ON users (phone_number COLLATE NOCASE)",
+        "CREATE INDEX IF NOT EXISTS idx_users_school_search ON users (school_name COLLATE NOCASE)",
+    ]
+    SEARCH_COLUMNS = ["username", "phone_number", "school_name"]
+
+STUDENT_COLUMNS = "id, username, phone_number, school_name, class_name, board_name, recovery_code, created_at"
+
+# Keeps IN (...) lists under SQLite's bound-parameter limit
+DELETE_CHUNK_SIZE = 500
+
+_ready = False
+_ready_lock = threading.Lock()
+
+
+def ensure_directory_indexes():
+    """Create the directory indexes once per process"""
+    global _ready
+    if _ready:
+        return
+    with _ready_lock:
+        if _ready:
+            return
+        conn = get_connection()
+        cur = conn.cursor()
+        try:
+            for statement in DIRECTORY_INDEXES:
+                cur.execute(statement)
+            conn.commit()
+        finally:
+            conn.close()
+        _ready = True
+
+
+def _search_condition(search):
+    """(SQL condition, params) for a prefix search on the search columns"""
+    search = (search or "").strip().lower()
+    if not search:
+        return "", ()
+    placeholder = get_placeholder()
+    pattern = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    condition = " OR ".join(f"{column} LIKE {placeholder} ESCAPE '\\'" for column in SEARCH_COLUMNS)
+    return f"AND ({condition})", (pattern,) * len(SEARCH_COLUMNS)
+
+
+def count_students(search=""):
+    """Number of students matching the search"""
+    ensure_directory_indexes()
+    placeholder = get_placeholder()
+    condition, params = _search_condition(search)
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT COUNT(*) FROM users WHERE role = {placeholder} {condition}", ("student",) + params)
+        return cur.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def list_students(search="", after=None, limit=25):
+    """
+    One page of students, newest first.
+
+    Args:
+        search: prefix of a username, phone number or school name (case-insensitive)
+        after: keyset cursor - the (created_at, id) of the last row of the previous page
+               (created_at as CREATED_AT_DEFAULT when it is NULL)
+        limit: page size
+
+    Returns:
+        (rows, next_cursor) - rows are (id, username, phone_number, school_name,
+        class_name, board_name, recovery_code, created_at); next_cursor is None
+        on the last page
+    """
+    ensure_directory_indexes()
+    placeholder = get_placeholder()
+    condition, params = _search_condition(search)
+    keyset = ""
+    if after is not None:
+        keyset = f"AND ({SORT_KEY}, id) < ({placeholder}, {placeholder})"
+        params += tuple(after)
+
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            SELECT {STUDENT_COLUMNS}
+            FROM users
+            WHERE role = {placeholder} {condition} {keyset}
+            ORDER BY {SORT_KEY} DESC, id DESC
+            LIMIT {placeholder}
+        """, ("student",) + params + (limit + 1,))
+        rows = cur.fetchall()
+    finally:
+        conn.close()
+
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    created_at = rows[-1][7]
+    return rows, (CREATED_AT_DEFAULT if created_at is None else created_at, rows[-1][0])
+
+
+def delete_students(student_ids):
+    """
+    Delete students and all their attempts / responses in one transaction,
+    DELETE ... WHERE ... IN (...) per table instead of per student.
+    Ids that are not students (e.g. the admin) are ignored.
+
+    Returns:
+        number of students deleted
+    """
+    student_ids = list(dict.fromkeys(student_ids))
+    if not student_ids:
+        return 0
+    ensure_rollup_tables()
+    ensure_leaderboard_table()
+    placeholder = get_placeholder()
+
+    conn = get_connection()
+    cur = conn.cursor()
+    deleted = []
+    try:
+        for start in range(0, len(student_ids), DELETE_CHUNK_SIZE):
+            chunk = student_ids[start:start + DELETE_CHUNK_SIZE]
+            marks = ", ".join([placeholder] * len(chunk))
+            cur.execute(f"SELECT id FROM users WHERE role = {placeholder} AND id IN ({marks})", ["student"] + chunk)
+            chunk = [row[0] for row in cur.fetchall()]
+            if not chunk:
+                continue
+            marks = ", ".join([placeholder] * len(chunk))
+
+            # Take the students out of the analytics rollups while their responses still exist
+            remove_students_from_rollups(cur, chunk)
+            remove_from_leaderboard(cur, chunk)
+
+            cur.execute(f"""
+                DELETE FROM responses
+                WHERE attempt_id IN (SELECT id FROM test_attempts WHERE student_id IN ({marks}))
+            """, chunk)
+            cur.execute(f"DELETE FROM test_attempts WHERE student_id IN ({marks})", chunk)
+            cur.execute(f"""
+                DELETE FROM admin_test_responses
+                WHERE attempt_id IN (SELECT attempt_id FROM admin_test_attempts WHERE user_id IN ({marks}))
+            """, chunk)
+            cur.execute(f"DELETE FROM admin_test_attempts WHERE user_id IN ({marks})", chunk)
+            cur.execute(f"DELETE FROM users WHERE id IN ({marks})", chunk)
+            deleted.extend(chunk)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    for student_id in deleted:
+        invalidate_student_catalog(student_id)
+    return len(deleted)